@@ -0,0 +1,102 @@
+"""
+合成BOM数据生成器：按固定表头（替代料, 机型, 型号, 规格型号, 用量）生成一对用于对比的工作簿
+
+可控制行数、重复键比例（按基准测试默认的匹配字段：替代料 + 机型）、字段差异比例、仅出现在一个文件中的比例。
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+from compare_engine import FIXED_COLUMNS
+
+PACKAGES = ['0201', '0402', '0603', '0805', '1206', 'SOT-23', 'SOP-8', 'QFN-32']
+VALUES = ['10K', '4.7K', '100R', '1M', '0.1uF', '10uF', '22pF', '1uH']
+TOLERANCES = ['±1%', '±5%', '±10%', '±20%']
+# 生成方式变化时递增，避免复用旧版本写出的工作簿
+FILE_VERSION = 3
+
+
+def _codes(prefix, ids, width):
+    """按编号生成编码，如 ALT-0000123"""
+    return pd.Series(ids).map(lambda i: f'{prefix}-{i:0{width}d}').to_numpy()
+
+
+def _random_rows(rng, count, key_ids):
+    """按给定的替代料编号生成BOM行"""
+    models = rng.integers(0, max(count // 500, 20), count)
+    parts = rng.integers(0, max(count // 10, 100), count)
+    spec = (
+        pd.Series(rng.choice(VALUES, count))
+        + ' ' + pd.Series(rng.choice(TOLERANCES, count))
+        + ' ' + pd.Series(rng.choice(PACKAGES, count))
+    )
+    return pd.DataFrame({
+        '替代料': _codes('ALT', key_ids, 7),
+        '机型': _codes('MX', models, 4),
+        '型号': _codes('R', parts, 6),
+        '规格型号': spec.to_numpy(),
+        '用量': rng.integers(1, 20, count).astype(float)
+    }, columns=FIXED_COLUMNS)
+
+
+def generate_bom_pair(rows, duplicate_rate=0.02, diff_rate=0.05, only_rate=0.01, seed=0):
+    """
+    生成一对BOM数据表 (df1, df2)。
+
+    - duplicate_rate：文件1中（替代料, 机型）与前面某行完全相同的比例（重复键）
+    - diff_rate：两个文件都有、但用量或规格型号被修改的比例
+    - only_rate：仅出现在文件1（以及仅出现在文件2）的行的比例
+    """
+    rng = np.random.default_rng(seed)
+    df1 = _random_rows(rng, rows, np.arange(rows))
+    # 重复行从前面不重复的行中随机取一行，复制它的替代料和机型
+    duplicates = rng.random(rows) < duplicate_rate
+    duplicates[0] = False
+    positions = np.flatnonzero(duplicates)
+    originals = np.flatnonzero(~duplicates)
+    sources = originals[(rng.random(len(positions)) * np.searchsorted(originals, positions)).astype(int)]
+    df1.iloc[positions, [0, 1]] = df1.iloc[sources, [0, 1]].to_numpy()
+
+    # 文件2：去掉一部分行（仅文件1有），再补上一部分新行（仅文件2有）
+    only = rng.random(rows) < only_rate
+    df2 = df1[~only].copy()
+    changed = rng.random(len(df2)) < diff_rate
+    change_spec = rng.random(len(df2)) < 0.5
+    df2.loc[changed & ~change_spec, '用量'] += 1
+    df2.loc[changed & change_spec, '规格型号'] = df2.loc[changed & change_spec, '规格型号'] + ' (替换)'
+    extra = int(only.sum())
+    new_rows = _random_rows(rng, extra, np.arange(rows, rows + extra))
+    df2 = pd.concat([df2, new_rows], ignore_index=True)
+    df2 = df2.sample(frac=1, random_state=seed).reset_index(drop=True)
+    return df1, df2
+
+
+def write_bom_workbook(df, path):
+    """
+    按行写入一个BOM工作簿。
+
+    constant_memory 模式下每写完一行就落盘，单元格必须按行顺序写入（to_excel 按列写，会丢掉大部分数据）。
+    """
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+    worksheet = workbook.add_worksheet()
+    worksheet.write_row(0, 0, list(df.columns))
+    for row_number, row in enumerate(df.itertuples(index=False, name=None), start=1):
+        worksheet.write_row(row_number, 0, row)
+    workbook.close()
+
+
+def write_bom_pair(data_dir, rows, duplicate_rate=0.02, diff_rate=0.05, only_rate=0.01, seed=0):
+    """生成一对BOM工作簿并写入 data_dir，已存在时直接复用，返回两个文件路径"""
+    name = f'bom_v{FILE_VERSION}_{rows}_d{duplicate_rate}_c{diff_rate}_o{only_rate}_s{seed}'
+    path1 = os.path.join(data_dir, f'{name}_1.xlsx')
+    path2 = os.path.join(data_dir, f'{name}_2.xlsx')
+    if os.path.exists(path1) and os.path.exists(path2):
+        return path1, path2
+
+    os.makedirs(data_dir, exist_ok=True)
+    df1, df2 = generate_bom_pair(rows, duplicate_rate, diff_rate, only_rate, seed)
+    for df, path in ((df1, path1), (df2, path2)):
+        write_bom_workbook(df, path)
+    return path1, path2
@@ -0,0 +1,174 @@
+"""
+对比流程基准测试：分阶段记录（读取、构建键、合并、分类、写报告）耗时、CPU时间和峰值内存（compare_profile.StageProfiler）
+
+用法（在仓库根目录执行）：
+    python -m benchmarks.run_benchmarks --rows 10000 100000
+    python -m benchmarks.run_benchmarks --rows 100000 --baseline benchmarks/results/上次结果.json
+
+每个规模在独立的子进程中运行，峰值内存互不影响；结果保存为 JSON，便于不同版本之间对比。
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+
+import pandas as pd
+
+from benchmarks.bom_generator import generate_bom_pair, write_bom_pair
+from compare_engine import (
+    KEY_MODES, KEY_MODE_TEXT, DUPLICATE_MODES, DUPLICATE_FIRST,
+    add_key_column, align_frames, classify_aligned, validate_key_columns
+)
+from compare_io import load_normalized
+from compare_profile import StageProfiler
+from compare_report import write_report, write_streaming_report
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+STAGES = ['read', 'key_build', 'merge', 'classify', 'report_write']
+REPORT_WRITERS = {'xlsx': write_report, 'streaming': write_streaming_report}
+
+
+def run_case(case):
+    """执行一个规模的基准测试（在子进程中运行）"""
+    profiler = StageProfiler()
+    key_columns = case['key_columns']
+    validate_key_columns(key_columns)
+
+    if case['skip_read']:
+        df1, df2 = generate_bom_pair(case['rows'], case['duplicate_rate'], case['diff_rate'],
+                                     case['only_rate'], case['seed'])
+    else:
+        path1, path2 = case['files']
+        with profiler.stage('read') as stage:
+            df1, df2 = load_normalized(path1, '文件1'), load_normalized(path2, '文件2')
+            stage['rows'] = len(df1) + len(df2)
+
+    with profiler.stage('key_build', len(df1) + len(df2)):
+        add_key_column(df1, key_columns, case['key_mode'])
+        add_key_column(df2, key_columns, case['key_mode'])
+    with profiler.stage('merge') as stage:
+        aligned = align_frames(df1, df2, case['duplicate_mode'])
+        stage['rows'] = len(aligned.merged)
+    with profiler.stage('classify', len(aligned.merged)):
+        result = classify_aligned(aligned, key_columns)
+
+    if case['report'] != 'none':
+        with tempfile.TemporaryDirectory() as tmp_dir, profiler.stage('report_write', len(result.comparison_df)):
+            REPORT_WRITERS[case['report']](result, os.path.join(tmp_dir, 'report.xlsx'))
+
+    summary = profiler.to_dict()
+    return {
+        'rows': case['rows'],
+        'file1_rows': result.file1_rows,
+        'file2_rows': result.file2_rows,
+        'status_counts': result.status_counts,
+        'stages': {record['stage']: record for record in summary['stages']},
+        'total_seconds': summary['wall_seconds'],
+        'cpu_seconds': summary['cpu_seconds'],
+        'peak_rss_mb': summary['peak_rss_mb']
+    }
+
+
+def _stage_seconds(stage):
+    """阶段耗时；兼容之前版本保存的结果（seconds）"""
+    return stage.get('wall_seconds', stage.get('seconds'))
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_case(case_result, baseline_cases=None):
+    """打印一个规模的结果；给出基准结果时附带耗时变化"""
+    base = (baseline_cases or {}).get(case_result['rows'])
+    print(f"\n== {case_result['rows']} 行  总耗时 {case_result['total_seconds']:.2f}s  "
+          f"峰值内存 {case_result['peak_rss_mb']} MB")
+    for name in STAGES:
+        stage = case_result['stages'].get(name)
+        if stage is None:
+            continue
+        seconds = _stage_seconds(stage)
+        line = f"  {name:<13}{seconds:>9.3f}s  CPU {stage['cpu_seconds']:>8.3f}s  {stage['peak_rss_mb']} MB"
+        base_stage = base['stages'].get(name) if base else None
+        if base_stage and _stage_seconds(base_stage) > 0:
+            line += f"  ({seconds / _stage_seconds(base_stage):.2f}x 对比基准)"
+        print(line)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Excel对比流程基准测试")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000], help="每个文件的行数（可多个）")
+    parser.add_argument('--duplicate-rate', type=float, default=0.02, help="重复键比例")
+    parser.add_argument('--diff-rate', type=float, default=0.05, help="字段差异比例")
+    parser.add_argument('--only-rate', type=float, default=0.01, help="仅出现在一个文件中的比例")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-k', '--key', dest='key_columns', action='append', help="匹配字段（默认：替代料、机型）")
+    parser.add_argument('--key-mode', choices=KEY_MODES, default=KEY_MODE_TEXT, help="键值存储方式")
+    parser.add_argument('--duplicates', dest='duplicate_mode', choices=DUPLICATE_MODES, default=DUPLICATE_FIRST,
+                        help="重复键处理方式")
+    parser.add_argument('--report', choices=['xlsx', 'streaming', 'none'], default='streaming', help="报告写入方式")
+    parser.add_argument('--skip-read', action='store_true', help="不生成xlsx文件，直接在内存中生成数据（不计读取耗时）")
+    parser.add_argument('--data-dir', default=os.path.join(BENCH_DIR, 'data'), help="生成的测试工作簿目录")
+    parser.add_argument('--output-dir', default=os.path.join(BENCH_DIR, 'results'), help="结果JSON目录")
+    parser.add_argument('--baseline', help="用于对比的历史结果JSON")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    baseline_cases = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline_cases = {case['rows']: case for case in json.load(f)['cases']}
+
+    params = {
+        'duplicate_rate': args.duplicate_rate,
+        'diff_rate': args.diff_rate,
+        'only_rate': args.only_rate,
+        'seed': args.seed,
+        'key_columns': args.key_columns or ['替代料', '机型'],
+        'key_mode': args.key_mode,
+        'duplicate_mode': args.duplicate_mode,
+        'report': args.report,
+        'skip_read': args.skip_read
+    }
+    cases = []
+    ctx = multiprocessing.get_context('spawn')
+    for rows in args.rows:
+        case = dict(params, rows=rows)
+        if not args.skip_read:
+            print(f"准备 {rows} 行测试工作簿...")
+            case['files'] = write_bom_pair(args.data_dir, rows, args.duplicate_rate, args.diff_rate,
+                                           args.only_rate, args.seed)
+        with ctx.Pool(1) as pool:
+            case_result = pool.apply(run_case, (case,))
+        print_case(case_result, baseline_cases)
+        cases.append(case_result)
+
+    output = {
+        'timestamp': pd.Timestamp.now().isoformat(timespec='seconds'),
+        'git_commit': _git_commit(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'params': params,
+        'cases': cases
+    }
+    os.makedirs(args.output_dir, exist_ok=True)
+    path = os.path.join(args.output_dir, f"bench_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(output, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已保存：{path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,233 @@
+"""
+基准快照：把一个工作簿保存为命名基准，之后的新版本只需计算一遍行指纹即可与之对比
+
+每个键保存一条非键字段的64位指纹，对比时指纹相同的键直接判为数据一致，
+只有指纹不同的键才逐字段比较。
+
+命令行用法：
+    python compare_baseline.py save 主BOM 主BOM.xlsx -k 替代料 -k 机型
+    python compare_baseline.py compare 主BOM 新版本.xlsx -o 报告.xlsx
+    python compare_baseline.py list
+    python compare_baseline.py delete 主BOM
+"""
+import argparse
+import json
+import os
+import re
+import sys
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # 未安装 pyarrow 时无法保存基准
+    feather = None
+
+from compare_cache import to_arrow_table
+from compare_engine import (
+    FIXED_COLUMNS, FILE1_COLUMNS, FILE2_COLUMNS, KEY_COLUMN, DUPLICATE_FIRST,
+    AlignedFrames, add_key_column, classify_aligned, compared_columns, keep_values_on_merge, row_hashes,
+    validate_key_columns
+)
+from compare_io import load_normalized
+from compare_report import write_report, write_streaming_report
+
+DEFAULT_BASELINE_DIR = os.path.join(os.path.expanduser('~'), '.excel_compare', 'baselines')
+FINGERPRINT_COLUMN = '__fingerprint__'
+
+
+class Baseline:
+    """
+    已保存的基准：每个键首次出现的行 + 该行非键字段的指纹。
+
+    与默认的重复键处理方式一致，同一键只保留首次出现的行。
+    """
+
+    def __init__(self, name, key_columns, frame, rows, created):
+        self.name = name
+        self.key_columns = key_columns
+        self.frame = frame
+        self.rows = rows
+        self.created = created
+
+
+def build_baseline(name, df, key_columns):
+    """从已标准化的数据表生成基准"""
+    validate_key_columns(key_columns)
+    frame = add_key_column(df[FIXED_COLUMNS].copy(), key_columns).drop_duplicates(KEY_COLUMN)
+    frame[FINGERPRINT_COLUMN] = row_hashes(frame, compared_columns(key_columns))
+    frame = frame.reset_index(drop=True)
+    return Baseline(name, list(key_columns), frame, len(df), pd.Timestamp.now().isoformat(timespec='seconds'))
+
+
+def compare_to_baseline(baseline, df_new, tolerance=None):
+    """
+    新版本数据与基准对比，结果与两个文件直接对比（重复键只取首条）一致。
+
+    新数据只需构建键并计算一遍指纹；指纹与基准相同的键直接判为数据一致，
+    只有指纹不同的键进入逐字段比较（给出 tolerance 时按类型感知比较）。
+    """
+    key_columns = baseline.key_columns
+    new = add_key_column(df_new[FIXED_COLUMNS].copy(), key_columns).drop_duplicates(KEY_COLUMN)
+    new_fingerprints = row_hashes(new, compared_columns(key_columns))
+
+    base = baseline.frame
+    base_index = pd.Index(base[KEY_COLUMN])
+    positions = base_index.get_indexer(new[KEY_COLUMN])
+    found = positions >= 0
+    changed = found & (base[FINGERPRINT_COLUMN].to_numpy()[positions] != new_fingerprints)
+    only_base = ~base_index.isin(new[KEY_COLUMN])
+
+    # 新文件中的键（与基准对应的行按键取出）+ 只在基准中的键；与外连接一样，补空值前先保护整数列
+    base = keep_values_on_merge(base, FIXED_COLUMNS)
+    new = keep_values_on_merge(new, FIXED_COLUMNS)
+    base_fixed = base.set_index(KEY_COLUMN)[FIXED_COLUMNS]
+    matched = base_fixed.reindex(new[KEY_COLUMN]).reset_index(drop=True)
+    matched.columns = FILE1_COLUMNS
+    new_part = new[FIXED_COLUMNS].reset_index(drop=True)
+    new_part.columns = FILE2_COLUMNS
+    new_part = pd.concat([new[[KEY_COLUMN]].reset_index(drop=True), matched, new_part], axis=1)
+
+    base_part = base.loc[only_base, [KEY_COLUMN] + FIXED_COLUMNS].reset_index(drop=True)
+    base_part.columns = [KEY_COLUMN] + FILE1_COLUMNS
+    merged = pd.concat([new_part, base_part], ignore_index=True)
+
+    in_file1 = np.concatenate([found, np.ones(len(base_part), dtype=bool)])
+    in_file2 = np.concatenate([np.ones(len(new_part), dtype=bool), np.zeros(len(base_part), dtype=bool)])
+    candidates = np.concatenate([changed, np.zeros(len(base_part), dtype=bool)])
+
+    # 与外连接一样按键排序，保证报告行顺序一致
+    order = np.argsort(merged[KEY_COLUMN].to_numpy(), kind='stable')
+    merged = merged.iloc[order].reset_index(drop=True)
+    aligned = AlignedFrames(
+        merged, in_file1[order], in_file2[order], np.zeros(len(merged), dtype=bool),
+        DUPLICATE_FIRST, baseline.rows, len(df_new)
+    )
+    return classify_aligned(aligned, key_columns, candidates[order], tolerance)
+
+
+class BaselineStore:
+    """基准快照存储：每个基准一个 Arrow 文件 + 一个 JSON 元数据文件"""
+
+    def __init__(self, base_dir=DEFAULT_BASELINE_DIR):
+        if feather is None:
+            raise RuntimeError("基准快照需要安装 pyarrow")
+        self.base_dir = base_dir
+        os.makedirs(base_dir, exist_ok=True)
+
+    def _paths(self, name):
+        safe_name = re.sub(r'[^\w\-.]', '_', name)
+        if not safe_name.strip('.'):
+            raise ValueError(f"无效的基准名称：{name}")
+        stem = os.path.join(self.base_dir, safe_name)
+        return stem + '.arrow', stem + '.json'
+
+    def save(self, baseline):
+        """保存基准（同名基准会被覆盖）"""
+        data_path, meta_path = self._paths(baseline.name)
+        feather.write_feather(to_arrow_table(baseline.frame), data_path, compression='uncompressed')
+        meta = {
+            'name': baseline.name,
+            'key_columns': baseline.key_columns,
+            'rows': baseline.rows,
+            'keys': len(baseline.frame),
+            'created': baseline.created
+        }
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        return meta
+
+    def load(self, name):
+        data_path, meta_path = self._paths(name)
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            raise ValueError(f"基准不存在：{name}") from None
+        frame = feather.read_table(data_path, memory_map=True).to_pandas()
+        return Baseline(meta['name'], meta['key_columns'], frame, meta['rows'], meta['created'])
+
+    def list(self):
+        """所有基准的元数据，按创建时间从新到旧排列"""
+        metas = []
+        for file_name in os.listdir(self.base_dir):
+            if file_name.endswith('.json'):
+                with open(os.path.join(self.base_dir, file_name), encoding='utf-8') as f:
+                    metas.append(json.load(f))
+        return sorted(metas, key=lambda meta: meta['created'], reverse=True)
+
+    def delete(self, name):
+        removed = False
+        for path in self._paths(name):
+            if os.path.exists(path):
+                os.remove(path)
+                removed = True
+        return removed
+
+
+def open_baseline_store(base_dir=DEFAULT_BASELINE_DIR):
+    """打开基准存储；未安装 pyarrow 时返回 None"""
+    if feather is None:
+        return None
+    return BaselineStore(base_dir)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Excel对比工具的基准快照")
+    parser.add_argument('--baseline-dir', default=DEFAULT_BASELINE_DIR, help="基准存储目录")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    save_parser = subparsers.add_parser('save', help="把工作簿保存为命名基准")
+    save_parser.add_argument('name', help="基准名称")
+    save_parser.add_argument('file', help="Excel文件")
+    save_parser.add_argument('-k', '--key', dest='key_columns', action='append', choices=FIXED_COLUMNS,
+                             help="用于数据匹配的字段，可重复指定（默认：替代料）")
+
+    compare_parser = subparsers.add_parser('compare', help="新版本与基准对比")
+    compare_parser.add_argument('name', help="基准名称")
+    compare_parser.add_argument('file', help="新版本Excel文件")
+    compare_parser.add_argument('-o', '--output', required=True, help="对比报告输出路径（.xlsx）")
+    compare_parser.add_argument('--low-memory', action='store_true', help="低内存模式：流式写入报告")
+
+    subparsers.add_parser('list', help="列出所有基准")
+    delete_parser = subparsers.add_parser('delete', help="删除基准")
+    delete_parser.add_argument('name', help="基准名称")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    store = open_baseline_store(args.baseline_dir)
+    if store is None:
+        print("❌ 基准快照需要安装 pyarrow", file=sys.stderr)
+        return 1
+
+    try:
+        if args.command == 'save':
+            baseline = build_baseline(args.name, load_normalized(args.file), args.key_columns or ['替代料'])
+            meta = store.save(baseline)
+            print(f"基准“{meta['name']}”已保存：{meta['rows']} 行，{meta['keys']} 个键")
+        elif args.command == 'compare':
+            result = compare_to_baseline(store.load(args.name), load_normalized(args.file))
+            if args.low_memory:
+                write_streaming_report(result, args.output)
+            else:
+                write_report(result, args.output)
+            for status, count in result.status_counts.items():
+                print(f"{status}: {count}")
+            print(f"报告已生成：{args.output}")
+        elif args.command == 'list':
+            for meta in store.list():
+                print(f"{meta['name']}  匹配字段：{'、'.join(meta['key_columns'])}  "
+                      f"{meta['rows']} 行  {meta['created']}")
+        elif not store.delete(args.name):
+            print(f"基准不存在：{args.name}")
+    except (ValueError, OSError) as e:
+        print(f"❌ 处理文件时出错：{e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,311 @@
+"""
+缓存：内存中的LRU缓存（按估算的内存占用和/或条目数限制大小），以及按文件内容哈希保存已标准化数据的磁盘列式缓存
+
+内存缓存的默认上限可用环境变量 EXCEL_COMPARE_MEMORY_CACHE_MB 指定（每个缓存分别计算）。
+
+磁盘缓存管理（命令行）：
+    python compare_cache.py list
+    python compare_cache.py purge [哈希前缀]
+"""
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # 未安装 pyarrow 时不使用磁盘缓存
+    pa = None
+    feather = None
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'excel_compare')
+DEFAULT_CACHE_MAX_MB = 2048
+CACHE_SUFFIX = '.arrow'
+DEFAULT_MEMORY_CACHE_MB = int(os.environ.get('EXCEL_COMPARE_MEMORY_CACHE_MB', 1024))
+# 估算缓存条目大小时向对象属性、元组、字典内部查找数据表的层数
+SIZE_SEARCH_DEPTH = 3
+
+
+def content_hash(data):
+    """文件内容的哈希值，用作缓存键"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def entry_key(file_hash, *variant):
+    """磁盘缓存条目的键：文件内容哈希 + 读取方式（如工作表名）"""
+    if not variant:
+        return file_hash
+    return hashlib.sha256('\x1f'.join([file_hash] + [str(v) for v in variant]).encode('utf-8')).hexdigest()
+
+
+def comparison_cache_key(hash1, hash2, key_columns, *options):
+    """对比结果的缓存键：(文件1哈希, 文件2哈希, 匹配字段, 其他对比选项...)"""
+    return (hash1, hash2, tuple(key_columns)) + options
+
+
+def estimate_size(value, depth=0):
+    """
+    缓存条目占用内存的估算（字节）：数据表按 memory_usage(deep=True)（含字符串对象），数组、bytes 按实际大小；
+    元组、列表、字典和普通对象累加其中各项（对象按属性），其他值不计。
+    """
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    if depth >= SIZE_SEARCH_DEPTH:
+        return 0
+    if isinstance(value, dict):
+        items = value.values()
+    elif isinstance(value, (tuple, list)):
+        items = value
+    elif hasattr(value, '__dict__'):
+        items = vars(value).values()
+    else:
+        return 0
+    return sum(estimate_size(item, depth + 1) for item in items)
+
+
+class LRUCache:
+    """
+    LRU缓存：按估算的内存占用（max_mb）和/或条目数（max_entries）限制大小，超出上限时淘汰最久未使用的条目；
+    最新写入的条目总会保留，单个条目超出上限时也不会立即被淘汰（线程安全）。
+
+    sizeof 为估算条目大小（字节）的函数，默认 estimate_size。
+    """
+
+    def __init__(self, max_entries=None, max_mb=None, sizeof=estimate_size):
+        if max_entries is None and max_mb is None:
+            raise ValueError("缓存需要条目上限或内存上限")
+        if max_entries is not None and max_entries < 1:
+            raise ValueError("缓存条目上限必须大于0")
+        if max_mb is not None and max_mb <= 0:
+            raise ValueError("缓存内存上限必须大于0")
+        self.max_entries = max_entries
+        self.max_bytes = None if max_mb is None else max_mb * 1024 * 1024
+        self.sizeof = sizeof
+        self._data = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return self._data[key]
+
+    def _over_limit(self):
+        if self.max_entries is not None and len(self._data) > self.max_entries:
+            return True
+        return self.max_bytes is not None and self.total_bytes > self.max_bytes
+
+    def put(self, key, value):
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        with self._lock:
+            self.total_bytes += size - self._sizes.get(key, 0)
+            self._data[key] = value
+            self._sizes[key] = size
+            self._data.move_to_end(key)
+            while len(self._data) > 1 and self._over_limit():
+                oldest, _ = self._data.popitem(last=False)
+                self.total_bytes -= self._sizes.pop(oldest)
+
+    def get_or_create(self, key, factory):
+        """命中则直接返回，否则调用 factory() 生成并写入缓存"""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = factory()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self.total_bytes = 0
+
+
+_MISSING = object()
+
+
+# ========================
+# 磁盘列式缓存
+# ========================
+def to_arrow_table(df):
+    """
+    DataFrame 转为 Arrow 表。
+
+    同一列中混有数字和文本时 Arrow 无法直接保存，这样的列转为文本（空值保持为空），
+    与对比时按 str(v) 比较的结果一致。
+    """
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        pass
+    df = df.copy()
+    for col in df.columns:
+        try:
+            pa.array(df[col], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            df[col] = df[col].astype(str).where(df[col].notna(), None)
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+class DiskFrameCache:
+    """
+    已标准化数据的磁盘缓存：每个条目是一个未压缩的 Arrow IPC 文件，读取时直接内存映射。
+
+    总大小超过 max_bytes 时按最近使用时间淘汰。
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_MAX_MB * 1024 * 1024):
+        if feather is None:
+            raise RuntimeError("磁盘缓存需要安装 pyarrow")
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + CACHE_SUFFIX)
+
+    def get(self, key):
+        """命中时返回 DataFrame 并刷新最近使用时间，否则返回 None"""
+        path = self._path(key)
+        try:
+            table = feather.read_table(path, memory_map=True)
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, pa.ArrowInvalid):
+            # 文件损坏（如写入中断），删除后按未命中处理
+            self._remove(path)
+            return None
+        return table.to_pandas()
+
+    def put(self, key, df):
+        """写入缓存（先写临时文件再改名，避免读到写了一半的文件）"""
+        table = to_arrow_table(df)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        os.close(fd)
+        try:
+            feather.write_feather(table, tmp_path, compression='uncompressed')
+            os.replace(tmp_path, self._path(key))
+        except Exception:
+            self._remove(tmp_path)
+            raise
+        self.evict()
+
+    def get_or_create(self, key, factory):
+        df = self.get(key)
+        if df is None:
+            df = factory()
+            self.put(key, df)
+        return df
+
+    def entries(self):
+        """所有缓存条目，按最近使用时间从新到旧排列"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(CACHE_SUFFIX):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append({
+                'key': name[:-len(CACHE_SUFFIX)],
+                'size': stat.st_size,
+                'last_used': stat.st_mtime,
+                'path': path
+            })
+        return sorted(entries, key=lambda entry: entry['last_used'], reverse=True)
+
+    def total_size(self):
+        return sum(entry['size'] for entry in self.entries())
+
+    def evict(self):
+        """总大小超过上限时，从最久未使用的条目开始删除"""
+        with self._lock:
+            entries = self.entries()
+            total = sum(entry['size'] for entry in entries)
+            while entries and total > self.max_bytes:
+                oldest = entries.pop()
+                self._remove(oldest['path'])
+                total -= oldest['size']
+
+    def purge(self, key_prefix=''):
+        """删除键以 key_prefix 开头的条目（默认全部），返回删除的条目数"""
+        removed = 0
+        for entry in self.entries():
+            if entry['key'].startswith(key_prefix):
+                self._remove(entry['path'])
+                removed += 1
+        return removed
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def open_disk_cache(cache_dir=DEFAULT_CACHE_DIR, max_mb=DEFAULT_CACHE_MAX_MB):
+    """打开磁盘缓存；未安装 pyarrow 时返回 None"""
+    if feather is None:
+        return None
+    return DiskFrameCache(cache_dir, int(max_mb * 1024 * 1024))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Excel对比工具的磁盘缓存管理")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help="缓存目录")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('list', help="列出缓存条目")
+    purge_parser = subparsers.add_parser('purge', help="删除缓存条目")
+    purge_parser.add_argument('key_prefix', nargs='?', default='', help="只删除键以此开头的条目（默认全部）")
+    args = parser.parse_args(argv)
+
+    cache = open_disk_cache(args.cache_dir)
+    if cache is None:
+        print("❌ 磁盘缓存需要安装 pyarrow", file=sys.stderr)
+        return 1
+
+    if args.command == 'list':
+        entries = cache.entries()
+        for entry in entries:
+            last_used = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(entry['last_used']))
+            print(f"{entry['key'][:16]}  {entry['size'] / 1024 / 1024:>10.1f} MB  {last_used}")
+        print(f"共 {len(entries)} 个条目，{sum(e['size'] for e in entries) / 1024 / 1024:.1f} MB")
+    else:
+        print(f"已删除 {cache.purge(args.key_prefix)} 个条目")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,444 @@
+import numpy as np
+import pandas as pd
+
+from compare_profile import profile_stage
+
+# ========================
+# 常量定义
+# ========================
+# 固定列名标准
+FIXED_COLUMNS = ['替代料', '机型', '型号', '规格型号', '用量']
+
+KEY_COLUMN = '__key__'
+KEY_SEPARATOR = '｜'
+MATCH_COLUMN = '匹配字段'
+STATUS_COLUMN = '对比状态'
+DIFF_FIELDS_COLUMN = '差异字段'
+DIFF_FIELDS_SEPARATOR = '、'
+
+# 对比状态
+STATUS_SAME = '数据一致'
+STATUS_ONLY_FILE1 = '仅文件1有'
+STATUS_ONLY_FILE2 = '仅文件2有'
+STATUS_DIFF = '字段差异'
+STATUS_DUPLICATE = '重复键多出'
+STATUS_FUZZY = '模糊匹配'
+STATUS_ORDER = [STATUS_SAME, STATUS_ONLY_FILE1, STATUS_ONLY_FILE2, STATUS_DIFF]
+
+# 重复键处理方式：只取首条 / 按出现顺序逐条配对
+DUPLICATE_FIRST = 'first'
+DUPLICATE_OCCURRENCE = 'occurrence'
+DUPLICATE_MODES = [DUPLICATE_FIRST, DUPLICATE_OCCURRENCE]
+OCCURRENCE_COLUMN = '__occurrence__'
+
+# 类型感知比较时始终按数值比较的字段（其他字段两侧都不是数值类型时按文本比较）
+NUMERIC_COLUMNS = ['用量']
+
+# 报告列顺序
+FILE1_COLUMNS = [f'文件1_{col}' for col in FIXED_COLUMNS]
+FILE2_COLUMNS = [f'文件2_{col}' for col in FIXED_COLUMNS]
+REPORT_COLUMNS = [MATCH_COLUMN] + FILE1_COLUMNS + FILE2_COLUMNS + [STATUS_COLUMN, DIFF_FIELDS_COLUMN]
+# 模糊匹配时附加的匹配得分列
+SCORE_COLUMN = '匹配得分'
+
+
+class ComparisonResult:
+    """
+    一次对比的结果：并排对比表 + 各状态数量。
+
+    diff_mask 与 comparison_df 逐行对齐，每个参与比较的非键字段一列，
+    True 表示该行这个字段的值在两个文件中不同。
+    """
+
+    def __init__(self, comparison_df, status_counts, file1_rows, file2_rows, diff_mask=None):
+        self.comparison_df = comparison_df
+        self.status_counts = status_counts
+        self.file1_rows = file1_rows
+        self.file2_rows = file2_rows
+        if diff_mask is None:
+            diff_mask = pd.DataFrame(index=comparison_df.index)
+        self.diff_mask = diff_mask
+
+    @property
+    def diff_counts(self):
+        """每个字段存在差异的行数"""
+        return {col: int(count) for col, count in self.diff_mask.sum().items()}
+
+    @property
+    def total_diff(self):
+        """不一致的数据总数（仅文件1有 + 仅文件2有 + 字段差异 + 重复键多出 + 模糊匹配）"""
+        return (self.status_counts[STATUS_ONLY_FILE1]
+                + self.status_counts[STATUS_ONLY_FILE2]
+                + self.status_counts[STATUS_DIFF]
+                + self.status_counts.get(STATUS_DUPLICATE, 0)
+                + self.status_counts.get(STATUS_FUZZY, 0))
+
+
+# ========================
+# 键值构建
+# ========================
+# 键值存储方式：拼接字符串 / 元组 / 64位哈希整数
+KEY_MODE_TEXT = 'text'
+KEY_MODE_TUPLE = 'tuple'
+KEY_MODE_HASH = 'hash'
+KEY_MODES = [KEY_MODE_TEXT, KEY_MODE_TUPLE, KEY_MODE_HASH]
+
+
+def _key_text(values):
+    """单列转为键文本：与 astype(str) 的结果一致，空值统一映射为 'nan'"""
+    return values.astype(str).where(values.notna(), 'nan').astype(object)
+
+
+def _join_key_text(columns):
+    """按列拼接键文本（向量化），得到 '值1｜值2｜...' 形式的键"""
+    joined = _key_text(columns[0])
+    for values in columns[1:]:
+        joined = joined + KEY_SEPARATOR + _key_text(values)
+    return joined
+
+
+def build_key(df, key_columns, key_mode=KEY_MODE_TEXT):
+    """
+    按匹配字段生成唯一键。
+
+    - text：'值1｜值2' 拼接字符串，可直接作为报告中的匹配字段
+    - tuple：各字段文本组成的元组，不再生成拼接后的长字符串
+    - hash：各字段文本的64位哈希，内存占用最小
+    """
+    if key_mode not in KEY_MODES:
+        raise ValueError(f"不支持的键值存储方式：{key_mode}")
+    columns = [df[col] for col in key_columns]
+    if key_mode == KEY_MODE_TEXT:
+        return _join_key_text(columns)
+    texts = pd.DataFrame({i: _key_text(values) for i, values in enumerate(columns)}, index=df.index)
+    if key_mode == KEY_MODE_TUPLE:
+        return pd.Series(list(texts.itertuples(index=False, name=None)), index=df.index, dtype=object)
+    return pd.util.hash_pandas_object(texts, index=False)
+
+
+def add_key_column(df, key_columns, key_mode=KEY_MODE_TEXT):
+    """按匹配字段生成唯一键列 __key__"""
+    df[KEY_COLUMN] = build_key(df, key_columns, key_mode)
+    return df
+
+
+# ========================
+# 对比引擎
+# ========================
+def _cell_text(values):
+    """与逐行对比时的 str(v) 规则一致：空值视为空字符串"""
+    return values.astype(str).where(values.notna(), "")
+
+
+class Tolerance:
+    """
+    类型感知比较的设置。
+
+    数值字段（NUMERIC_COLUMNS 或任一侧为数值类型的字段）按浮点数比较，
+    |a - b| ≤ max(abs_tol, rel_tol × max(|a|, |b|)) 视为相同，因此 2 与 2.0、0.1+0.2 与 0.3 不再算作差异；
+    无法转为数值的值（以及其他字段）去掉首尾空白后按文本比较。
+    """
+
+    def __init__(self, abs_tol=0.0, rel_tol=1e-9):
+        if abs_tol < 0 or rel_tol < 0:
+            raise ValueError("容差不能为负数")
+        self.abs_tol = abs_tol
+        self.rel_tol = rel_tol
+
+    def __eq__(self, other):
+        return isinstance(other, Tolerance) and (self.abs_tol, self.rel_tol) == (other.abs_tol, other.rel_tol)
+
+    def __hash__(self):
+        return hash((self.abs_tol, self.rel_tol))
+
+    def __repr__(self):
+        return f'Tolerance(abs_tol={self.abs_tol}, rel_tol={self.rel_tol})'
+
+
+def _normalized_text(values):
+    """类型感知比较的文本：去掉首尾空白，空值视为空字符串"""
+    return values.astype('string').str.strip().fillna('')
+
+
+def _is_numeric_field(col, v1, v2):
+    return (col in NUMERIC_COLUMNS
+            or pd.api.types.is_numeric_dtype(v1.dtype) or pd.api.types.is_numeric_dtype(v2.dtype))
+
+
+def _typed_diff(col, v1, v2, tolerance):
+    """类型感知比较：数值字段按容差比较浮点数组，其余按规范化文本比较"""
+    text_diff = (_normalized_text(v1) != _normalized_text(v2)).to_numpy()
+    if not _is_numeric_field(col, v1, v2):
+        return text_diff
+    n1 = pd.to_numeric(v1, errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    n2 = pd.to_numeric(v2, errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    both_numeric = ~np.isnan(n1) & ~np.isnan(n2)
+    with np.errstate(invalid='ignore'):
+        limit = np.maximum(tolerance.abs_tol, tolerance.rel_tol * np.maximum(np.abs(n1), np.abs(n2)))
+        numeric_diff = ~(np.abs(n1 - n2) <= limit)
+    # 两侧都能转为数值时按数值比较，否则（空值、文本）按文本比较
+    return np.where(both_numeric, numeric_diff, text_diff)
+
+
+def compared_columns(key_columns):
+    """参与比较的非键字段"""
+    return [col for col in FIXED_COLUMNS if col not in key_columns]
+
+
+def row_hashes(df, columns):
+    """按与字段比较相同的文本规则（空值为空字符串）计算每行若干列的64位哈希"""
+    if not columns:
+        return np.zeros(len(df), dtype=np.uint64)
+    texts = pd.DataFrame({i: _cell_text(df[col]).astype(object).to_numpy() for i, col in enumerate(columns)})
+    return pd.util.hash_pandas_object(texts, index=False).to_numpy()
+
+
+def _upcast_on_merge(dtype):
+    """外连接出现空位时会被转为浮点数（或 object）的列类型"""
+    return pd.api.types.is_integer_dtype(dtype) or pd.api.types.is_bool_dtype(dtype)
+
+
+def keep_values_on_merge(df, columns):
+    """整数、布尔列先转为 object：外连接、reindex、拼接给缺失一侧填空值时不会再把 2 变成 2.0"""
+    return df.astype({col: object for col in columns if _upcast_on_merge(df[col].dtype)})
+
+
+def _side(df, prefix, duplicate_mode, extra_columns=()):
+    """
+    整理一侧数据并把字段名加上文件前缀（prefix 为 '文件1' 或 '文件2'）。
+
+    - first：每个键只取首次出现的行
+    - occurrence：按键分组，给每行编上组内出现序号（0, 1, 2...），
+      之后按 (键, 序号) 逐条配对
+
+    extra_columns 为额外随行带过外连接的列（同样加上前缀），不参与比较。
+    """
+    columns = FIXED_COLUMNS + list(extra_columns)
+    if duplicate_mode == DUPLICATE_FIRST:
+        side = df.drop_duplicates(KEY_COLUMN)[[KEY_COLUMN] + columns]
+    else:
+        side = df[[KEY_COLUMN] + columns].copy()
+    side = keep_values_on_merge(side, columns)
+    side.columns = [KEY_COLUMN] + [f'{prefix}_{col}' for col in columns]
+    if duplicate_mode == DUPLICATE_OCCURRENCE:
+        side[OCCURRENCE_COLUMN] = side.groupby(KEY_COLUMN, sort=False).cumcount()
+    return side
+
+
+def _match_text(merged, key_columns, in_file1):
+    """报告中的匹配字段：键值本身不是拼接字符串时，按存在的一侧重新拼出文本"""
+    keys = merged[KEY_COLUMN]
+    if len(keys) == 0 or isinstance(keys.iloc[0], str):
+        return keys
+    columns = [merged[f'文件1_{col}'].where(in_file1, merged[f'文件2_{col}']) for col in key_columns]
+    return _join_key_text(columns)
+
+
+def _diff_labels(diff_mask):
+    """
+    每行的差异字段文本，如 '机型、用量'。
+
+    先把各列差异压成位掩码，再按不同的掩码值查表，避免逐行拼接字符串。
+    """
+    columns = list(diff_mask.columns)
+    codes = np.zeros(len(diff_mask), dtype=np.int64)
+    for bit, col in enumerate(columns):
+        codes |= diff_mask[col].to_numpy().astype(np.int64) << bit
+    labels = {
+        code: DIFF_FIELDS_SEPARATOR.join(col for bit, col in enumerate(columns) if code >> bit & 1)
+        for code in np.unique(codes).tolist()
+    }
+    return pd.Series(codes).map(labels).to_numpy()
+
+
+class AlignedFrames:
+    """两个文件按键对齐后的外连接结果，以及每行在哪个文件中存在"""
+
+    def __init__(self, merged, in_file1, in_file2, is_extra, duplicate_mode, file1_rows, file2_rows):
+        self.merged = merged
+        self.in_file1 = in_file1
+        self.in_file2 = in_file2
+        self.is_extra = is_extra
+        self.duplicate_mode = duplicate_mode
+        self.file1_rows = file1_rows
+        self.file2_rows = file2_rows
+
+
+def align_frames(df1, df2, duplicate_mode=DUPLICATE_FIRST, extra_columns=()):
+    """
+    按 __key__ 对齐两个数据表（一次外连接）。
+
+    默认重复键只取首次出现的行（与原先逐键扫描时 iloc[0] 的结果一致）；
+    duplicate_mode='occurrence' 时同一键的第 n 条与另一文件的第 n 条配对，
+    另一文件中没有对应条目的多出行记在 is_extra 中。
+    两种方式下外连接都是一对一的，不会产生笛卡尔积。
+    extra_columns 中的列随行带过外连接，在 merged 中为 文件1_列名 / 文件2_列名。
+    """
+    return align_prepared(prepare_file1_side(df1, duplicate_mode, extra_columns), len(df1), df2, duplicate_mode,
+                          extra_columns)
+
+
+def prepare_file1_side(df1, duplicate_mode=DUPLICATE_FIRST, extra_columns=()):
+    """
+    整理第一个文件（已生成 __key__）一侧的对齐数据。
+
+    一对多对比时基准文件只整理一次，之后用 align_prepared 与每个候选文件对齐。
+    """
+    if duplicate_mode not in DUPLICATE_MODES:
+        raise ValueError(f"不支持的重复键处理方式：{duplicate_mode}")
+    return _side(df1, '文件1', duplicate_mode, extra_columns)
+
+
+def align_prepared(left, file1_rows, df2, duplicate_mode=DUPLICATE_FIRST, extra_columns=()):
+    """把已整理好的第一个文件一侧（prepare_file1_side）与第二个文件对齐，file1_rows 为第一个文件的行数"""
+    right = _side(df2, '文件2', duplicate_mode, extra_columns)
+    on = [KEY_COLUMN] if duplicate_mode == DUPLICATE_FIRST else [KEY_COLUMN, OCCURRENCE_COLUMN]
+    merged = pd.merge(left, right, on=on, how='outer', indicator=True)
+    in_file1 = (merged['_merge'] != 'right_only').to_numpy()
+    in_file2 = (merged['_merge'] != 'left_only').to_numpy()
+
+    # 键在两个文件中都存在、但这一条在另一文件中没有对应序号的行
+    is_extra = np.zeros(len(merged), dtype=bool)
+    if duplicate_mode == DUPLICATE_OCCURRENCE:
+        keys = merged[KEY_COLUMN]
+        in_both_keys = keys.isin(left[KEY_COLUMN]) & keys.isin(right[KEY_COLUMN])
+        is_extra = in_both_keys.to_numpy() & ~(in_file1 & in_file2)
+    return AlignedFrames(merged, in_file1, in_file2, is_extra, duplicate_mode, file1_rows, len(df2))
+
+
+def _field_diff(merged, col, rows=None, tolerance=None):
+    """
+    某个字段左右两侧是否不同；给出 rows 时只比较这些行，其余行视为相同。
+
+    tolerance 为 None 时按 str(v) 文本精确比较，否则按 Tolerance 做类型感知比较。
+    """
+    v1 = merged[f'文件1_{col}']
+    v2 = merged[f'文件2_{col}']
+    if rows is not None:
+        v1 = v1.iloc[rows]
+        v2 = v2.iloc[rows]
+    if tolerance is None:
+        values_diff = (_cell_text(v1) != _cell_text(v2)).to_numpy()
+    else:
+        values_diff = _typed_diff(col, v1, v2, tolerance)
+    if rows is None:
+        return values_diff
+    diff = np.zeros(len(merged), dtype=bool)
+    diff[rows] = values_diff
+    return diff
+
+
+def _comparable_values(v1, v2):
+    """
+    两侧合并为一列供整数编码：值按 _cell_text 转为文本，编码相同即逐字段比较时也相同。
+
+    两侧都是字符串类型时文本就是值本身，直接编码（空值与空字符串编码不同，只会多出需要复查的行）。
+    """
+    if isinstance(v1.dtype, pd.StringDtype) and v1.dtype == v2.dtype:
+        return pd.concat([v1, v2], ignore_index=True)
+    return pd.concat([_cell_text(v1).astype(object), _cell_text(v2).astype(object)], ignore_index=True)
+
+
+def _changed_rows(merged, columns):
+    """
+    整行哈希快速判断：两侧非键字段的64位行哈希不同的行。
+
+    每个字段先把两侧按 str(v) 规则得到的文本一起编码为整数（文本相同得到相同的编码），
+    再对每侧的编码整行求哈希。哈希相同说明两侧每个字段的文本都相同，可以直接判为数据一致；
+    1 与 1.0、True 与 1 这类值相等但文本不同的情况编码不同，会和其他哈希不同的行一起逐字段比较。
+    """
+    if not columns:
+        return np.zeros(len(merged), dtype=bool)
+    codes1 = {}
+    codes2 = {}
+    for col in columns:
+        codes = pd.factorize(_comparable_values(merged[f'文件1_{col}'], merged[f'文件2_{col}']))[0]
+        codes1[col] = codes[:len(merged)]
+        codes2[col] = codes[len(merged):]
+    hash1 = pd.util.hash_pandas_object(pd.DataFrame(codes1), index=False).to_numpy()
+    hash2 = pd.util.hash_pandas_object(pd.DataFrame(codes2), index=False).to_numpy()
+    return hash1 != hash2
+
+
+def classify_aligned(aligned, key_columns, candidates=None, tolerance=None):
+    """
+    对齐后逐列比较非键字段，生成并排对比表、差异矩阵和状态统计。
+
+    candidates 为可选的布尔数组：只有为 True 的行需要逐字段比较，
+    其余两侧都有的行已由其他方式（如行指纹）确认一致。
+    不给出时先按整行哈希筛选，只有哈希不同的行才逐字段比较。
+    tolerance 为 Tolerance 时做类型感知比较（数值容差），默认按文本精确比较。
+    """
+    merged = aligned.merged
+    in_file1 = aligned.in_file1
+    in_file2 = aligned.in_file2
+    in_both = in_file1 & in_file2
+    if candidates is None:
+        candidates = _changed_rows(merged, compared_columns(key_columns))
+    rows = np.flatnonzero(in_both & candidates)
+
+    # 非键字段逐列比较得到差异矩阵，任一列不同即为字段差异
+    diff_mask = pd.DataFrame({
+        col: in_both & _field_diff(merged, col, rows, tolerance)
+        for col in compared_columns(key_columns)
+    }, index=pd.RangeIndex(len(merged)))
+    has_diff = diff_mask.any(axis=1).to_numpy()
+
+    status = np.select(
+        [in_both & has_diff, in_both, aligned.is_extra, in_file1],
+        [STATUS_DIFF, STATUS_SAME, STATUS_DUPLICATE, STATUS_ONLY_FILE1],
+        default=STATUS_ONLY_FILE2
+    )
+
+    # 缺失一侧的字段显示为空字符串
+    comparison_df = merged[FILE1_COLUMNS + FILE2_COLUMNS].astype(object)
+    comparison_df.loc[~in_file1, FILE1_COLUMNS] = ""
+    comparison_df.loc[~in_file2, FILE2_COLUMNS] = ""
+    comparison_df.insert(0, MATCH_COLUMN, _match_text(merged, key_columns, in_file1).to_numpy())
+    comparison_df[STATUS_COLUMN] = status
+    comparison_df[DIFF_FIELDS_COLUMN] = _diff_labels(diff_mask)
+    comparison_df = comparison_df.reset_index(drop=True)[REPORT_COLUMNS]
+
+    status_order = STATUS_ORDER
+    if aligned.duplicate_mode == DUPLICATE_OCCURRENCE:
+        status_order = STATUS_ORDER + [STATUS_DUPLICATE]
+    status_counts = comparison_df[STATUS_COLUMN].value_counts().reindex(status_order, fill_value=0)
+    return ComparisonResult(
+        comparison_df,
+        {status: int(count) for status, count in status_counts.items()},
+        aligned.file1_rows,
+        aligned.file2_rows,
+        diff_mask
+    )
+
+
+def compare_frames(df1, df2, key_columns, duplicate_mode=DUPLICATE_FIRST, tolerance=None):
+    """对两个已生成 __key__ 的数据表做一次向量化的外连接对比（对齐 + 分类）"""
+    return classify_aligned(align_frames(df1, df2, duplicate_mode), key_columns, tolerance=tolerance)
+
+
+def validate_key_columns(key_columns):
+    """检查匹配字段是否有效"""
+    if not key_columns:
+        raise ValueError("请至少选择一个匹配字段")
+    unknown = [col for col in key_columns if col not in FIXED_COLUMNS]
+    if unknown:
+        raise ValueError(f"匹配字段必须是 {', '.join(FIXED_COLUMNS)} 之一，无法识别：{', '.join(unknown)}")
+
+
+def compare(df1, df2, key_columns, key_mode=KEY_MODE_TEXT, duplicate_mode=DUPLICATE_FIRST, tolerance=None,
+            profiler=None):
+    """
+    对两个已标准化的数据表做键值对比；给出 tolerance 时做类型感知比较。
+
+    给出 profiler（StageProfiler）时分别记录构建键、合并、分类三个阶段。
+    """
+    validate_key_columns(key_columns)
+    with profile_stage(profiler, 'key_build', len(df1) + len(df2)):
+        df1 = add_key_column(df1.copy(), key_columns, key_mode)
+        df2 = add_key_column(df2.copy(), key_columns, key_mode)
+    with profile_stage(profiler, 'merge') as stage:
+        aligned = align_frames(df1, df2, duplicate_mode)
+        stage['rows'] = len(aligned.merged)
+    with profile_stage(profiler, 'classify', len(aligned.merged)):
+        return classify_aligned(aligned, key_columns, tolerance=tolerance)
@@ -0,0 +1,227 @@
+"""
+模糊键匹配：供应商文件中的型号、规格型号常有全角字符、多余空格、大小写或分隔符不同，
+精确匹配会把同一物料判为“仅文件1有”/“仅文件2有”。
+
+1. 键先规范化（NFKC、去掉空白、统一小写）后精确匹配；
+2. 仍未匹配的键按字符三元组建立前缀分块索引，只在索引中共享三元组的键之间计算相似度
+   （三元组 Dice 系数，忽略标点和分隔符），高于阈值的按得分从高到低一对一配对。
+
+原始键不完全相同的配对标记为“模糊匹配”，并在报告中给出匹配得分。
+"""
+import re
+import unicodedata
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from compare_engine import (
+    KEY_COLUMN, MATCH_COLUMN, STATUS_COLUMN, STATUS_FUZZY, SCORE_COLUMN, DUPLICATE_FIRST,
+    align_frames, build_key, classify_aligned, validate_key_columns
+)
+
+DEFAULT_THRESHOLD = 0.8
+NGRAM_SIZE = 3
+# 精确计算相似度时每批比较的候选对数量
+PAIR_CHUNK_SIZE = 50000
+# 随行带过外连接的原始键列（未规范化，按读入时的值拼接）
+RAW_KEY_COLUMN = '原始键'
+
+_WHITESPACE = re.compile(r'\s+')
+_NON_WORD = re.compile(r'[\W_]+')
+
+
+def normalize_text(text):
+    """键文本规范化：NFKC（全角转半角等）、去掉所有空白、统一小写"""
+    return _WHITESPACE.sub('', unicodedata.normalize('NFKC', text)).casefold()
+
+
+def normalized_key(df, key_columns):
+    """规范化后的键文本（相同的键只规范化一次）"""
+    codes, uniques = pd.factorize(build_key(df, key_columns))
+    normalized = np.array([normalize_text(text) for text in uniques], dtype=object)
+    return pd.Series(normalized[codes], index=df.index, dtype=object)
+
+
+def _ngrams(text):
+    """去掉标点和分隔符后的字符三元组；不足三个字符时整体作为一个元素"""
+    text = _NON_WORD.sub('', text)
+    if len(text) <= NGRAM_SIZE:
+        return {text} if text else set()
+    return {text[i:i + NGRAM_SIZE] for i in range(len(text) - NGRAM_SIZE + 1)}
+
+
+def _prefix_length(size, threshold):
+    """
+    前缀过滤：Dice 系数不低于 threshold 时，共同元素数 c ≥ threshold × size / (2 - threshold)，
+    因此两个键按同一顺序排列的三元组中，前 size - ⌈c⌉ + 1 个里至少有一个相同。
+    """
+    return size - int(np.ceil(threshold * size / (2 - threshold) - 1e-9)) + 1
+
+
+def _gram_matrix(gram_sets, rank, pad):
+    """每个键的三元组按全局稀有程度排序，转为编号矩阵（每行一个键，不足的位置填 pad）"""
+    sizes = np.array([len(gram_set) for gram_set in gram_sets], dtype=np.int64)
+    matrix = np.full((len(gram_sets), max(int(sizes.max()), 1)), pad, dtype=np.int64)
+    for i, gram_set in enumerate(gram_sets):
+        matrix[i, :sizes[i]] = sorted(rank[gram] for gram in gram_set)
+    return matrix, sizes
+
+
+def _prefix_table(matrix, sizes, threshold):
+    """每个键取前缀中最稀有的几个三元组，展开为 (键序号, 在键中的位置, 三元组编号) 表"""
+    lengths = np.array([_prefix_length(size, threshold) for size in sizes.tolist()], dtype=np.int64)
+    in_prefix = np.arange(matrix.shape[1]) < lengths[:, None]
+    ids, positions = np.nonzero(in_prefix)
+    return pd.DataFrame({'id': ids, 'pos': positions, 'gram': matrix[in_prefix]})
+
+
+def _shared_counts(matrix1, matrix2, id1, id2, chunk_size=PAIR_CHUNK_SIZE):
+    """
+    候选对的共同三元组数量。
+
+    每个键的三元组编号各不相同，把两个键的编号行拼接排序后，相邻且相等的位置就是一个共同三元组；
+    按块向量化处理，填充位置（负数）不计入。
+    """
+    shared = np.empty(len(id1), dtype=np.int64)
+    for start in range(0, len(id1), chunk_size):
+        rows = np.sort(np.hstack([matrix1[id1[start:start + chunk_size]], matrix2[id2[start:start + chunk_size]]]),
+                       axis=1)
+        shared[start:start + chunk_size] = ((rows[:, 1:] == rows[:, :-1]) & (rows[:, 1:] >= 0)).sum(axis=1)
+    return shared
+
+
+def match_keys(keys1, keys2, threshold=DEFAULT_THRESHOLD):
+    """
+    在两组未匹配的键之间找出一对一的相似配对，返回 DataFrame(key1, key2, score)。
+
+    分块索引：三元组按在两组键中出现的次数从少到多排序，每个键只用前缀中最稀有的几个三元组建索引，
+    只有前缀共享三元组的键才成为候选对（不会漏掉得分达到阈值的配对），
+    候选对再按相同三元组的位置剪枝，最后精确计算 Dice 系数。
+    """
+    empty = pd.DataFrame({'key1': pd.Series(dtype=object), 'key2': pd.Series(dtype=object),
+                          'score': pd.Series(dtype=float)})
+    keys1 = list(keys1)
+    keys2 = list(keys2)
+    if not keys1 or not keys2:
+        return empty
+    sets1 = [_ngrams(key) for key in keys1]
+    sets2 = [_ngrams(key) for key in keys2]
+    frequency = Counter(gram for gram_set in sets1 + sets2 for gram in gram_set)
+    rank = {gram: i for i, (gram, _) in enumerate(sorted(frequency.items(), key=lambda item: (item[1], item[0])))}
+    # 两侧用不同的填充值，填充位置不会被算作相同
+    matrix1, sizes1 = _gram_matrix(sets1, rank, -1)
+    matrix2, sizes2 = _gram_matrix(sets2, rank, -2)
+
+    candidates = _prefix_table(matrix1, sizes1, threshold).merge(
+        _prefix_table(matrix2, sizes2, threshold), on='gram', suffixes=('1', '2')
+    )
+    if candidates.empty:
+        return empty
+    id1 = candidates['id1'].to_numpy()
+    id2 = candidates['id2'].to_numpy()
+
+    # 位置剪枝：两个键的三元组按同一顺序排列，在 (pos1, pos2) 处相同时，
+    # 若这是它们第一个相同的三元组，共同元素最多为 1 + 两侧剩余数量的较小值；达不到阈值的候选对不再精确计算
+    remaining = np.minimum(sizes1[id1] - candidates['pos1'].to_numpy(), sizes2[id2] - candidates['pos2'].to_numpy())
+    keep = 2 * remaining >= threshold * (sizes1[id1] + sizes2[id2])
+    if not keep.any():
+        return empty
+    # 共享多个前缀三元组的候选对只保留一次（排序去重）
+    pair_codes = np.sort(id1[keep] * len(keys2) + id2[keep])
+    pair_codes = pair_codes[np.r_[True, pair_codes[1:] != pair_codes[:-1]]]
+    id1, id2 = np.divmod(pair_codes, len(keys2))
+
+    total = sizes1[id1] + sizes2[id2]
+    score = 2 * _shared_counts(matrix1, matrix2, id1, id2) / np.maximum(total, 1)
+    keep = score >= threshold
+    id1, id2, score = id1[keep], id2[keep], score[keep]
+
+    # 按得分从高到低贪心配对，每个键最多配对一次
+    used1 = set()
+    used2 = set()
+    rows = []
+    for i in np.lexsort((id2, id1, -score)).tolist():
+        a, b = int(id1[i]), int(id2[i])
+        if a in used1 or b in used2:
+            continue
+        used1.add(a)
+        used2.add(b)
+        rows.append((keys1[a], keys2[b], float(score[i])))
+    if not rows:
+        return empty
+    return pd.DataFrame(rows, columns=['key1', 'key2', 'score'])
+
+
+def _separate_variants(df, other_raw_keys):
+    """
+    重复键只取首条时，原始键不同、规范化后相同的行不是重复行，不能只留下一条：
+    每个规范化键留一个原始键参与配对（两个文件都有的原始键中取最小的，两侧的选择一致；没有时取首次出现的），
+    其余原始键的行改用“规范化键 + 原始键”作为键，另一文件中有同样原始键的行时仍能配对，否则作为单侧的行列出。
+    """
+    raw = df[RAW_KEY_COLUMN]
+    variants = pd.DataFrame({'key': df[KEY_COLUMN], 'raw': raw}).drop_duplicates('raw')
+    in_other = variants['raw'].isin(other_raw_keys).to_numpy()
+    variants = pd.concat([variants[in_other].sort_values('raw'), variants[~in_other]])
+    kept = ~variants['key'].duplicated()
+    if kept.all():
+        return df
+    keys = variants['key'].where(kept, variants['key'] + '\x1f' + variants['raw'])
+    df[KEY_COLUMN] = raw.map(pd.Series(keys.to_numpy(), index=variants['raw'].to_numpy()))
+    return df
+
+
+def compare_fuzzy(df1, df2, key_columns, duplicate_mode=DUPLICATE_FIRST, threshold=DEFAULT_THRESHOLD,
+                  tolerance=None):
+    """
+    模糊键匹配对比：规范化后的键精确匹配，剩余的键按相似度配对。
+
+    原始键不完全相同的配对状态为“模糊匹配”（其中值不同的字段仍在差异字段列中列出），
+    两侧都有的行在匹配得分列给出相似度（完全相同或规范化后相同为 1）。
+    重复键只取首条时，同一文件中原始键不同、规范化后相同的行都会保留（见 _separate_variants）。
+    """
+    validate_key_columns(key_columns)
+    if not 0 < threshold <= 1:
+        raise ValueError("相似度阈值必须在0到1之间")
+    df1 = df1.copy()
+    df2 = df2.copy()
+    # 原始键在对齐前生成：外连接会把含空位的整数列转为浮点数，对齐后再拼接会得到 '101.0'
+    df1[RAW_KEY_COLUMN] = build_key(df1, key_columns)
+    df2[RAW_KEY_COLUMN] = build_key(df2, key_columns)
+    df1[KEY_COLUMN] = normalized_key(df1, key_columns)
+    df2[KEY_COLUMN] = normalized_key(df2, key_columns)
+
+    keys1 = pd.Index(df1[KEY_COLUMN].unique())
+    keys2 = pd.Index(df2[KEY_COLUMN].unique())
+    pairs = match_keys(keys1.difference(keys2), keys2.difference(keys1), threshold)
+
+    # 文件2中配对成功的键改写为文件1中对应的键，之后按普通方式对齐和比较
+    mapped = df2[KEY_COLUMN].map(pd.Series(pairs['key1'].to_numpy(), index=pairs['key2'].to_numpy()))
+    df2[KEY_COLUMN] = mapped.where(mapped.notna(), df2[KEY_COLUMN])
+    if duplicate_mode == DUPLICATE_FIRST:
+        raw1 = df1[RAW_KEY_COLUMN]
+        df1 = _separate_variants(df1, df2[RAW_KEY_COLUMN])
+        df2 = _separate_variants(df2, raw1)
+
+    aligned = align_frames(df1, df2, duplicate_mode, extra_columns=[RAW_KEY_COLUMN])
+    result = classify_aligned(aligned, key_columns, tolerance=tolerance)
+
+    # 原始键（未规范化）不同的配对标记为模糊匹配，匹配字段显示原始键
+    merged = aligned.merged
+    in_file1 = aligned.in_file1
+    in_both = in_file1 & aligned.in_file2
+    raw1 = merged[f'文件1_{RAW_KEY_COLUMN}'].to_numpy()
+    raw2 = merged[f'文件2_{RAW_KEY_COLUMN}'].to_numpy()
+    is_fuzzy = in_both & (raw1 != raw2)
+
+    scores = merged[KEY_COLUMN].map(pd.Series(pairs['score'].to_numpy(), index=pairs['key1'].to_numpy()))
+    scores = scores.where(scores.notna(), 1.0).where(in_both).round(3)
+
+    comparison_df = result.comparison_df
+    comparison_df[MATCH_COLUMN] = np.where(in_file1, raw1, raw2)
+    comparison_df[STATUS_COLUMN] = np.where(is_fuzzy, STATUS_FUZZY, comparison_df[STATUS_COLUMN])
+    comparison_df[SCORE_COLUMN] = scores.to_numpy()
+    status_order = list(result.status_counts) + [STATUS_FUZZY]
+    status_counts = comparison_df[STATUS_COLUMN].value_counts().reindex(status_order, fill_value=0)
+    result.status_counts = {status: int(count) for status, count in status_counts.items()}
+    return result
@@ -0,0 +1,423 @@
+import codecs
+import csv
+import io
+import zlib
+from functools import lru_cache
+from io import BytesIO
+from xml.etree.ElementTree import iterparse
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.utils import column_index_from_string
+from pandas.io.parsers import TextParser
+
+try:
+    from openpyxl.worksheet._reader import ROW_TAG, VALUE_TAG, WorkSheetParser
+except ImportError:  # openpyxl 内部接口变化时改用公开接口逐行读取
+    WorkSheetParser = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # 未安装 pyarrow 时用 pandas 单线程读取 CSV
+    pa = pa_csv = None
+
+from compare_cache import content_hash, entry_key
+from compare_engine import FIXED_COLUMNS
+
+# 不同值的数量不超过行数的这个比例时转为分类类型
+CATEGORY_MAX_RATIO = 0.5
+# 读取、标准化方式的版本：读取结果会变化的修改（如跳过空行、数值文本规整）都要加1，磁盘缓存中旧版本的条目不再使用
+READER_VERSION = 2
+
+# 读取文件开头的这么多字节用于识别格式、编码和分隔符
+TEXT_SAMPLE_BYTES = 64 * 1024
+# pandas 读取工作簿时在前这么多行中查找表头（跳过之前的空行）
+HEADER_SEARCH_ROWS = 100
+# 依次尝试的文本编码：UTF-8（含 BOM），否则按 GB18030（兼容 GBK、GB2312）
+TEXT_ENCODINGS = ['utf-8', 'gb18030']
+
+_ZIP_MAGIC = b'PK\x03\x04'           # xlsx
+_OLE_MAGIC = b'\xd0\xcf\x11\xe0'   # xls
+_GZIP_MAGIC = b'\x1f\x8b'
+
+
+class InputFormatError(ValueError):
+    """输入文件无法映射到固定表头"""
+
+
+# ========================
+# CSV/TSV 读取
+# ========================
+def source_head(source, size=TEXT_SAMPLE_BYTES):
+    """文件开头的若干字节；source 为文件路径、文件内容（bytes）或文件对象（不改变读取位置）"""
+    if isinstance(source, bytes):
+        return source[:size]
+    if hasattr(source, 'read'):
+        position = source.tell()
+        head = source.read(size)
+        source.seek(position)
+        return head
+    with open(source, 'rb') as f:
+        return f.read(size)
+
+
+def is_xlsx(head):
+    """xlsx（zip 压缩包）"""
+    return head.startswith(_ZIP_MAGIC)
+
+
+def is_text_table(head):
+    """不是 xlsx（zip）或 xls（OLE）的文件都按 CSV/TSV 文本读取（可以是 gzip 压缩的）"""
+    return not head.startswith((_ZIP_MAGIC, _OLE_MAGIC))
+
+
+def text_sample(head):
+    """文本开头部分：gzip 压缩的文件先解压开头"""
+    if head.startswith(_GZIP_MAGIC):
+        return zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(head, TEXT_SAMPLE_BYTES)
+    return head
+
+
+def detect_encoding(sample):
+    """按 TEXT_ENCODINGS 的顺序返回第一个能解码文本开头的编码（末尾被截断的多字节字符不算错误）"""
+    for encoding in TEXT_ENCODINGS:
+        try:
+            codecs.getincrementaldecoder(encoding)().decode(sample)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    raise InputFormatError(f"无法识别文件编码（支持 {'、'.join(TEXT_ENCODINGS)}）")
+
+
+def detect_delimiter(sample):
+    """按首行中制表符和逗号的数量判断分隔符（GBK 的多字节字符中不会出现这两个字节）"""
+    first_line = sample.split(b'\n', 1)[0]
+    return '\t' if first_line.count(b'\t') > first_line.count(b',') else ','
+
+
+def _text_source(source):
+    """pandas/pyarrow 可以直接读取的来源：文件内容（bytes）转为 BytesIO"""
+    return BytesIO(source) if isinstance(source, bytes) else source
+
+
+def _trim_header(header):
+    """去掉表头末尾的空单元格"""
+    header = list(header)
+    while header and header[-1] in (None, ''):
+        header.pop()
+    return header
+
+
+def read_text_table(source, select, nrows=None):
+    """
+    读取 CSV/TSV（可以是 gzip 压缩的），自动识别编码和分隔符，空字段读为空值（与 Excel 的空单元格一致）。
+
+    select(表头) 返回要读取的列号列表，只读取这些列（按列表顺序）；
+    安装了 pyarrow 时用多线程的列式读取器，给出 nrows（抽样）或未安装 pyarrow 时用 pandas 读取。
+    """
+    head = source_head(source)
+    sample = text_sample(head)
+    encoding = detect_encoding(sample)
+    delimiter = detect_delimiter(sample)
+    compression = 'gzip' if head.startswith(_GZIP_MAGIC) else None
+    text = codecs.getincrementaldecoder(encoding)().decode(sample).lstrip('\ufeff')
+    positions = select(_trim_header(next(csv.reader(io.StringIO(text), delimiter=delimiter), [])))
+    if pa_csv is None or nrows is not None:
+        df = pd.read_csv(
+            _text_source(source), sep=delimiter, encoding='utf-8-sig' if encoding == 'utf-8' else encoding,
+            compression=compression, nrows=nrows, usecols=positions
+        )
+        # usecols 按文件中的顺序返回各列
+        return df.iloc[:, [sorted(positions).index(position) for position in positions]]
+    stream = pa.input_stream(pa.py_buffer(source) if isinstance(source, bytes) else source, compression=compression)
+    table = pa_csv.read_csv(
+        stream,
+        read_options=pa_csv.ReadOptions(skip_rows=1, autogenerate_column_names=True, encoding=encoding),
+        parse_options=pa_csv.ParseOptions(delimiter=delimiter),
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=[f'f{position}' for position in positions], strings_can_be_null=True
+        )
+    )
+    return table.to_pandas()
+
+
+# ========================
+# xlsx 按列读取
+# ========================
+@lru_cache(maxsize=None)
+def _column_number(letters):
+    return column_index_from_string(letters)
+
+
+def _convert_cell(value, data_type):
+    """单元格值与 pandas.read_excel 的转换规则一致：空单元格为 ""，错误值为 NaN，整数值的小数转为整数"""
+    if value is None:
+        return ''
+    if data_type == 'e':
+        return np.nan
+    if data_type == 'n':
+        number = int(value)
+        return number if number == value else float(value)
+    return value
+
+
+def _worksheet(workbook, sheet_name):
+    return workbook.worksheets[sheet_name] if isinstance(sheet_name, int) else workbook[sheet_name]
+
+
+def _xlsx_rows(source, select, sheet_name=0, nrows=None):
+    """
+    逐行扫描工作表 XML，只对 select(表头) 选中的列做类型转换，返回与 pandas.read_excel 一致的行数据
+    （表头行 + 数据行；缺失的行补为空行，末尾的空行去掉）。第一个有值的行作为表头，之前的空行跳过。
+
+    其余单元格只判断是否有值（决定该行是不是空行），不解析内容，宽表只取几列时读取快很多。
+    依赖 openpyxl 的内部接口（requirements.txt 中固定了 openpyxl 的版本范围），
+    接口变化导致的异常由 read_columns 捕获后改用公开接口读取（_xlsx_rows_public）。
+    """
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        worksheet = _worksheet(workbook, sheet_name)
+        with worksheet._get_source() as src:
+            parser = WorkSheetParser(
+                src, worksheet._shared_strings, data_only=True, epoch=workbook.epoch,
+                date_formats=workbook._date_formats, timedelta_formats=workbook._timedelta_formats
+            )
+            rows = []
+            wanted = None
+            empty_row = None
+            header_row = None
+            last_row_with_data = -1
+            row_number = 0
+            for _, element in iterparse(src):
+                if element.tag != ROW_TAG:
+                    continue
+                row_number = int(element.get('r') or row_number + 1)
+
+                if wanted is None:
+                    # 表头行：解析所有单元格；表头之前的空行跳过
+                    header = {}
+                    for cell in element:
+                        parsed = parser.parse_cell(cell)
+                        header[parsed['column']] = parsed['value']
+                    element.clear()
+                    if all(value in (None, '') for value in header.values()):
+                        continue
+                    header_row = row_number
+                    names = [header.get(column) for column in range(1, max(header) + 1)]
+                    wanted = {position + 1: i for i, position in enumerate(select(_trim_header(names)))}
+                    empty_row = [''] * len(wanted)
+                    rows.append([_convert_cell(header.get(column), 's') for column in wanted])
+                    last_row_with_data = 0
+                    continue
+
+                while len(rows) < row_number - header_row:
+                    rows.append(empty_row)
+                values = [''] * len(wanted)
+                has_data = False
+                column = 0
+                for cell in element:
+                    coordinate = cell.get('r')
+                    column = _column_number(coordinate.rstrip('0123456789')) if coordinate else column + 1
+                    index = wanted.get(column)
+                    if index is not None:
+                        parser.row_counter = row_number
+                        parser.col_counter = column - 1
+                        parsed = parser.parse_cell(cell)
+                        value = _convert_cell(parsed['value'], parsed['data_type'])
+                        values[index] = value
+                        has_data = has_data or value != ''
+                    elif not has_data:
+                        has_data = cell.findtext(VALUE_TAG) is not None or cell.get('t') == 'inlineStr'
+                element.clear()
+                rows.append(values)
+                if has_data:
+                    last_row_with_data = len(rows) - 1
+                if nrows is not None and len(rows) > nrows:
+                    break
+            if wanted is None:
+                select([])
+    finally:
+        workbook.close()
+    return rows[:last_row_with_data + 1]
+
+
+def _xlsx_rows_public(source, select, sheet_name=0, nrows=None):
+    """
+    与 _xlsx_rows 结果相同，只使用 openpyxl 的公开接口（只读模式的 iter_rows）：
+    每个单元格都会解析，比 _xlsx_rows 慢，但仍只读取一遍文件。
+    """
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = []
+        positions = None
+        last_row_with_data = -1
+        for row in _worksheet(workbook, sheet_name).iter_rows():
+            if positions is None:
+                # 表头行；表头之前的空行跳过
+                names = [cell.value for cell in row]
+                if all(value in (None, '') for value in names):
+                    continue
+                positions = select(_trim_header(names))
+                rows.append([_convert_cell(names[p] if p < len(names) else None, 's') for p in positions])
+                last_row_with_data = 0
+                continue
+            rows.append([_convert_cell(row[p].value, row[p].data_type) if p < len(row) else '' for p in positions])
+            if any(cell.value is not None for cell in row):
+                last_row_with_data = len(rows) - 1
+            if nrows is not None and len(rows) > nrows:
+                break
+        if positions is None:
+            select([])
+    finally:
+        workbook.close()
+    return rows[:last_row_with_data + 1]
+
+
+def read_columns(source, select, sheet_name=0, nrows=None):
+    """
+    只读取需要的列：select(表头) 根据表头（第一行各列的名称）返回要读取的列号列表（从0开始），
+    返回的数据表按该列表的顺序排列各列。
+
+    xlsx/xls 读取指定工作表（默认第一个），其他文件按 CSV/TSV 读取；格式按文件内容识别，与扩展名无关。
+    nrows 为只读取的数据行数（用于抽样）。
+    """
+    head = source_head(source)
+    if is_text_table(head):
+        return read_text_table(source, select, nrows)
+    if not is_xlsx(head):
+        return _read_excel_columns(source, select, sheet_name, nrows)
+    rows = None
+    if WorkSheetParser is not None:
+        position = source.tell() if hasattr(source, 'tell') else None
+        try:
+            rows = _xlsx_rows(source, select, sheet_name, nrows)
+        except InputFormatError:
+            raise
+        except Exception:  # openpyxl 内部接口变化（AttributeError、TypeError 等）时改用公开接口读取
+            if position is not None:
+                source.seek(position)
+    if rows is None:
+        rows = _xlsx_rows_public(source, select, sheet_name, nrows)
+    if not rows:
+        return pd.DataFrame()
+    return TextParser(rows, header=0, skip_blank_lines=False, nrows=nrows).read(nrows)
+
+
+def _read_excel_columns(source, select, sheet_name=0, nrows=None):
+    """
+    用 pandas.read_excel 读取 xls：先读表头，再只转换需要的列。
+
+    与 _xlsx_rows 一致，第一个有值的行作为表头（只在前 HEADER_SEARCH_ROWS 行中查找）。
+    """
+    position = source.tell() if hasattr(source, 'tell') else None
+
+    def read(**kwargs):
+        if position is not None:
+            source.seek(position)
+        return pd.read_excel(source, sheet_name=sheet_name, **kwargs)
+
+    top = read(header=None, nrows=HEADER_SEARCH_ROWS)
+    filled = np.flatnonzero(top.notna().any(axis=1).to_numpy())
+    skip = int(filled[0]) if len(filled) else 0
+    positions = select(_trim_header(read(skiprows=skip, nrows=0).columns))
+    df = read(skiprows=skip, nrows=nrows, usecols=positions)
+    return df.iloc[:, [sorted(positions).index(position) for position in positions]]
+
+
+def load_normalized(source, label='文件', sheet_name=0, mapping=None, nrows=None):
+    """
+    读取文件并标准化为固定表头，只解析用到的5列。
+
+    默认取前5列；给出 mapping（compare_mapping.ColumnMapping）时按表头名称找到各字段所在的列。
+    """
+    def select(header):
+        if mapping is not None:
+            return mapping.resolve(header, label)
+        if len(header) < len(FIXED_COLUMNS):
+            raise InputFormatError(f"{label}的列数少于{len(FIXED_COLUMNS)}列，无法映射到固定表头")
+        return list(range(len(FIXED_COLUMNS)))
+
+    df = read_columns(source, select, sheet_name, nrows)
+    if len(df.columns) < len(FIXED_COLUMNS):
+        raise InputFormatError(f"{label}的列数少于{len(FIXED_COLUMNS)}列，无法映射到固定表头")
+    df.columns = FIXED_COLUMNS
+    return df
+
+
+def list_sheet_names(source):
+    """工作簿中所有工作表的名称；CSV/TSV 没有工作表"""
+    if is_text_table(source_head(source)):
+        raise InputFormatError("CSV/TSV 文件没有多个工作表，请使用两个文件对比")
+    with pd.ExcelFile(source) as workbook:
+        return list(workbook.sheet_names)
+
+
+def read_source_bytes(source):
+    """文件路径或已读取的文件内容（bytes）统一转为 bytes"""
+    if isinstance(source, bytes):
+        return source
+    with open(source, 'rb') as f:
+        return f.read()
+
+
+def load_normalized_cached(source, disk_cache, label='文件', sheet_name=0, mapping=None):
+    """
+    带磁盘缓存的读取：按文件内容哈希（及表头映射方案、READER_VERSION）查找已标准化的数据，命中时不再解析xlsx。
+
+    source 为文件路径或文件内容（bytes）；disk_cache 为 None 时直接读取。
+    """
+    data = read_source_bytes(source)
+    if disk_cache is None:
+        return load_normalized(BytesIO(data), label, sheet_name, mapping)
+    variant = (READER_VERSION, sheet_name) if mapping is None else (READER_VERSION, sheet_name, repr(mapping))
+    key = entry_key(content_hash(data), *variant)
+    return disk_cache.get_or_create(key, lambda: load_normalized(BytesIO(data), label, sheet_name, mapping))
+
+
+# ========================
+# 内存优化
+# ========================
+def frame_memory_mb(*frames):
+    """数据表实际占用的内存（MB，包括字符串对象本身）"""
+    return sum(df.memory_usage(deep=True).sum() for df in frames) / 1024 / 1024
+
+
+def _compact_string_dtype():
+    """紧凑的字符串类型：安装了 pyarrow 时用 Arrow 字符串，否则不转换"""
+    try:
+        return pd.StringDtype('pyarrow')
+    except ImportError:
+        return None
+
+
+def optimize_memory(df1, df2, max_category_ratio=CATEGORY_MAX_RATIO):
+    """
+    两个文件的数据一起转为省内存的类型，返回新的 (df1, df2)。
+
+    - 不同值较少的字段（如机型、替代料）转为分类类型，两个文件使用同一组分类，
+      合并和整行哈希时仍能直接按分类编码处理，不会退回为逐个字符串
+    - 其他全部是文本的字段转为紧凑字符串类型
+    - 数值字段保持不变
+
+    转换不改变任何值，对比结果与未优化时一致。
+    """
+    df1 = df1.copy()
+    df2 = df2.copy()
+    string_dtype = _compact_string_dtype()
+    for col in FIXED_COLUMNS:
+        s1 = df1[col]
+        s2 = df2[col]
+        if pd.api.types.is_numeric_dtype(s1.dtype) or pd.api.types.is_numeric_dtype(s2.dtype):
+            continue
+        values = pd.concat([s1, s2], ignore_index=True)
+        distinct = values.dropna().unique()
+        if len(distinct) <= max_category_ratio * len(values):
+            dtype = pd.CategoricalDtype(distinct)
+            df1[col] = s1.astype(dtype)
+            df2[col] = s2.astype(dtype)
+        elif string_dtype is not None and pd.api.types.infer_dtype(values, skipna=True) == 'string':
+            df1[col] = s1.astype(string_dtype)
+            df2[col] = s2.astype(string_dtype)
+    return df1, df2
@@ -0,0 +1,316 @@
+"""
+一对多对比：一个基准工作簿（如主BOM）与多个候选工作簿（如各供应商的BOM）逐一对比
+
+基准只解析一次并整理好键（生成键、去重或编号），通过进程池初始化传给每个工作进程；
+各候选文件在进程池中并行读取、对比并各自生成报告，最后汇总为键值矩阵：
+每个键在每个候选文件中是一致、差异、缺失还是新增。
+
+命令行用法：
+    python compare_many.py 主BOM.xlsx 供应商目录/ -o 输出目录 -k 替代料
+    python compare_many.py 主BOM.xlsx 供应商A.xlsx 供应商B.xlsx -o 输出目录
+    python compare_many.py 主BOM.xlsx 供应商目录/ -o 输出目录 --mapping 供应商通用   # 按表头名称找列
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from compare_engine import (
+    FIXED_COLUMNS, KEY_MODES, KEY_MODE_TEXT, DUPLICATE_MODES, DUPLICATE_FIRST, MATCH_COLUMN, STATUS_COLUMN,
+    STATUS_SAME, STATUS_ONLY_FILE1, STATUS_ONLY_FILE2, STATUS_DIFF, STATUS_DUPLICATE,
+    add_key_column, align_prepared, build_key, classify_aligned, prepare_file1_side, validate_key_columns
+)
+from compare_io import load_normalized
+from compare_mapping import DEFAULT_MAPPING_DIR, MappingStore
+from compare_report import (
+    MATRIX_SAME, MATRIX_MISSING, MATRIX_EXTRA, MATRIX_DIFF, REPORT_FORMAT_XLSX, REPORT_FORMATS, write_matrix_report,
+    write_result_report
+)
+
+CANDIDATE_SUFFIXES = ('.xlsx', '.xls', '.csv', '.tsv', '.gz')
+MATRIX_FILE = '键值矩阵.xlsx'
+
+# 键值矩阵中的编码：同一个键有多行时取最大值（任一行有差异即为差异）
+MATRIX_LABELS = [MATRIX_SAME, MATRIX_MISSING, MATRIX_EXTRA, MATRIX_DIFF]
+_STATUS_CODES = {
+    STATUS_SAME: 0,
+    STATUS_ONLY_FILE1: 1,
+    STATUS_ONLY_FILE2: 2,
+    STATUS_DIFF: 3,
+    STATUS_DUPLICATE: 3
+}
+
+
+class SharedBaseline:
+    """已整理好的基准：对齐用的一侧数据 + 键值矩阵的键（按首次出现的顺序）+ 候选文件的读取方式"""
+
+    def __init__(self, left, rows, keys, key_columns, key_mode, duplicate_mode, low_memory, mapping=None,
+                 report_format=REPORT_FORMAT_XLSX):
+        self.left = left
+        self.rows = rows
+        self.keys = keys
+        self.key_columns = key_columns
+        self.key_mode = key_mode
+        self.duplicate_mode = duplicate_mode
+        self.low_memory = low_memory
+        self.mapping = mapping
+        self.report_format = report_format
+
+
+class CandidateResult:
+    """
+    一个候选文件的对比结果：各状态数量、报告路径，
+    以及基准中每个键在该文件中的编码（MATRIX_LABELS 的下标）和只在该文件中出现的键。
+    """
+
+    def __init__(self, name, report_path, status_counts=None, diff_counts=None, rows=None, codes=None,
+                 extra_keys=(), error=None):
+        self.name = name
+        self.report_path = report_path
+        self.status_counts = status_counts
+        self.diff_counts = diff_counts
+        self.rows = rows
+        self.codes = codes
+        self.extra_keys = list(extra_keys)
+        self.error = error
+
+
+class ManyResult:
+    """一对多对比结果：每个候选文件的结果（与输入顺序相同）+ 键值矩阵"""
+
+    def __init__(self, baseline_rows, candidates, matrix_df, matrix_path):
+        self.baseline_rows = baseline_rows
+        self.candidates = candidates
+        self.matrix_df = matrix_df
+        self.matrix_path = matrix_path
+
+    @property
+    def errors(self):
+        return {candidate.name: candidate.error for candidate in self.candidates if candidate.error}
+
+
+def list_candidates(paths, exclude=None):
+    """
+    展开候选文件：目录按文件名顺序取其中的 Excel 和 CSV/TSV 文件（跳过 Excel 的临时文件 ~$*），文件直接使用。
+
+    exclude 为基准文件路径，目录中的基准文件不作为候选文件。
+    """
+    excluded = os.path.abspath(exclude) if exclude else None
+    candidates = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                full = os.path.join(path, name)
+                if (name.lower().endswith(CANDIDATE_SUFFIXES) and not name.startswith('~$')
+                        and os.path.isfile(full) and os.path.abspath(full) != excluded):
+                    candidates.append(full)
+        else:
+            candidates.append(path)
+    return candidates
+
+
+def prepare_baseline(source, key_columns, key_mode=KEY_MODE_TEXT, duplicate_mode=DUPLICATE_FIRST,
+                     low_memory=False, mapping=None, report_format=REPORT_FORMAT_XLSX):
+    """读取基准文件，生成键并整理好对齐用的一侧数据（只做一次）；mapping 为表头映射方案（默认取前5列）"""
+    validate_key_columns(key_columns)
+    df = load_normalized(source, '基准文件', mapping=mapping)
+    keys = pd.Index(pd.unique(build_key(df, key_columns, KEY_MODE_TEXT)))
+    df = add_key_column(df, key_columns, key_mode)
+    return SharedBaseline(prepare_file1_side(df, duplicate_mode), len(df), keys, list(key_columns), key_mode,
+                          duplicate_mode, low_memory, mapping, report_format)
+
+
+def candidate_names(candidates):
+    """每个候选文件在键值矩阵中的列名：文件名（不含扩展名），重名时加序号"""
+    names = []
+    for path in candidates:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        name = stem
+        index = 2
+        while name in names:
+            name = f'{stem}_{index}'
+            index += 1
+        names.append(name)
+    return names
+
+
+# ========================
+# 工作进程
+# ========================
+_baseline = None
+
+
+def _init_worker(baseline):
+    """进程池初始化：每个工作进程只接收一次基准"""
+    global _baseline
+    _baseline = baseline
+
+
+def key_codes(comparison_df, keys):
+    """
+    按键汇总对比状态：返回基准中每个键的编码（与 keys 顺序相同）和只在候选文件中出现的键。
+
+    报告中的匹配字段按固定规则拼接，与 keys（按拼接字符串生成）一致，与键值存储方式无关。
+    """
+    codes = comparison_df[STATUS_COLUMN].map(_STATUS_CODES)
+    per_key = codes.groupby(comparison_df[MATCH_COLUMN].to_numpy(), sort=False).max()
+    in_baseline = per_key.index.isin(keys)
+    return per_key.reindex(keys).to_numpy(dtype=np.int8), list(per_key.index[~in_baseline])
+
+
+def _compare_candidate(source, name, report_path):
+    """工作进程：读取一个候选文件，与基准对比并写出报告"""
+    baseline = _baseline
+    try:
+        df = load_normalized(source, f'候选文件“{os.path.basename(source)}”', mapping=baseline.mapping)
+        df = add_key_column(df, baseline.key_columns, baseline.key_mode)
+        aligned = align_prepared(baseline.left, baseline.rows, df, baseline.duplicate_mode)
+        result = classify_aligned(aligned, baseline.key_columns)
+        write_result_report(result, report_path, baseline.report_format, baseline.low_memory)
+        codes, extra_keys = key_codes(result.comparison_df, baseline.keys)
+        return CandidateResult(name, report_path, result.status_counts, result.diff_counts, result.file2_rows,
+                               codes, extra_keys)
+    except MemoryError:
+        return CandidateResult(name, None, error="内存不足")
+    except (ValueError, OSError) as e:
+        return CandidateResult(name, None, error=str(e))
+
+
+# ========================
+# 汇总
+# ========================
+def build_matrix(baseline, candidates):
+    """
+    键值矩阵：基准中的键在前（按首次出现的顺序），之后是只在候选文件中出现的键；
+    每个候选文件一列，键不在基准和该文件中时为空；最后几列统计每个键缺失、差异、新增的文件数。
+    """
+    extra_keys = pd.Index(pd.unique(np.array(
+        [key for candidate in candidates for key in candidate.extra_keys], dtype=object
+    )))
+    keys = baseline.keys.append(extra_keys)
+    matrix = {MATCH_COLUMN: keys}
+    labels = np.array(MATRIX_LABELS + [None], dtype=object)
+    for candidate in candidates:
+        if candidate.error:
+            continue
+        # -1 表示不在基准中：在该文件中出现为新增，否则为空
+        codes = np.full(len(keys), -1, dtype=np.int8)
+        codes[:len(baseline.keys)] = candidate.codes
+        codes[len(baseline.keys) + extra_keys.get_indexer(candidate.extra_keys)] = MATRIX_LABELS.index(MATRIX_EXTRA)
+        matrix[candidate.name] = labels[codes]
+    matrix_df = pd.DataFrame(matrix)
+    values = matrix_df.drop(columns=MATCH_COLUMN)
+    for label in (MATRIX_MISSING, MATRIX_DIFF, MATRIX_EXTRA):
+        matrix_df[f'{label}文件数'] = (values == label).sum(axis=1)
+    return matrix_df
+
+
+def build_candidate_summary(baseline, candidates):
+    """每个候选文件一行：各状态数量、行数、报告文件名"""
+    statuses = [STATUS_SAME, STATUS_ONLY_FILE1, STATUS_ONLY_FILE2, STATUS_DIFF]
+    if baseline.duplicate_mode != DUPLICATE_FIRST:
+        statuses.append(STATUS_DUPLICATE)
+    rows = []
+    for candidate in candidates:
+        row = {'候选文件': candidate.name}
+        for status in statuses:
+            row[status] = candidate.status_counts.get(status, 0) if candidate.status_counts else None
+        row['基准行数'] = baseline.rows
+        row['候选文件行数'] = candidate.rows
+        row['说明'] = candidate.error or os.path.basename(candidate.report_path)
+        rows.append(row)
+    return pd.DataFrame(rows, columns=['候选文件'] + statuses + ['基准行数', '候选文件行数', '说明'])
+
+
+def compare_many(baseline_source, candidates, output_dir, key_columns, key_mode=KEY_MODE_TEXT,
+                 duplicate_mode=DUPLICATE_FIRST, low_memory=False, max_workers=None, mapping=None,
+                 report_format=REPORT_FORMAT_XLSX):
+    """
+    一个基准文件与多个候选文件逐一对比。
+
+    每个候选文件的报告按 report_format 写入 output_dir（文件名_对比报告.xlsx 等），键值矩阵写入 output_dir/键值矩阵.xlsx；
+    单个候选文件出错（格式不对、超出 xlsx 行数上限等）只记在该文件的结果中，不影响其他文件。
+    max_workers 为进程数（默认CPU核数）；low_memory=True 时各报告使用流式写入；
+    mapping 为表头映射方案，基准和所有候选文件都按它找列（默认取前5列）。
+    """
+    if not candidates:
+        raise ValueError("没有候选文件")
+    os.makedirs(output_dir, exist_ok=True)
+    baseline = prepare_baseline(
+        baseline_source, key_columns, key_mode, duplicate_mode, low_memory, mapping, report_format
+    )
+    names = candidate_names(candidates)
+    paths = [os.path.join(output_dir, f'{name}_对比报告.{report_format}') for name in names]
+
+    workers = min(max_workers or os.cpu_count() or 1, len(candidates))
+    # 与多工作表对比相同，统一使用 spawn 启动工作进程；基准在每个工作进程初始化时传入一次
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_worker,
+        initargs=(baseline,)
+    ) as pool:
+        futures = [
+            pool.submit(_compare_candidate, source, name, path) for source, name, path in zip(candidates, names, paths)
+        ]
+        results = []
+        for name, future in zip(names, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:  # 工作进程异常退出（如被系统因内存不足终止）
+                results.append(CandidateResult(name, None, error=f"工作进程出错：{e}"))
+
+    matrix_df = build_matrix(baseline, results)
+    matrix_path = os.path.join(output_dir, MATRIX_FILE)
+    write_matrix_report(matrix_df, build_candidate_summary(baseline, results), matrix_path)
+    return ManyResult(baseline.rows, results, matrix_df, matrix_path)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="一个基准文件与多个候选文件逐一对比，并生成键值矩阵")
+    parser.add_argument('baseline', help="基准Excel文件")
+    parser.add_argument('candidates', nargs='+', help="候选Excel文件或包含候选文件的目录")
+    parser.add_argument('-o', '--output-dir', required=True, help="报告输出目录")
+    parser.add_argument('-k', '--key', dest='key_columns', action='append', choices=FIXED_COLUMNS,
+                        help="用于数据匹配的字段，可重复指定（默认：替代料）")
+    parser.add_argument('--key-mode', choices=KEY_MODES, default=KEY_MODE_TEXT, help="键值存储方式")
+    parser.add_argument('--duplicates', dest='duplicate_mode', choices=DUPLICATE_MODES, default=DUPLICATE_FIRST,
+                        help="重复键处理方式：first 只取首条，occurrence 按出现顺序逐条配对")
+    parser.add_argument('--low-memory', action='store_true', help="低内存模式：流式写入各候选文件的报告")
+    parser.add_argument('--workers', type=int, help="并行对比的进程数（默认CPU核数）")
+    parser.add_argument('--format', dest='report_format', choices=REPORT_FORMATS, default=REPORT_FORMAT_XLSX,
+                        help="各候选文件的报告格式：csv、parquet 不做格式处理，速度快且没有行数上限（键值矩阵总是 xlsx）")
+    parser.add_argument('--mapping', help="按已保存的表头映射方案找列（见 compare_mapping.py）；默认取前5列")
+    parser.add_argument('--mapping-dir', default=DEFAULT_MAPPING_DIR, help="表头映射方案存储目录")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    candidates = list_candidates(args.candidates, exclude=args.baseline)
+    try:
+        mapping = MappingStore(args.mapping_dir).load(args.mapping) if args.mapping else None
+        many = compare_many(
+            args.baseline, candidates, args.output_dir, args.key_columns or ['替代料'], args.key_mode,
+            args.duplicate_mode, args.low_memory, args.workers, mapping, args.report_format
+        )
+    except (ValueError, OSError) as e:
+        print(f"❌ 处理文件时出错：{e}", file=sys.stderr)
+        return 1
+
+    for candidate in many.candidates:
+        if candidate.error:
+            print(f"[{candidate.name}] ❌ {candidate.error}")
+        else:
+            counts = '  '.join(f"{status}: {count}" for status, count in candidate.status_counts.items())
+            print(f"[{candidate.name}] {counts}")
+    print(f"键值矩阵：{many.matrix_path}（{len(many.matrix_df)} 个键）")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
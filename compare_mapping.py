@@ -0,0 +1,205 @@
+"""
+表头映射：按表头名称（及别名）找到5个固定字段所在的列，列顺序不同或有几十列的宽表也能正确对比
+
+每个固定字段总是匹配与字段同名的表头，另外可以配置任意多个别名（如“替代料”也叫“物料编码”）；
+匹配时忽略首尾空白、中间空白、大小写和全角/半角的差别。读取时只解析映射到的5列。
+
+映射方案可以保存为命名方案重复使用：
+    python compare_mapping.py save 供应商A -a 替代料=物料编码,替代物料 -a 用量=数量
+    python compare_mapping.py list
+    python compare_mapping.py show 供应商A
+    python compare_mapping.py delete 供应商A
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+import unicodedata
+
+from compare_engine import FIXED_COLUMNS
+from compare_io import InputFormatError
+
+DEFAULT_MAPPING_DIR = os.path.join(os.path.expanduser('~'), '.excel_compare', 'mappings')
+# 找不到字段时错误信息中最多列出的表头名称数
+HEADER_PREVIEW = 20
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_header(name):
+    """表头匹配用的规范化名称：全角转半角、去掉所有空白、不区分大小写"""
+    if name is None:
+        return ''
+    return _WHITESPACE.sub('', unicodedata.normalize('NFKC', str(name))).casefold()
+
+
+class ColumnMapping:
+    """
+    表头映射方案：aliases 为 {固定字段: [别名, ...]}，字段名本身总是第一个候选名称。
+
+    没有别名的映射方案也有用：按字段名找列，列顺序与固定表头不同的文件也能正确对比。
+    """
+
+    def __init__(self, aliases=None, name=None, created=None):
+        aliases = aliases or {}
+        unknown = [field for field in aliases if field not in FIXED_COLUMNS]
+        if unknown:
+            raise ValueError(f"映射字段必须是 {', '.join(FIXED_COLUMNS)} 之一，无法识别：{', '.join(unknown)}")
+        self.aliases = {field: [alias for alias in aliases.get(field, []) if alias] for field in FIXED_COLUMNS}
+        self.name = name
+        self.created = created
+
+    def names(self, field):
+        """某个字段的候选表头名称（按优先级）"""
+        return [field] + self.aliases[field]
+
+    def resolve(self, header, label='文件'):
+        """
+        在表头中找到5个固定字段所在的列，返回列号列表（从0开始，按固定字段的顺序）。
+
+        有字段找不到或两个字段映射到同一列时抛出 InputFormatError。
+        """
+        normalized = {}
+        for position, name in enumerate(header):
+            normalized.setdefault(normalize_header(name), position)
+        positions = []
+        missing = []
+        for field in FIXED_COLUMNS:
+            position = next((normalized[key] for key in map(normalize_header, self.names(field))
+                             if key in normalized), None)
+            if position is None:
+                missing.append(field)
+            positions.append(position)
+        if missing:
+            names = [str(name) for name in header if name not in (None, '')]
+            names = '、'.join(names[:HEADER_PREVIEW]) + ('…' if len(names) > HEADER_PREVIEW else '')
+            raise InputFormatError(
+                f"{label}的表头中找不到字段：{'、'.join(missing)}（表头：{names}）。请在表头映射方案中为这些字段添加别名"
+            )
+        for i, field in enumerate(FIXED_COLUMNS):
+            if positions[i] in positions[:i]:
+                other = FIXED_COLUMNS[positions.index(positions[i])]
+                raise InputFormatError(f"{label}中“{other}”和“{field}”映射到了同一列“{header[positions[i]]}”")
+        return positions
+
+    def to_dict(self):
+        return {'name': self.name, 'aliases': self.aliases, 'created': self.created}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get('aliases'), data.get('name'), data.get('created'))
+
+    def __eq__(self, other):
+        return isinstance(other, ColumnMapping) and self.aliases == other.aliases
+
+    def __hash__(self):
+        return hash(tuple(tuple(self.aliases[field]) for field in FIXED_COLUMNS))
+
+    def __repr__(self):
+        # 用于缓存键：只与别名有关，与方案名称无关
+        return f'ColumnMapping({self.aliases!r})'
+
+
+def parse_alias_args(items):
+    """命令行的别名参数：['替代料=物料编码,替代物料', ...] → {'替代料': ['物料编码', '替代物料']}"""
+    aliases = {}
+    for item in items or []:
+        field, sep, names = item.partition('=')
+        if not sep:
+            raise ValueError(f"别名格式应为 字段=别名1,别名2：{item}")
+        aliases.setdefault(field.strip(), []).extend(name.strip() for name in re.split(r'[,，]', names))
+    return aliases
+
+
+class MappingStore:
+    """映射方案存储：每个方案一个 JSON 文件"""
+
+    def __init__(self, base_dir=DEFAULT_MAPPING_DIR):
+        self.base_dir = base_dir
+        os.makedirs(base_dir, exist_ok=True)
+
+    def _path(self, name):
+        safe_name = re.sub(r'[^\w\-.]', '_', name or '')
+        if not safe_name.strip('.'):
+            raise ValueError(f"无效的映射方案名称：{name}")
+        return os.path.join(self.base_dir, safe_name + '.json')
+
+    def save(self, mapping):
+        """保存映射方案（同名方案会被覆盖）"""
+        mapping.created = time.strftime('%Y-%m-%d %H:%M:%S')
+        with open(self._path(mapping.name), 'w', encoding='utf-8') as f:
+            json.dump(mapping.to_dict(), f, ensure_ascii=False, indent=2)
+        return mapping
+
+    def load(self, name):
+        try:
+            with open(self._path(name), encoding='utf-8') as f:
+                return ColumnMapping.from_dict(json.load(f))
+        except FileNotFoundError:
+            raise ValueError(f"映射方案不存在：{name}") from None
+
+    def list(self):
+        """所有映射方案，按名称排列"""
+        mappings = []
+        for file_name in sorted(os.listdir(self.base_dir)):
+            if file_name.endswith('.json'):
+                with open(os.path.join(self.base_dir, file_name), encoding='utf-8') as f:
+                    mappings.append(ColumnMapping.from_dict(json.load(f)))
+        return mappings
+
+    def delete(self, name):
+        path = self._path(name)
+        if not os.path.exists(path):
+            return False
+        os.remove(path)
+        return True
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Excel对比工具的表头映射方案")
+    parser.add_argument('--mapping-dir', default=DEFAULT_MAPPING_DIR, help="映射方案存储目录")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    save_parser = subparsers.add_parser('save', help="保存映射方案")
+    save_parser.add_argument('name', help="方案名称")
+    save_parser.add_argument('-a', '--alias', action='append',
+                             help="字段的别名，格式：字段=别名1,别名2，可重复指定")
+
+    show_parser = subparsers.add_parser('show', help="显示映射方案")
+    show_parser.add_argument('name', help="方案名称")
+    subparsers.add_parser('list', help="列出所有映射方案")
+    delete_parser = subparsers.add_parser('delete', help="删除映射方案")
+    delete_parser.add_argument('name', help="方案名称")
+    return parser
+
+
+def _print_mapping(mapping):
+    print(f"{mapping.name}  （{mapping.created}）")
+    for field in FIXED_COLUMNS:
+        print(f"  {field}：{'、'.join(mapping.names(field))}")
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    store = MappingStore(args.mapping_dir)
+    try:
+        if args.command == 'save':
+            mapping = store.save(ColumnMapping(parse_alias_args(args.alias), args.name))
+            _print_mapping(mapping)
+        elif args.command == 'show':
+            _print_mapping(store.load(args.name))
+        elif args.command == 'list':
+            for mapping in store.list():
+                _print_mapping(mapping)
+        elif not store.delete(args.name):
+            print(f"映射方案不存在：{args.name}")
+    except (ValueError, OSError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,196 @@
+"""
+内存占用预估：解析工作簿之前，根据文件大小和抽样行估算对比所需的内存，超出预算时改用低内存方式、
+磁盘对比（compare_sqlite）或拒绝执行
+
+1. 行数：xlsx 从工作表的 dimension 标记读取（不解压整个工作表），没有标记时按已解压部分的行密度推算；
+   CSV/TSV 直接数换行符（gzip 压缩的文件边解压边计数）；
+2. 每行内存：只解析前 SAMPLE_ROWS 行，标准化后按实际内存占用计算；
+3. 峰值内存 ≈ 两个数据表的内存 × 系数（系数按 benchmarks 中 5 万～20 万行 BOM 数据实测：
+   读取、对齐、生成对比表和格式化报告的峰值约为数据表的 19～23 倍，省内存类型 + 流式报告约为 7～12 倍，
+   取各规模中的最大值）。
+
+预算默认取物理内存的一半，可用环境变量 EXCEL_COMPARE_MEMORY_BUDGET_MB 指定（设为 0 不检查）。
+"""
+import os
+import posixpath
+import re
+import zipfile
+import zlib
+from io import BytesIO
+from xml.etree import ElementTree
+
+from compare_io import is_text_table, is_xlsx, load_normalized, read_source_bytes
+
+SAMPLE_ROWS = 1000
+# 解压工作表开头的这么多字节用于读取 dimension 标记或推算行密度
+SHEET_HEAD_BYTES = 256 * 1024
+# 统计 gzip 压缩的 CSV 行数时每次解压的压缩数据大小
+GZIP_CHUNK_BYTES = 1024 * 1024
+# 峰值内存相对于两个数据表内存的倍数
+PEAK_FACTOR_IN_MEMORY = 23
+PEAK_FACTOR_LOW_MEMORY = 12
+
+MEMORY_PLAN_IN_MEMORY = 'in_memory'
+MEMORY_PLAN_LOW_MEMORY = 'low_memory'
+MEMORY_PLAN_OUT_OF_CORE = 'out_of_core'
+
+_DIMENSION = re.compile(rb'<(?:\w+:)?dimension\s+ref="(?:[A-Z]+\d+:)?[A-Z]+(\d+)"')
+_ROW_TAG = re.compile(rb'<(?:\w+:)?row[\s>]')
+_NS_MAIN = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_NS_REL = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_NS_PACKAGE_REL = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+
+def _default_budget_mb():
+    configured = os.environ.get('EXCEL_COMPARE_MEMORY_BUDGET_MB')
+    if configured:
+        return int(configured)
+    try:
+        return os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE') // 1024 // 1024 // 2
+    except (AttributeError, ValueError, OSError):  # Windows 没有 sysconf
+        return 4096
+
+
+DEFAULT_MEMORY_BUDGET_MB = _default_budget_mb()
+
+
+class MemoryBudgetError(ValueError):
+    """预计内存超出预算，无法执行对比"""
+
+
+class FrameEstimate:
+    """
+    单个文件的预估：行数、标准化后每行字节数、数据表内存（MB），
+    以及能否磁盘对比（out_of_core：磁盘对比逐行读取 xlsx 和 CSV/TSV，不支持 xls）
+    """
+
+    def __init__(self, rows, bytes_per_row, file_mb, out_of_core=True):
+        self.rows = rows
+        self.bytes_per_row = bytes_per_row
+        self.file_mb = file_mb
+        self.out_of_core = out_of_core
+
+    @property
+    def frame_mb(self):
+        return self.rows * self.bytes_per_row / 1024 / 1024
+
+
+class FootprintEstimate:
+    """两个文件对比的预估峰值内存（MB）"""
+
+    def __init__(self, estimate1, estimate2):
+        self.estimate1 = estimate1
+        self.estimate2 = estimate2
+        self.frame_mb = estimate1.frame_mb + estimate2.frame_mb
+        self.in_memory_mb = self.frame_mb * PEAK_FACTOR_IN_MEMORY
+        self.low_memory_mb = self.frame_mb * PEAK_FACTOR_LOW_MEMORY
+        self.out_of_core = estimate1.out_of_core and estimate2.out_of_core
+
+    @property
+    def rows(self):
+        return self.estimate1.rows + self.estimate2.rows
+
+
+def _first_sheet_path(workbook):
+    """工作簿中第一个工作表在压缩包内的路径"""
+    root = ElementTree.fromstring(workbook.read('xl/workbook.xml'))
+    sheet = root.find(f'{_NS_MAIN}sheets/{_NS_MAIN}sheet')
+    rels = ElementTree.fromstring(workbook.read('xl/_rels/workbook.xml.rels'))
+    for rel in rels.iter(f'{_NS_PACKAGE_REL}Relationship'):
+        if rel.get('Id') == sheet.get(f'{_NS_REL}id'):
+            target = rel.get('Target')
+            if target.startswith('/'):
+                return target.lstrip('/')
+            return posixpath.normpath(posixpath.join('xl', target))
+    raise KeyError('worksheet')
+
+
+def count_sheet_rows(data):
+    """
+    不解析单元格，估算 xlsx 第一个工作表的数据行数（不含表头）；不是 xlsx 时返回 None。
+
+    优先使用 dimension 标记；没有标记（或只有 A1）时按开头部分的行密度乘以工作表解压后的大小推算。
+    """
+    try:
+        with zipfile.ZipFile(BytesIO(data)) as workbook:
+            path = _first_sheet_path(workbook)
+            size = workbook.getinfo(path).file_size
+            with workbook.open(path) as sheet:
+                head = sheet.read(SHEET_HEAD_BYTES)
+    except (zipfile.BadZipFile, KeyError, AttributeError, ElementTree.ParseError):
+        return None
+    match = _DIMENSION.search(head)
+    if match and int(match.group(1)) > 1:
+        return int(match.group(1)) - 1
+    rows_in_head = len(_ROW_TAG.findall(head))
+    if len(head) < SHEET_HEAD_BYTES:
+        return max(rows_in_head - 1, 0)
+    return max(int(rows_in_head * size / len(head)) - 1, 0)
+
+
+def count_text_rows(data):
+    """CSV/TSV 的数据行数（不含表头）：按换行符计数，gzip 压缩的文件分块解压计数（不保留解压后的内容）"""
+    if not data.startswith(b'\x1f\x8b'):
+        return max(data.count(b'\n') + (not data.endswith(b'\n')) - 1, 0)
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    lines = 0
+    last = b'\n'
+    for start in range(0, len(data), GZIP_CHUNK_BYTES):
+        chunk = decompressor.decompress(data[start:start + GZIP_CHUNK_BYTES])
+        if chunk:
+            lines += chunk.count(b'\n')
+            last = chunk[-1:]
+    return max(lines + (last != b'\n') - 1, 0)
+
+
+def estimate_frame(source, label='文件', mapping=None):
+    """
+    预估一个文件标准化后的数据表大小：只解析前 SAMPLE_ROWS 行（mapping 为表头映射方案）。
+
+    xls 等无法直接得到行数的格式，按抽样行在文件中的平均大小推算行数（较粗略）。
+    """
+    data = read_source_bytes(source)
+    sample = load_normalized(BytesIO(data), label, mapping=mapping, nrows=SAMPLE_ROWS)
+    bytes_per_row = sample.memory_usage(deep=True).sum() / max(len(sample), 1)
+    text_table = is_text_table(data)
+    rows = count_text_rows(data) if text_table else count_sheet_rows(data)
+    if rows is None:
+        rows = len(sample)
+        if len(sample) >= SAMPLE_ROWS:
+            # 抽样行占文件的比例未知，按“每行在文件中约与内存中一样大”保守推算
+            rows = max(len(sample), int(len(data) / max(bytes_per_row, 1)))
+    return FrameEstimate(rows, bytes_per_row, len(data) / 1024 / 1024, text_table or is_xlsx(data))
+
+
+def estimate_footprint(source1, source2, mapping=None):
+    """预估两个文件对比的峰值内存"""
+    return FootprintEstimate(
+        estimate_frame(source1, '第一个文件', mapping), estimate_frame(source2, '第二个文件', mapping)
+    )
+
+
+def plan_memory(estimate, budget_mb=DEFAULT_MEMORY_BUDGET_MB, low_memory=False, out_of_core=False):
+    """
+    按预算选择执行方式：全部在内存中对比（in_memory）、省内存类型 + 流式报告（low_memory），
+    或 out_of_core=True（调用方可以使用磁盘对比）且两个文件的格式都支持时改用磁盘对比
+    （out_of_core，内存占用与行数无关）。
+
+    已选择低内存方式时直接按低内存方式判断；没有可用的方式时抛出 MemoryBudgetError；
+    budget_mb 为 0 或 None 时不检查。
+    """
+    if not budget_mb:
+        return MEMORY_PLAN_IN_MEMORY
+    if not low_memory and estimate.in_memory_mb <= budget_mb:
+        return MEMORY_PLAN_IN_MEMORY
+    if estimate.low_memory_mb <= budget_mb:
+        return MEMORY_PLAN_LOW_MEMORY
+    if out_of_core and estimate.out_of_core:
+        return MEMORY_PLAN_OUT_OF_CORE
+    hint = "请拆分文件，或在内存更大的机器上调高 EXCEL_COMPARE_MEMORY_BUDGET_MB 后重试"
+    if out_of_core:
+        hint = ("xls 文件不支持磁盘对比，请另存为 xlsx、拆分文件，"
+                "或在内存更大的机器上调高 EXCEL_COMPARE_MEMORY_BUDGET_MB 后重试")
+    raise MemoryBudgetError(
+        f"两个文件共约 {estimate.rows} 行，预计需要约 {estimate.low_memory_mb:.0f} MB 内存"
+        f"（低内存方式），超出内存预算 {budget_mb} MB，已停止对比。{hint}"
+    )
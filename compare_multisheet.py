@@ -0,0 +1,122 @@
+"""
+多工作表对比：按工作表名称配对两个工作簿，在进程池中并行解析和对比每一对工作表
+"""
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，无法限制单个进程的内存
+    resource = None
+
+from compare_engine import KEY_MODE_TEXT, DUPLICATE_FIRST, compare
+from compare_io import list_sheet_names, load_normalized
+
+
+class SheetPairing:
+    """两个工作簿的工作表配对结果"""
+
+    def __init__(self, paired, only_file1, only_file2):
+        self.paired = paired
+        self.only_file1 = only_file1
+        self.only_file2 = only_file2
+
+
+class MultiSheetResult:
+    """多工作表对比结果：每对工作表的对比结果 + 出错的工作表 + 未配对的工作表"""
+
+    def __init__(self, results, errors, pairing):
+        self.results = results
+        self.errors = errors
+        self.pairing = pairing
+
+    @property
+    def total_diff(self):
+        return sum(result.total_diff for result in self.results.values())
+
+
+def pair_sheets(names1, names2):
+    """按名称配对工作表，顺序以第一个工作簿为准"""
+    names2_set = set(names2)
+    names1_set = set(names1)
+    return SheetPairing(
+        [name for name in names1 if name in names2_set],
+        [name for name in names1 if name not in names2_set],
+        [name for name in names2 if name not in names1_set]
+    )
+
+
+def _as_path(source, tmp_dir, name):
+    """上传的文件内容（bytes）先落盘，工作进程只接收文件路径，避免每个任务都复制整个工作簿"""
+    if not isinstance(source, bytes):
+        return source
+    path = os.path.join(tmp_dir, name)
+    with open(path, 'wb') as f:
+        f.write(source)
+    return path
+
+
+def _limit_worker_memory(memory_limit_mb):
+    """进程池初始化：限制单个工作进程的地址空间大小"""
+    if memory_limit_mb and resource is not None:
+        limit = int(memory_limit_mb) * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _compare_sheet_pair(source1, source2, sheet_name, key_columns, key_mode, duplicate_mode, tolerance=None,
+                        mapping=None):
+    """工作进程：读取并对比一对同名工作表，返回 (工作表名, 对比结果, 错误信息)"""
+    try:
+        df1 = load_normalized(source1, f'第一个文件的工作表“{sheet_name}”', sheet_name, mapping)
+        df2 = load_normalized(source2, f'第二个文件的工作表“{sheet_name}”', sheet_name, mapping)
+        return sheet_name, compare(df1, df2, key_columns, key_mode, duplicate_mode, tolerance), None
+    except MemoryError:
+        return sheet_name, None, "超出单个工作进程的内存上限"
+    except ValueError as e:
+        return sheet_name, None, str(e)
+
+
+def compare_workbooks(source1, source2, key_columns, key_mode=KEY_MODE_TEXT, duplicate_mode=DUPLICATE_FIRST,
+                      max_workers=None, worker_memory_mb=None, tolerance=None, mapping=None):
+    """
+    对比两个工作簿中所有同名工作表。
+
+    source1/source2 为文件路径或文件内容（bytes）。
+    max_workers 为进程数（默认CPU核数），worker_memory_mb 为单个工作进程的内存上限（MB，仅Linux/macOS生效），
+    tolerance 为类型感知比较的设置（默认按文本精确比较），mapping 为表头映射方案（默认取前5列）。
+    """
+    with tempfile.TemporaryDirectory(prefix='excel_compare_') as tmp_dir:
+        path1 = _as_path(source1, tmp_dir, 'file1.xlsx')
+        path2 = _as_path(source2, tmp_dir, 'file2.xlsx')
+        pairing = pair_sheets(list_sheet_names(path1), list_sheet_names(path2))
+        results = {}
+        errors = {}
+        if not pairing.paired:
+            return MultiSheetResult(results, errors, pairing)
+
+        workers = min(max_workers or os.cpu_count() or 1, len(pairing.paired))
+        # Streamlit 等多线程环境下 fork 不安全，统一使用 spawn 启动工作进程
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_limit_worker_memory,
+            initargs=(worker_memory_mb,)
+        ) as pool:
+            futures = [
+                pool.submit(
+                    _compare_sheet_pair, path1, path2, name, key_columns, key_mode, duplicate_mode, tolerance, mapping
+                )
+                for name in pairing.paired
+            ]
+            for name, future in zip(pairing.paired, futures):
+                try:
+                    sheet_name, result, error = future.result()
+                except Exception as e:  # 工作进程异常退出（如被系统因内存不足终止）
+                    sheet_name, result, error = name, None, f"工作进程出错：{e}"
+                if error is None:
+                    results[sheet_name] = result
+                else:
+                    errors[sheet_name] = error
+    return MultiSheetResult(results, errors, pairing)
@@ -0,0 +1,175 @@
+"""
+对比流程分阶段性能记录：每个阶段（读取、构建键、合并、分类、写报告）的耗时、CPU时间、行数和峰值内存
+
+每次对比结束后写一行 JSON 到性能日志，用于对比服务器的容量规划：
+    {"time": "...", "mode": "two_files", "stages": [{"stage": "read", "wall_seconds": 1.2, ...}], ...}
+
+日志默认写入 ~/.excel_compare/perf.log，可用环境变量 EXCEL_COMPARE_PERF_LOG 指定其他路径（设为空则不写）。
+
+峰值内存为阶段执行期间整个进程的常驻内存（RSS）最大值，CPU时间也按整个进程统计
+（包括 pyarrow 等库的工作线程）；同一进程中同时运行的其他对比会计入其中。
+"""
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，无法读取 /proc 时不记录峰值内存
+    resource = None
+
+DEFAULT_PERF_LOG = os.environ.get(
+    'EXCEL_COMPARE_PERF_LOG', os.path.join(os.path.expanduser('~'), '.excel_compare', 'perf.log')
+)
+# 阶段执行期间采样常驻内存的间隔（秒）
+RSS_SAMPLE_INTERVAL = 0.01
+
+STAGE_LABELS = {
+    'read': '读取文件',
+    'key_build': '构建键',
+    'merge': '合并',
+    'classify': '分类',
+    'compare': '对比',
+    'report_write': '写报告'
+}
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+_log_lock = threading.Lock()
+
+
+def current_rss_mb():
+    """当前进程的常驻内存（MB）；没有 /proc 时退回进程启动以来的峰值，都不可用时为 None"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE / 1024 / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为KB，macOS 为字节
+    return peak / 1024 / (1024 if sys.platform == 'darwin' else 1)
+
+
+class _RssSampler:
+    """后台线程按固定间隔采样常驻内存，记录最大值"""
+
+    def __init__(self, interval=RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.peak = current_rss_mb()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='rss-sampler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        rss = current_rss_mb()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    def __enter__(self):
+        if self.peak is not None:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self._thread.is_alive():
+            self._stop.set()
+            self._thread.join()
+        self._sample()
+
+
+class StageProfiler:
+    """
+    按阶段记录性能数据。
+
+    用法：
+        profiler = StageProfiler()
+        with profiler.stage('merge') as stage:
+            aligned = align_frames(df1, df2)
+            stage['rows'] = len(aligned.merged)
+    """
+
+    def __init__(self):
+        self.stages = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        """记录一个阶段；阶段内可通过 stage['rows'] 设置处理的行数"""
+        record = {'stage': name, 'rows': rows}
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        with _RssSampler() as sampler:
+            yield record
+        record['wall_seconds'] = round(time.perf_counter() - wall_start, 4)
+        record['cpu_seconds'] = round(time.process_time() - cpu_start, 4)
+        record['peak_rss_mb'] = None if sampler.peak is None else round(sampler.peak, 1)
+        with self._lock:
+            self.stages.append(record)
+
+    def add(self, record):
+        """加入在别处记录好的阶段（例如缓存的读取阶段）"""
+        with self._lock:
+            self.stages.append(dict(record))
+
+    def copy(self):
+        """复制已记录的阶段，之后两者各自记录（例如同一对比的多个报告任务各用一份）"""
+        profiler = StageProfiler()
+        with self._lock:
+            profiler.stages = [dict(record) for record in self.stages]
+        return profiler
+
+    def to_dict(self):
+        with self._lock:
+            stages = [dict(record) for record in self.stages]
+        peaks = [record['peak_rss_mb'] for record in stages if record['peak_rss_mb'] is not None]
+        return {
+            'stages': stages,
+            'wall_seconds': round(sum(record['wall_seconds'] for record in stages), 4),
+            'cpu_seconds': round(sum(record['cpu_seconds'] for record in stages), 4),
+            'peak_rss_mb': max(peaks) if peaks else None
+        }
+
+    def table(self):
+        """展示用的表格行（阶段名称为中文）"""
+        with self._lock:
+            stages = list(self.stages)
+        return [{
+            '阶段': STAGE_LABELS.get(record['stage'], record['stage']),
+            '耗时（秒）': record['wall_seconds'],
+            'CPU时间（秒）': record['cpu_seconds'],
+            '行数': record['rows'],
+            '峰值内存（MB）': record['peak_rss_mb']
+        } for record in stages]
+
+
+def profile_stage(profiler, name, rows=None):
+    """profiler 为 None 时不记录（返回一个可以照常设置 rows 的空记录）"""
+    if profiler is None:
+        return nullcontext({})
+    return profiler.stage(name, rows)
+
+
+def write_perf_log(profiler, path=DEFAULT_PERF_LOG, **context):
+    """
+    把一次对比的性能数据作为一行 JSON 追加到日志文件，context 为附加字段（对比方式、匹配字段等）。
+
+    path 为空时不写；写日志失败不影响对比本身。返回写入的记录。
+    """
+    record = {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'pid': os.getpid(), **context, **profiler.to_dict()}
+    if not path:
+        return record
+    line = json.dumps(record, ensure_ascii=False)
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with _log_lock, open(path, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+    except OSError:
+        pass
+    return record
@@ -0,0 +1,577 @@
+import csv
+import html
+import os
+import tempfile
+import weakref
+
+import pandas as pd
+import xlsxwriter
+from xlsxwriter.utility import xl_col_to_name
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # 未安装 pyarrow 时不能生成 Parquet 报告
+    pa = pq = None
+
+from compare_engine import (
+    MATCH_COLUMN, STATUS_COLUMN, DIFF_FIELDS_COLUMN, DIFF_FIELDS_SEPARATOR, SCORE_COLUMN,
+    STATUS_SAME, STATUS_ONLY_FILE1, STATUS_ONLY_FILE2, STATUS_DIFF, STATUS_DUPLICATE, STATUS_FUZZY
+)
+
+# ========================
+# 报告常量
+# ========================
+COMPARE_SHEET = '精确键值对比'
+SUMMARY_SHEET = '差异汇总'
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# 报告格式：xlsx 带颜色标识；CSV、Parquet 只写对比表（含对比状态列），不做任何格式处理，没有行数上限；
+# HTML 为单个文件的网页差异视图（内联样式），只用于较小的结果
+REPORT_FORMAT_XLSX = 'xlsx'
+REPORT_FORMAT_CSV = 'csv'
+REPORT_FORMAT_PARQUET = 'parquet'
+REPORT_FORMAT_HTML = 'html'
+REPORT_FORMATS = [REPORT_FORMAT_XLSX, REPORT_FORMAT_CSV, REPORT_FORMAT_PARQUET, REPORT_FORMAT_HTML]
+REPORT_MIMES = {
+    REPORT_FORMAT_XLSX: XLSX_MIME,
+    REPORT_FORMAT_CSV: 'text/csv',
+    REPORT_FORMAT_PARQUET: 'application/vnd.apache.parquet',
+    REPORT_FORMAT_HTML: 'text/html'
+}
+# HTML 报告的行数上限：逐个单元格生成标记，行数太多时浏览器也难以打开
+HTML_MAX_ROWS = 20000
+
+# 低内存模式下每批写入的行数
+STREAM_CHUNK_ROWS = 10000
+# xlsx 单个工作表的行数上限（含表头）
+XLSX_MAX_ROWS = 1048576
+
+# 单元格格式
+FORMAT_GREEN = {'bg_color': '#C6EFCE', 'font_color': '#006100'}   # 绿：仅文件1有
+FORMAT_RED = {'bg_color': '#FFC7CE', 'font_color': '#9C0006'}     # 红：仅文件2有
+FORMAT_YELLOW = {'bg_color': '#FFEB9C', 'font_color': '#9C0000'}  # 黄：值不同的单元格
+FORMAT_ORANGE = {'bg_color': '#F8CBAD', 'font_color': '#843C0C'}  # 橙：重复键多出
+FORMAT_BLUE = {'bg_color': '#DDEBF7', 'font_color': '#1F4E78'}    # 蓝：模糊匹配
+FORMAT_HEADER = {'bold': True, 'bg_color': '#366092', 'font_color': 'white'}
+
+# 整行着色的对比状态（字段差异只标出值不同的单元格）
+STATUS_FORMATS = [
+    (STATUS_ONLY_FILE1, FORMAT_GREEN),
+    (STATUS_ONLY_FILE2, FORMAT_RED),
+    (STATUS_DUPLICATE, FORMAT_ORANGE),
+    (STATUS_FUZZY, FORMAT_BLUE)
+]
+
+# 差异汇总表中各状态的说明
+STATUS_DESCRIPTIONS = {
+    STATUS_SAME: '两个文件完全一致的数据',
+    STATUS_ONLY_FILE1: '仅出现在第一个文件的数据',
+    STATUS_ONLY_FILE2: '仅出现在第二个文件的数据',
+    STATUS_DIFF: '键相同但字段值不同的数据',
+    STATUS_DUPLICATE: '键在两个文件中都有，但另一文件中没有对应条目的重复行',
+    STATUS_FUZZY: '键不完全相同、按规范化或相似度配对的数据'
+}
+
+
+def build_summary(result):
+    """差异汇总表"""
+    statuses = list(result.status_counts)
+    summary_data = {
+        '对比状态': statuses + ['文件1总行数', '文件2总行数'],
+        '数量': [result.status_counts[status] for status in statuses] + [result.file1_rows, result.file2_rows],
+        '说明': [STATUS_DESCRIPTIONS[status] for status in statuses] + ['第一个文件总数据量', '第二个文件总数据量']
+    }
+
+    # 各字段的差异数量
+    for col, count in result.diff_counts.items():
+        summary_data['对比状态'].append(f'{STATUS_DIFF}：{col}')
+        summary_data['数量'].append(count)
+        summary_data['说明'].append(f'“{col}”值不同的数据')
+    return pd.DataFrame(summary_data)
+
+
+def _set_compare_columns(worksheet, columns):
+    """设置主表列宽"""
+    widths = {MATCH_COLUMN: 25, STATUS_COLUMN: 15, DIFF_FIELDS_COLUMN: 20, SCORE_COLUMN: 10}
+    for i, col in enumerate(columns):
+        worksheet.set_column(i, i, widths.get(col, 18))
+
+
+def _diff_cell_columns(columns, field):
+    """某个字段在主表中左右两侧的列号"""
+    return columns.index(f'文件1_{field}'), columns.index(f'文件2_{field}')
+
+
+def report_file_name(report_format=REPORT_FORMAT_XLSX):
+    """下载时使用的报告文件名"""
+    return f"精确对比报告_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.{report_format}"
+
+
+def report_format_for_path(path, default=REPORT_FORMAT_XLSX):
+    """按输出文件的扩展名确定报告格式（.csv、.parquet、.html/.htm），其他扩展名为 default"""
+    suffix = os.path.splitext(str(path))[1].lower().lstrip('.')
+    if suffix == 'htm':
+        return REPORT_FORMAT_HTML
+    return suffix if suffix in REPORT_FORMATS else default
+
+
+def _add_formats(workbook):
+    """定义格式"""
+    return {'header': workbook.add_format(FORMAT_HEADER)}
+
+
+def _add_compare_formats(workbook, worksheet, columns, row_count, diff_fields):
+    """
+    主表的条件格式：行颜色由对比状态列决定，值不同的单元格按差异字段列标出，不需要逐行、逐个单元格设置格式。
+
+    条件格式按添加顺序决定优先级：先标出值不同的单元格（模糊匹配的行中也能看到），再按对比状态整行着色。
+    """
+    if row_count == 0:
+        return
+    status_col = xl_col_to_name(columns.index(STATUS_COLUMN))
+    diff_fields_col = xl_col_to_name(columns.index(DIFF_FIELDS_COLUMN))
+    format_yellow = workbook.add_format(FORMAT_YELLOW)
+    sep = DIFF_FIELDS_SEPARATOR
+    for field in diff_fields:
+        cells = [f'{xl_col_to_name(col_idx)}2:{xl_col_to_name(col_idx)}{row_count + 1}'
+                 for col_idx in _diff_cell_columns(columns, field)]
+        worksheet.conditional_format(cells[0], {
+            'type': 'formula',
+            'multi_range': ' '.join(cells),
+            'criteria': f'=ISNUMBER(SEARCH("{sep}{field}{sep}","{sep}"&${diff_fields_col}2&"{sep}"))',
+            'format': format_yellow
+        })
+    for status, cell_format in STATUS_FORMATS:
+        worksheet.conditional_format(1, 0, row_count, len(columns) - 1, {
+            'type': 'formula',
+            'criteria': f'=${status_col}2="{status}"',
+            'format': workbook.add_format(cell_format)
+        })
+
+
+def _column_values(values):
+    """一列数据转为写入单元格的值，空值转为 None（写成空单元格）"""
+    values = values.astype(object)
+    return values.where(values.notna(), None).tolist()
+
+
+def _write_compare_sheet(workbook, sheet_name, result, formats):
+    """写入一个并排对比的主表：按列整列写入，颜色由条件格式决定"""
+    comparison_df = result.comparison_df
+    final_cols = list(comparison_df.columns)
+
+    worksheet = workbook.add_worksheet(sheet_name)
+    _set_compare_columns(worksheet, final_cols)
+    worksheet.write_row(0, 0, final_cols, formats['header'])
+    for col_idx, col in enumerate(final_cols):
+        worksheet.write_column(1, col_idx, _column_values(comparison_df[col]))
+    _add_compare_formats(workbook, worksheet, final_cols, len(comparison_df), list(result.diff_mask.columns))
+
+
+def _write_summary_sheet(writer, summary_df, formats, widths=(15, 10, 40)):
+    """写入差异汇总表"""
+    summary_df.to_excel(writer, sheet_name=SUMMARY_SHEET, index=False)
+
+    worksheet_summary = writer.sheets[SUMMARY_SHEET]
+    for i, width in enumerate(widths):
+        worksheet_summary.set_column(i, i, width)
+    for col_num, value in enumerate(summary_df.columns):
+        worksheet_summary.write(0, col_num, value, formats['header'])
+
+
+class ReportTooLargeError(ValueError):
+    """对比结果超过 xlsx 单个工作表的行数上限"""
+
+
+def check_row_count(row_count, sheet_name=COMPARE_SHEET):
+    """写报告之前检查数据行数，超过 xlsx 上限时抛出 ReportTooLargeError（不会写出被截断的报告）"""
+    if row_count + 1 > XLSX_MAX_ROWS:
+        raise ReportTooLargeError(
+            f"工作表“{sheet_name}”的对比结果共 {row_count} 行，超过 xlsx 单个工作表 {XLSX_MAX_ROWS - 1} 行数据的上限，"
+            f"无法生成Excel报告。请拆分文件或缩小对比范围后重试"
+        )
+
+
+def check_report_rows(result, sheet_name=COMPARE_SHEET):
+    """检查对比结果能否写入一个 xlsx 工作表"""
+    check_row_count(len(result.comparison_df), sheet_name)
+
+
+def write_report(result, output):
+    """
+    生成精确对比的Excel报告。
+
+    output 可以是文件路径，也可以是 BytesIO 等可写对象；行数超过 xlsx 上限时抛出 ReportTooLargeError。
+    """
+    check_report_rows(result)
+    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+        formats = _add_formats(writer.book)
+        _write_compare_sheet(writer.book, COMPARE_SHEET, result, formats)
+        _write_summary_sheet(writer, build_summary(result), formats)
+
+    return output
+
+
+# ========================
+# 多工作表报告
+# ========================
+def build_multi_summary(multi):
+    """多工作表对比的合并差异汇总：每对工作表一行"""
+    statuses = []
+    for result in multi.results.values():
+        statuses += [status for status in result.status_counts if status not in statuses]
+    if not statuses:
+        statuses = [STATUS_SAME, STATUS_ONLY_FILE1, STATUS_ONLY_FILE2, STATUS_DIFF]
+
+    rows = []
+    for name in multi.pairing.paired:
+        row = {'工作表': name}
+        result = multi.results.get(name)
+        for status in statuses:
+            row[status] = result.status_counts.get(status, 0) if result else None
+        row['文件1总行数'] = result.file1_rows if result else None
+        row['文件2总行数'] = result.file2_rows if result else None
+        row['说明'] = multi.errors.get(name, '')
+        rows.append(row)
+    for name in multi.pairing.only_file1:
+        rows.append({'工作表': name, '说明': '仅第一个工作簿有此工作表'})
+    for name in multi.pairing.only_file2:
+        rows.append({'工作表': name, '说明': '仅第二个工作簿有此工作表'})
+    return pd.DataFrame(rows, columns=['工作表'] + statuses + ['文件1总行数', '文件2总行数', '说明'])
+
+
+def report_sheet_name(name):
+    """工作表对应的报告工作表名（避开差异汇总表的名称）"""
+    return f'{name}(对比)'[:31] if name == SUMMARY_SHEET else name
+
+
+def write_multi_report(multi, output):
+    """
+    生成多工作表对比报告：合并的差异汇总表 + 每对工作表一个对比表。
+
+    output 可以是文件路径，也可以是 BytesIO 等可写对象；任一工作表超过 xlsx 行数上限时抛出 ReportTooLargeError。
+    """
+    for name, result in multi.results.items():
+        check_report_rows(result, report_sheet_name(name))
+    summary_df = build_multi_summary(multi)
+    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+        formats = _add_formats(writer.book)
+        _write_summary_sheet(writer, summary_df, formats, widths=[20] + [12] * (len(summary_df.columns) - 2) + [40])
+        for name, result in multi.results.items():
+            _write_compare_sheet(writer.book, report_sheet_name(name), result, formats)
+
+    return output
+
+
+# ========================
+# 一对多对比的键值矩阵
+# ========================
+MATRIX_SHEET = '键值矩阵'
+MATRIX_SUMMARY_SHEET = '文件汇总'
+MATRIX_SAME = '一致'
+MATRIX_MISSING = '缺失'
+MATRIX_EXTRA = '新增'
+MATRIX_DIFF = '差异'
+# 与两个文件对比的颜色一致：缺失（仅基准有）为绿，新增（仅候选文件有）为红，差异为黄
+MATRIX_FORMATS = [
+    (MATRIX_MISSING, FORMAT_GREEN),
+    (MATRIX_EXTRA, FORMAT_RED),
+    (MATRIX_DIFF, FORMAT_YELLOW)
+]
+
+
+def write_matrix_report(matrix_df, summary_df, path):
+    """
+    生成一对多对比的键值矩阵报告：每个键一行，每个候选文件一列（一致、差异、缺失、新增），
+    另有每个候选文件一行的汇总表。
+
+    按行流式写入，单元格颜色由条件格式决定；行数超过 xlsx 上限时抛出 ReportTooLargeError。
+    """
+    check_row_count(len(matrix_df), MATRIX_SHEET)
+    columns = list(matrix_df.columns)
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+    try:
+        format_header = workbook.add_format(FORMAT_HEADER)
+
+        worksheet_summary = workbook.add_worksheet(MATRIX_SUMMARY_SHEET)
+        worksheet_summary.set_column(0, 0, 30)
+        worksheet_summary.set_column(1, len(summary_df.columns) - 2, 12)
+        worksheet_summary.set_column(len(summary_df.columns) - 1, len(summary_df.columns) - 1, 40)
+        worksheet_summary.write_row(0, 0, list(summary_df.columns), format_header)
+        for row_idx, row in enumerate(_iter_rows(summary_df), start=1):
+            worksheet_summary.write_row(row_idx, 0, row)
+
+        worksheet = workbook.add_worksheet(MATRIX_SHEET)
+        worksheet.set_column(0, 0, 25)
+        worksheet.set_column(1, len(columns) - 1, 12)
+        worksheet.freeze_panes(1, 1)
+        worksheet.write_row(0, 0, columns, format_header)
+        for row_idx, row in enumerate(_iter_rows(matrix_df), start=1):
+            worksheet.write_row(row_idx, 0, row)
+        if len(matrix_df) > 0 and len(columns) > 1:
+            for label, cell_format in MATRIX_FORMATS:
+                worksheet.conditional_format(1, 1, len(matrix_df), len(columns) - 1, {
+                    'type': 'cell',
+                    'criteria': '==',
+                    'value': f'"{label}"',
+                    'format': workbook.add_format(cell_format)
+                })
+    finally:
+        workbook.close()
+    return path
+
+
+# ========================
+# 低内存（流式）报告
+# ========================
+def _iter_rows(df, chunk_rows=STREAM_CHUNK_ROWS):
+    """按顺序分批取出数据行，空值转为 None（写成空单元格）"""
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start+chunk_rows].astype(object)
+        chunk = chunk.where(chunk.notna(), None)
+        yield from chunk.itertuples(index=False, name=None)
+
+
+def write_streaming_report(result, path):
+    """
+    低内存模式生成Excel报告。
+
+    使用 xlsxwriter 的 constant_memory 模式按行顺序写入，写完的行立即落盘；
+    行颜色由对比状态列上的条件格式决定，不再逐行设置格式；
+    值不同的单元格按差异字段列上的条件格式标出。
+    行数超过 xlsx 上限时抛出 ReportTooLargeError。
+    """
+    check_report_rows(result)
+    comparison_df = result.comparison_df
+    return write_streaming_rows(
+        path, list(comparison_df.columns), _iter_rows(comparison_df), len(comparison_df),
+        list(result.diff_mask.columns), build_summary(result)
+    )
+
+
+def write_streaming_rows(path, columns, rows, row_count, diff_fields, summary_df):
+    """
+    按行流式写入报告：rows 为按报告顺序逐行产生的值（如数据库游标），不需要整个对比表在内存中。
+
+    row_count 为总行数（写入前检查 xlsx 上限并确定条件格式的范围），diff_fields 为参与比较的字段。
+    """
+    check_row_count(row_count)
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+    try:
+        format_header = workbook.add_format(FORMAT_HEADER)
+
+        # 主表
+        worksheet = workbook.add_worksheet(COMPARE_SHEET)
+        _set_compare_columns(worksheet, columns)
+        worksheet.write_row(0, 0, columns, format_header)
+        for row_idx, row in enumerate(rows, start=1):
+            worksheet.write_row(row_idx, 0, row)
+        _add_compare_formats(workbook, worksheet, columns, row_count, diff_fields)
+
+        # 差异汇总表
+        worksheet_summary = workbook.add_worksheet(SUMMARY_SHEET)
+        worksheet_summary.set_column(0, 0, 15)
+        worksheet_summary.set_column(1, 1, 10)
+        worksheet_summary.set_column(2, 2, 40)
+        worksheet_summary.write_row(0, 0, list(summary_df.columns), format_header)
+        for row_idx, row in enumerate(summary_df.itertuples(index=False, name=None), start=1):
+            worksheet_summary.write_row(row_idx, 0, row)
+    finally:
+        workbook.close()
+    return path
+
+
+class ReportFile:
+    """写在临时文件中的报告，对象被回收时自动删除文件"""
+
+    def __init__(self, path):
+        self.path = path
+        self._finalizer = weakref.finalize(self, _remove_file, path)
+
+    @property
+    def size(self):
+        return os.path.getsize(self.path)
+
+    def open(self):
+        return open(self.path, 'rb')
+
+    def remove(self):
+        self._finalizer()
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def report_tempfile(write, report_format=REPORT_FORMAT_XLSX):
+    """调用 write(path) 把报告写入临时文件，返回 ReportFile 供下载；写入失败时删除临时文件"""
+    fd, path = tempfile.mkstemp(prefix='精确对比报告_', suffix=f'.{report_format}')
+    os.close(fd)
+    report = ReportFile(path)
+    try:
+        write(path)
+    except Exception:
+        report.remove()
+        raise
+    return report
+
+
+def write_streaming_report_tempfile(result):
+    """低内存模式把报告写入临时文件，返回 ReportFile 供下载"""
+    return report_tempfile(lambda path: write_streaming_report(result, path))
+
+
+# ========================
+# 其他报告格式：CSV、Parquet、HTML
+# ========================
+def available_report_formats():
+    """当前环境可以生成的报告格式（未安装 pyarrow 时没有 Parquet）"""
+    return [fmt for fmt in REPORT_FORMATS if fmt != REPORT_FORMAT_PARQUET or pq is not None]
+
+
+def write_csv_rows(path, columns, rows):
+    """按行流式写入 CSV（UTF-8 带 BOM，Excel 可直接打开），空值写为空字段"""
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        writer.writerows(rows)
+    return path
+
+
+def _require_pyarrow():
+    if pq is None:
+        raise ValueError("生成 Parquet 报告需要安装 pyarrow")
+
+
+def write_parquet_rows(path, columns, rows, chunk_rows=STREAM_CHUNK_ROWS):
+    """按行流式写入 Parquet：每 chunk_rows 行一个行组，所有列按文本保存"""
+    _require_pyarrow()
+    schema = pa.schema([(col, pa.string()) for col in columns])
+    with pq.ParquetWriter(path, schema) as writer:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= chunk_rows:
+                writer.write_table(_text_table(batch, schema))
+                batch = []
+        if batch:
+            writer.write_table(_text_table(batch, schema))
+    return path
+
+
+def _text_table(batch, schema):
+    """一批行转为全部是文本列的 Arrow 表"""
+    return pa.table([
+        pa.array([None if value is None else str(value) for value in column], type=pa.string())
+        for column in zip(*batch)
+    ], schema=schema)
+
+
+def _arrow_column(series):
+    """数据表的一列转为 Arrow 数组；同一列中数值和文本混杂时（如型号）整列按文本保存"""
+    try:
+        return pa.array(series, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array(series.where(series.isna(), series.astype(str)), type=pa.string(), from_pandas=True)
+
+
+def write_parquet_frame(df, path):
+    """数据表写入 Parquet：保留数值、分类等类型"""
+    _require_pyarrow()
+    table = pa.table([_arrow_column(df[col]) for col in df.columns], names=[str(col) for col in df.columns])
+    pq.write_table(table, path, row_group_size=STREAM_CHUNK_ROWS * 10)
+    return path
+
+
+_HTML_STYLE = f"""
+body {{ font-family: sans-serif; font-size: 13px; margin: 16px; }}
+table {{ border-collapse: collapse; margin-bottom: 24px; }}
+th {{ background: {FORMAT_HEADER['bg_color']}; color: {FORMAT_HEADER['font_color']}; position: sticky; top: 0; }}
+th, td {{ border: 1px solid #D9D9D9; padding: 2px 6px; white-space: nowrap; }}
+""" + ''.join(
+    f"tr.s{i} td {{ background: {cell_format['bg_color']}; color: {cell_format['font_color']}; }}\n"
+    for i, (_, cell_format) in enumerate(STATUS_FORMATS)
+) + f"td.diff {{ background: {FORMAT_YELLOW['bg_color']}; color: {FORMAT_YELLOW['font_color']}; }}\n"
+
+
+def _html_cell(value, css_class=None):
+    text = '' if value is None else html.escape(str(value))
+    return f'<td class="{css_class}">{text}</td>' if css_class else f'<td>{text}</td>'
+
+
+def write_html_rows(path, columns, rows, row_count, diff_fields, summary_df):
+    """
+    按行写入单个文件的 HTML 差异视图：差异汇总 + 对比表，颜色与 Excel 报告一致（整行按对比状态着色，
+    值不同的单元格标黄）。行数超过 HTML_MAX_ROWS 时抛出 ReportTooLargeError。
+    """
+    if row_count > HTML_MAX_ROWS:
+        raise ReportTooLargeError(
+            f"对比结果共 {row_count} 行，超过 HTML 报告 {HTML_MAX_ROWS} 行的上限，请改用 CSV 或 Parquet 格式"
+        )
+    status_index = columns.index(STATUS_COLUMN)
+    diff_fields_index = columns.index(DIFF_FIELDS_COLUMN)
+    status_classes = {status: f's{i}' for i, (status, _) in enumerate(STATUS_FORMATS)}
+    diff_columns = {field: _diff_cell_columns(columns, field) for field in diff_fields}
+    header = ''.join(f'<th>{html.escape(str(col))}</th>' for col in columns)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f'<!DOCTYPE html>\n<html lang="zh"><head><meta charset="utf-8"><title>精确对比报告</title>'
+                f'<style>{_HTML_STYLE}</style></head><body>\n')
+        f.write(f'<h2>{SUMMARY_SHEET}</h2>\n<table><tr>')
+        f.write(''.join(f'<th>{html.escape(str(col))}</th>' for col in summary_df.columns))
+        f.write('</tr>\n')
+        for row in summary_df.itertuples(index=False, name=None):
+            f.write('<tr>' + ''.join(_html_cell(value) for value in row) + '</tr>\n')
+        f.write(f'</table>\n<h2>{COMPARE_SHEET}</h2>\n<table><tr>{header}</tr>\n')
+        for row in rows:
+            diff_cells = set()
+            if row[diff_fields_index]:
+                for field in str(row[diff_fields_index]).split(DIFF_FIELDS_SEPARATOR):
+                    diff_cells.update(diff_columns.get(field, ()))
+            css_class = status_classes.get(row[status_index])
+            cells = ''.join(_html_cell(value, 'diff' if i in diff_cells else None) for i, value in enumerate(row))
+            f.write(f'<tr class="{css_class}">{cells}</tr>\n' if css_class else f'<tr>{cells}</tr>\n')
+        f.write('</table>\n</body></html>\n')
+    return path
+
+
+def write_rows_report(path, columns, rows, row_count, diff_fields, summary_df, report_format=REPORT_FORMAT_XLSX):
+    """按行流式写入指定格式的报告（xlsx 使用 write_streaming_rows）"""
+    if report_format == REPORT_FORMAT_CSV:
+        return write_csv_rows(path, columns, rows)
+    if report_format == REPORT_FORMAT_PARQUET:
+        return write_parquet_rows(path, columns, rows)
+    if report_format == REPORT_FORMAT_HTML:
+        return write_html_rows(path, columns, rows, row_count, diff_fields, summary_df)
+    return write_streaming_rows(path, columns, rows, row_count, diff_fields, summary_df)
+
+
+def write_result_report(result, output, report_format=REPORT_FORMAT_XLSX, low_memory=False):
+    """
+    按格式生成对比报告：xlsx 为带颜色标识的报告（low_memory=True 时流式写入），
+    CSV/Parquet 直接写出整个对比表，HTML 逐行生成差异视图。
+
+    xlsx 的 output 可以是 BytesIO 等可写对象，其他格式和低内存模式必须是文件路径。
+    """
+    comparison_df = result.comparison_df
+    if report_format == REPORT_FORMAT_CSV:
+        comparison_df.to_csv(output, index=False, encoding='utf-8-sig')
+        return output
+    if report_format == REPORT_FORMAT_PARQUET:
+        return write_parquet_frame(comparison_df, output)
+    if report_format == REPORT_FORMAT_HTML:
+        return write_html_rows(
+            output, list(comparison_df.columns), _iter_rows(comparison_df), len(comparison_df),
+            list(result.diff_mask.columns), build_summary(result)
+        )
+    if low_memory:
+        return write_streaming_report(result, output)
+    return write_report(result, output)
+
+
+def write_result_report_tempfile(result, report_format=REPORT_FORMAT_XLSX, low_memory=False):
+    """按格式把报告写入临时文件，返回 ReportFile 供下载"""
+    return report_tempfile(lambda path: write_result_report(result, path, report_format, low_memory), report_format)
@@ -0,0 +1,358 @@
+"""
+对比任务接口：其他系统通过 HTTP 提交两个工作簿，后台进程池执行对比，轮询进度后下载报告
+
+接口：
+    POST   /api/jobs                 上传 file1、file2（multipart），可选 key_columns（可重复）、
+                                     key_mode、duplicate_mode、low_memory、
+                                     mapping（已保存的表头映射方案名称）或 by_header、
+                                     report_format（xlsx/csv/parquet/html），返回任务ID
+    GET    /api/jobs/<job_id>        任务状态和进度，完成后给出各状态行数
+    GET    /api/jobs/<job_id>/report 下载对比报告
+    DELETE /api/jobs/<job_id>        取消排队中的任务或删除已完成任务的文件
+
+运行：
+    python compare_service.py
+
+create_app() 创建应用，任务管理器（JobManager）放在 app.config['JOB_MANAGER'] 中，
+测试时可以传入自己的任务管理器并在结束后关闭。
+"""
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import Blueprint, Flask, current_app, jsonify, request, send_file
+
+from compare_engine import FIXED_COLUMNS, KEY_MODES, KEY_MODE_TEXT, DUPLICATE_MODES, DUPLICATE_FIRST, compare
+from compare_io import load_normalized, optimize_memory
+from compare_mapping import ColumnMapping, MappingStore
+from compare_memory import MEMORY_PLAN_LOW_MEMORY, MEMORY_PLAN_OUT_OF_CORE, estimate_footprint, plan_memory
+from compare_profile import StageProfiler, write_perf_log
+from compare_report import (
+    REPORT_FORMAT_XLSX, REPORT_FORMATS, REPORT_MIMES, report_file_name, write_result_report
+)
+from compare_sqlite import compare_sqlite, write_sqlite_report
+
+# 同时执行的对比任务数（进程池大小）
+MAX_WORKERS = 2
+# 排队等待的任务数上限，超出时拒绝新任务
+MAX_QUEUED_JOBS = 8
+# 已结束任务的文件保留时间（秒）
+JOB_TTL_SECONDS = 3600
+DEFAULT_JOB_DIR = os.path.join(tempfile.gettempdir(), 'excel_compare_jobs')
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_FINISHED = 'finished'
+STATUS_FAILED = 'failed'
+
+PROGRESS_FILE = 'progress.json'
+# 任务目录中的报告文件名（不含扩展名，扩展名为报告格式）
+REPORT_FILE_STEM = 'report'
+
+
+# ========================
+# 在子进程中执行的对比任务
+# ========================
+def _write_progress(job_dir, stage, progress):
+    """记录任务进度（先写临时文件再替换，轮询时不会读到半个文件）"""
+    path = os.path.join(job_dir, PROGRESS_FILE)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump({'stage': stage, 'progress': progress}, f, ensure_ascii=False)
+    os.replace(path + '.tmp', path)
+
+
+def _report_path(job_dir, report_format):
+    return os.path.join(job_dir, f'{REPORT_FILE_STEM}.{report_format}')
+
+
+def run_job(job_dir, file1, file2, key_columns, key_mode, duplicate_mode, low_memory, mapping=None,
+            report_format=REPORT_FORMAT_XLSX):
+    """
+    读取两个文件（mapping 为表头映射方案，默认取前5列）、对比并把指定格式的报告写入任务目录，
+    返回各状态行数和分阶段性能数据。
+
+    解析前先预估内存：超出预算时改用省内存类型 + 流式报告，仍超出时改用磁盘对比（compare_sqlite）。
+    """
+    profiler = StageProfiler()
+    _write_progress(job_dir, '预估内存', 0.05)
+    plan = plan_memory(estimate_footprint(file1, file2, mapping), out_of_core=True)
+    if plan == MEMORY_PLAN_OUT_OF_CORE:
+        return _run_sqlite_job(job_dir, file1, file2, key_columns, duplicate_mode, profiler, mapping, report_format)
+    compact = plan == MEMORY_PLAN_LOW_MEMORY
+    low_memory = low_memory or compact
+    _write_progress(job_dir, '读取文件', 0.1)
+    with profiler.stage('read') as stage:
+        df1 = load_normalized(file1, '第一个文件', mapping=mapping)
+        df2 = load_normalized(file2, '第二个文件', mapping=mapping)
+        if compact:
+            df1, df2 = optimize_memory(df1, df2)
+        stage['rows'] = len(df1) + len(df2)
+    _write_progress(job_dir, '对比', 0.4)
+    result = compare(df1, df2, key_columns, key_mode, duplicate_mode, profiler=profiler)
+    _write_progress(job_dir, '生成报告', 0.7)
+    with profiler.stage('report_write', len(result.comparison_df)):
+        write_result_report(result, _report_path(job_dir, report_format), report_format, low_memory)
+    _write_progress(job_dir, '完成', 1.0)
+    perf = write_perf_log(profiler, mode='service', key_columns=key_columns, low_memory=low_memory,
+                          file1_rows=result.file1_rows, file2_rows=result.file2_rows)
+    return {
+        'file1_rows': result.file1_rows,
+        'file2_rows': result.file2_rows,
+        'status_counts': result.status_counts,
+        'diff_counts': result.diff_counts,
+        'perf': perf
+    }
+
+
+def _run_sqlite_job(job_dir, file1, file2, key_columns, duplicate_mode, profiler, mapping=None,
+                    report_format=REPORT_FORMAT_XLSX):
+    """磁盘对比：读取和对比在临时 SQLite 数据库中进行，结果直接写入报告"""
+    _write_progress(job_dir, '读取并对比（磁盘）', 0.1)
+    with compare_sqlite(file1, file2, key_columns, duplicate_mode, db_dir=job_dir, profiler=profiler,
+                        mapping=mapping) as comparison:
+        _write_progress(job_dir, '生成报告', 0.7)
+        with profiler.stage('report_write', comparison.row_count):
+            write_sqlite_report(comparison, _report_path(job_dir, report_format), report_format)
+    _write_progress(job_dir, '完成', 1.0)
+    perf = write_perf_log(profiler, mode='service', engine='sqlite', key_columns=key_columns,
+                          file1_rows=comparison.file1_rows, file2_rows=comparison.file2_rows)
+    return {
+        'file1_rows': comparison.file1_rows,
+        'file2_rows': comparison.file2_rows,
+        'status_counts': comparison.status_counts,
+        'diff_counts': comparison.diff_counts,
+        'perf': perf
+    }
+
+
+# ========================
+# 任务管理
+# ========================
+class JobQueueFull(Exception):
+    """排队任务已满"""
+
+
+class Job:
+    def __init__(self, job_id, job_dir, future, report_format=REPORT_FORMAT_XLSX):
+        self.job_id = job_id
+        self.job_dir = job_dir
+        self.future = future
+        self.report_format = report_format
+        self.created = time.time()
+        self.finished = None
+
+
+class JobManager:
+    """
+    有界进程池 + 任务表。
+
+    进程池大小限制同时执行的任务数，未结束的任务超过 max_workers + max_queued 时拒绝新任务；
+    已结束的任务在 ttl 秒后连同上传文件和报告一起删除。
+    """
+
+    def __init__(self, job_dir=DEFAULT_JOB_DIR, max_workers=MAX_WORKERS, max_queued=MAX_QUEUED_JOBS,
+                 ttl=JOB_TTL_SECONDS):
+        self.job_dir = job_dir
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.ttl = ttl
+        self.jobs = {}
+        self._lock = threading.Lock()
+        # 使用 spawn 启动子进程：在多线程的 Web 服务中 fork 会复制其他线程持有的锁
+        self._executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+        os.makedirs(job_dir, exist_ok=True)
+
+    def active_count(self):
+        with self._lock:
+            return sum(not job.future.done() for job in self.jobs.values())
+
+    def submit(self, file1, file2, key_columns, key_mode=KEY_MODE_TEXT, duplicate_mode=DUPLICATE_FIRST,
+               low_memory=False, mapping=None, report_format=REPORT_FORMAT_XLSX):
+        """
+        提交任务：file1、file2 为上传的文件（带 filename 和 save），保存到任务目录后交给进程池；
+        mapping 为表头映射方案（默认取前5列），report_format 为报告格式。
+
+        排队任务已满时抛出 JobQueueFull。
+        """
+        with self._lock:
+            active = sum(not job.future.done() for job in self.jobs.values())
+            if active >= self.max_workers + self.max_queued:
+                raise JobQueueFull(f"任务已满：{active} 个任务正在执行或排队，请稍后再提交")
+            job_id = uuid.uuid4().hex
+            job_dir = os.path.join(self.job_dir, job_id)
+            os.makedirs(job_dir)
+            paths = []
+            for name, upload in (('file1', file1), ('file2', file2)):
+                path = os.path.join(job_dir, name + (os.path.splitext(upload.filename or '')[1] or '.xlsx'))
+                upload.save(path)
+                paths.append(path)
+            future = self._executor.submit(
+                run_job, job_dir, paths[0], paths[1], list(key_columns), key_mode, duplicate_mode, low_memory,
+                mapping, report_format
+            )
+            job = Job(job_id, job_dir, future, report_format)
+            self.jobs[job_id] = job
+        future.add_done_callback(lambda _: self._mark_finished(job))
+        return job
+
+    def _mark_finished(self, job):
+        with self._lock:
+            job.finished = time.time()
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def status(self, job):
+        """任务状态：排队中的任务还没有进度文件"""
+        info = {'job_id': job.job_id, 'created': job.created}
+        if job.future.done():
+            error = None if job.future.cancelled() else job.future.exception()
+            if job.future.cancelled() or error is not None:
+                info.update(status=STATUS_FAILED, error=str(error) if error else "任务已取消")
+            else:
+                info.update(status=STATUS_FINISHED, stage='完成', progress=1.0, result=job.future.result())
+            return info
+        try:
+            with open(os.path.join(job.job_dir, PROGRESS_FILE), encoding='utf-8') as f:
+                info.update(status=STATUS_RUNNING, **json.load(f))
+        except (FileNotFoundError, ValueError):
+            info.update(status=STATUS_QUEUED, stage='排队中', progress=0.0)
+        return info
+
+    def report_path(self, job):
+        return _report_path(job.job_dir, job.report_format)
+
+    def remove(self, job_id):
+        """取消排队中的任务或删除已结束任务的文件；正在执行的任务不能删除"""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return False
+            if not job.future.done() and not job.future.cancel():
+                raise RuntimeError("任务正在执行，不能删除")
+            del self.jobs[job_id]
+        shutil.rmtree(job.job_dir, ignore_errors=True)
+        return True
+
+    def cleanup(self):
+        """删除结束超过 ttl 秒的任务，返回删除的任务数"""
+        now = time.time()
+        with self._lock:
+            expired = [job for job in self.jobs.values() if job.finished is not None and now - job.finished >= self.ttl]
+            for job in expired:
+                del self.jobs[job.job_id]
+        for job in expired:
+            shutil.rmtree(job.job_dir, ignore_errors=True)
+        return len(expired)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+# 单次上传大小上限（两个文件合计）
+MAX_CONTENT_LENGTH = 400 * 1024 * 1024
+
+api = Blueprint('api', __name__)
+
+
+def create_app(job_manager=None):
+    """创建 Web 应用；不给出 job_manager 时使用默认设置新建一个任务管理器"""
+    app = Flask(__name__)
+    app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
+    app.config['JOB_MANAGER'] = job_manager if job_manager is not None else JobManager()
+    app.register_blueprint(api)
+    return app
+
+
+def _job_manager():
+    return current_app.config['JOB_MANAGER']
+
+
+# 每次请求前清理过期任务
+@api.before_app_request
+def cleanup_jobs():
+    _job_manager().cleanup()
+
+
+# === API 接口开始 ===
+
+# POST: 提交对比任务
+@api.route('/api/jobs', methods=['POST'])
+def create_job():
+    file1 = request.files.get('file1')
+    file2 = request.files.get('file2')
+    if file1 is None or file2 is None:
+        return jsonify({"error": "提交失败", "message": "请上传 file1 和 file2 两个文件"}), 400
+    key_columns = request.form.getlist('key_columns') or ['替代料']
+    invalid = [col for col in key_columns if col not in FIXED_COLUMNS]
+    if invalid:
+        return jsonify({"error": "提交失败", "message": f"无效的匹配字段：{'、'.join(invalid)}"}), 400
+    key_mode = request.form.get('key_mode', KEY_MODE_TEXT)
+    if key_mode not in KEY_MODES:
+        return jsonify({"error": "提交失败", "message": f"key_mode 只能是 {'、'.join(KEY_MODES)}"}), 400
+    duplicate_mode = request.form.get('duplicate_mode', DUPLICATE_FIRST)
+    if duplicate_mode not in DUPLICATE_MODES:
+        return jsonify({"error": "提交失败", "message": f"duplicate_mode 只能是 {'、'.join(DUPLICATE_MODES)}"}), 400
+    low_memory = request.form.get('low_memory', '').lower() in ('1', 'true', 'yes')
+    report_format = request.form.get('report_format', REPORT_FORMAT_XLSX)
+    if report_format not in REPORT_FORMATS:
+        return jsonify({"error": "提交失败", "message": f"report_format 只能是 {'、'.join(REPORT_FORMATS)}"}), 400
+    mapping = ColumnMapping() if request.form.get('by_header', '').lower() in ('1', 'true', 'yes') else None
+    if request.form.get('mapping'):
+        try:
+            mapping = MappingStore().load(request.form['mapping'])
+        except ValueError as e:
+            return jsonify({"error": "提交失败", "message": str(e)}), 400
+
+    try:
+        job = _job_manager().submit(file1, file2, key_columns, key_mode, duplicate_mode, low_memory, mapping,
+                                 report_format)
+    except JobQueueFull as e:
+        return jsonify({"error": "提交失败", "message": str(e)}), 429
+    return jsonify({"job_id": job.job_id, "status": STATUS_QUEUED}), 202
+
+
+# GET: 查询任务状态和进度
+@api.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = _job_manager().get(job_id)
+    if job is None:
+        return jsonify({"error": "任务不存在或已过期"}), 404
+    return jsonify(_job_manager().status(job))
+
+
+# GET: 下载对比报告
+@api.route('/api/jobs/<job_id>/report', methods=['GET'])
+def download_report(job_id):
+    job = _job_manager().get(job_id)
+    if job is None:
+        return jsonify({"error": "任务不存在或已过期"}), 404
+    info = _job_manager().status(job)
+    if info['status'] != STATUS_FINISHED:
+        return jsonify({"error": "报告尚未生成", "status": info['status']}), 409
+    return send_file(_job_manager().report_path(job), mimetype=REPORT_MIMES[job.report_format], as_attachment=True,
+                     download_name=report_file_name(job.report_format))
+
+
+# DELETE: 取消或删除任务
+@api.route('/api/jobs/<job_id>', methods=['DELETE'])
+def delete_job(job_id):
+    try:
+        removed = _job_manager().remove(job_id)
+    except RuntimeError as e:
+        return jsonify({"error": "删除失败", "message": str(e)}), 409
+    if not removed:
+        return jsonify({"error": "任务不存在或已过期"}), 404
+    return jsonify({"message": "任务已删除"})
+
+
+# === 运行服务器 ===
+if __name__ == '__main__':
+    create_app().run()
@@ -0,0 +1,317 @@
+"""
+磁盘外连接对比：两个文件都放不进内存时，逐行读入临时 SQLite 数据库，在 SQL 中完成外连接和分类，
+结果按报告顺序逐行流式写入报告，内存占用与文件行数无关
+
+1. openpyxl 只读模式逐行读取 xlsx（CSV/TSV 用 csv 模块逐行读取），按匹配字段拼出键（与 text 键值方式相同），分批写入数据库；
+2. 按键建立索引（同一键按出现顺序编号，支持两种重复键处理方式）；
+3. 一条 SQL 完成外连接、逐字段比较和状态判断，结果写入结果表，各状态和各字段的差异数量用 GROUP BY / SUM 统计；
+4. 按键排序逐行读取结果表，直接交给流式报告写入器。
+
+与内存中对比的区别：单元格按文件中保存的值比较（pandas 会把含空值的整数列读成小数，如 12 读成 12.0），
+不支持模糊匹配和类型感知比较。xlsx 和 CSV/TSV 的数值统一写法（整数值不带小数部分，12.0 写为 12，
+2.50 写为 2.5），两种格式的文件互相对比时不会因为写法不同产生差异。
+
+命令行用法见 excel_compare.py 的 --engine sqlite。
+"""
+import csv
+import gzip
+import io
+import os
+import re
+import sqlite3
+import tempfile
+from io import BytesIO
+
+from openpyxl import load_workbook
+
+from compare_engine import (
+    FIXED_COLUMNS, REPORT_COLUMNS, KEY_SEPARATOR, DIFF_FIELDS_SEPARATOR, DUPLICATE_FIRST, DUPLICATE_OCCURRENCE,
+    DUPLICATE_MODES, STATUS_ORDER, STATUS_SAME, STATUS_ONLY_FILE1, STATUS_ONLY_FILE2, STATUS_DIFF, STATUS_DUPLICATE,
+    compared_columns, validate_key_columns
+)
+from compare_io import InputFormatError, detect_delimiter, detect_encoding, is_text_table, source_head, text_sample
+from compare_profile import profile_stage
+from compare_report import REPORT_FORMAT_XLSX, build_summary, report_tempfile, write_rows_report
+
+# 每批写入数据库的行数
+INSERT_BATCH_ROWS = 10000
+# SQLite 页缓存上限（KB），排序和建索引超出时使用临时文件
+CACHE_SIZE_KB = 64 * 1024
+# 数据库中5个固定字段的列名
+_FIELDS = [f'c{i}' for i in range(len(FIXED_COLUMNS))]
+
+
+_DECIMAL = re.compile(r'-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?')
+
+
+def _float_text(number):
+    """小数的文本：整数值去掉小数部分（与 xlsx 中保存为整数的单元格一致）"""
+    if number.is_integer() and abs(number) < 2 ** 53:
+        return str(int(number))
+    return str(number)
+
+
+def _cell_text(value):
+    """
+    单元格文本：空单元格为 None，其余与 str(v) 一致，但小数（以及 CSV 中带小数点或指数的数值文本）
+    按 _float_text 统一写法；不带小数点的整数文本保持原样（不会丢失长编码的精度或前导零）。
+    """
+    if value is None:
+        return None
+    if isinstance(value, float):
+        return _float_text(value)
+    if isinstance(value, str):
+        if value[-1:].isdigit() and not value.lstrip('-').isdigit() and _DECIMAL.fullmatch(value):
+            return _float_text(float(value))
+        return value
+    return str(value)
+
+
+def _normalized(rows, label, mapping=None):
+    """
+    跳过表头，每行取5个固定字段的单元格文本：默认取前5列，给出 mapping 时按表头名称找列；
+    列数少于5列或表头中找不到字段时抛出 InputFormatError。
+    """
+    header = next(rows, ())
+    if mapping is not None:
+        positions = mapping.resolve(list(header), label)
+    elif len(header) < len(FIXED_COLUMNS):
+        raise InputFormatError(f"{label}的列数少于{len(FIXED_COLUMNS)}列，无法映射到固定表头")
+    else:
+        positions = range(len(FIXED_COLUMNS))
+    for row in rows:
+        row = tuple(row[position] if position < len(row) else None for position in positions)
+        if all(value is None for value in row):
+            continue
+        yield tuple(_cell_text(value) for value in row)
+
+
+def _iter_text_rows(source):
+    """逐行读取 CSV/TSV（可以是 gzip 压缩的），空字段为 None"""
+    head = source_head(source)
+    sample = text_sample(head)
+    encoding = detect_encoding(sample)
+    if isinstance(source, bytes):
+        binary = BytesIO(source)
+    elif hasattr(source, 'read'):
+        binary = source
+    else:
+        binary = open(source, 'rb')
+    if head.startswith(b'\x1f\x8b'):
+        binary = gzip.GzipFile(fileobj=binary)
+    text = io.TextIOWrapper(binary, encoding='utf-8-sig' if encoding == 'utf-8' else encoding, newline='')
+    try:
+        for row in csv.reader(text, delimiter=detect_delimiter(sample)):
+            yield [value if value != '' else None for value in row]
+    finally:
+        if binary is not source:
+            text.close()
+        else:
+            text.detach()
+
+
+def iter_normalized_rows(source, label='文件', mapping=None):
+    """
+    逐行读取第一个工作表（或 CSV/TSV）的5个固定字段（跳过表头），每行为5个单元格文本。
+
+    source 为文件路径或文件对象；默认取前5列，mapping 为表头映射方案；列数少于5列时抛出 InputFormatError。
+    """
+    if is_text_table(source_head(source)):
+        yield from _normalized(_iter_text_rows(source), label, mapping)
+        return
+    try:
+        workbook = load_workbook(source, read_only=True, data_only=True)
+    except Exception as e:  # openpyxl 不支持 xls 等格式
+        raise InputFormatError(f"{label}无法按 xlsx 逐行读取：{e}") from None
+    try:
+        yield from _normalized(workbook.worksheets[0].iter_rows(values_only=True), label, mapping)
+    finally:
+        workbook.close()
+
+
+class SqliteComparison:
+    """
+    磁盘对比的结果：各状态数量、各字段差异数量，结果行保存在临时数据库中。
+
+    用完后调用 close() 删除数据库文件（也可用 with 语句）。
+    """
+
+    def __init__(self, conn, path, key_columns, status_counts, diff_counts, file1_rows, file2_rows, row_count):
+        self.conn = conn
+        self.path = path
+        self.key_columns = key_columns
+        self.status_counts = status_counts
+        self.diff_counts = diff_counts
+        self.file1_rows = file1_rows
+        self.file2_rows = file2_rows
+        self.row_count = row_count
+
+    @property
+    def total_diff(self):
+        return sum(count for status, count in self.status_counts.items() if status != STATUS_SAME)
+
+    def iter_rows(self, limit=None):
+        """按报告列顺序逐行读取结果（按键排序）"""
+        sql = f"SELECT {', '.join(['key'] + [f'a_{c}' for c in _FIELDS] + [f'b_{c}' for c in _FIELDS])}, " \
+              f"status, diff_fields FROM result ORDER BY key, occ"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        yield from self.conn.execute(sql)
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+            _remove_database(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _remove_database(path):
+    for suffix in ('', '-journal'):
+        try:
+            os.remove(path + suffix)
+        except FileNotFoundError:
+            pass
+
+
+def _load_side(conn, table, rows, key_indexes, duplicate_mode):
+    """把一个文件逐批写入数据库，按键编号出现顺序并建立索引，返回读入的行数"""
+    conn.execute(f"CREATE TABLE raw_{table} (key TEXT, {', '.join(f'{c} TEXT' for c in _FIELDS)})")
+    insert = f"INSERT INTO raw_{table} VALUES ({', '.join('?' * (len(_FIELDS) + 1))})"
+    count = 0
+    batch = []
+    for row in rows:
+        key = KEY_SEPARATOR.join('nan' if row[i] is None else row[i] for i in key_indexes)
+        batch.append((key,) + row)
+        if len(batch) >= INSERT_BATCH_ROWS:
+            conn.executemany(insert, batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        conn.executemany(insert, batch)
+        count += len(batch)
+
+    # 同一键按出现顺序编号；只取首条时只保留编号为1的行
+    numbered = f"SELECT key, ROW_NUMBER() OVER (PARTITION BY key ORDER BY rowid) AS occ, " \
+               f"{', '.join(_FIELDS)} FROM raw_{table}"
+    if duplicate_mode == DUPLICATE_FIRST:
+        numbered = f"SELECT * FROM ({numbered}) WHERE occ = 1"
+    conn.execute(f"CREATE TABLE {table} AS {numbered}")
+    conn.execute(f"DROP TABLE raw_{table}")
+    conn.execute(f"CREATE UNIQUE INDEX {table}_key ON {table} (key, occ)")
+    return count
+
+
+def _classify(conn, key_columns, duplicate_mode):
+    """外连接两侧并在 SQL 中逐字段比较、判断状态，结果写入 result 表"""
+    fields = compared_columns(key_columns)
+    diff_columns = [f'd{i}' for i in range(len(fields))]
+    # 与 str(v) 文本比较一致：空值视为空字符串
+    diffs = [f"(a.key IS NOT NULL AND b.key IS NOT NULL AND IFNULL(a.c{FIXED_COLUMNS.index(col)}, '') "
+             f"<> IFNULL(b.c{FIXED_COLUMNS.index(col)}, '')) AS {d}" for col, d in zip(fields, diff_columns)]
+    a_fields = ', '.join(f'a.{c} AS a_{c}' for c in _FIELDS)
+    b_fields = ', '.join(f'b.{c} AS b_{c}' for c in _FIELDS)
+    null_a = ', '.join(f'NULL AS a_{c}' for c in _FIELDS)
+    diff_values = ', '.join(diffs) if diffs else '0 AS d_none'
+    zero_diffs = ', '.join(f'0 AS {d}' for d in diff_columns) if diffs else '0 AS d_none'
+    conn.execute(f"""
+        CREATE TABLE joined AS
+        SELECT a.key AS key, a.occ AS occ, {a_fields}, {b_fields}, 1 AS in1, b.key IS NOT NULL AS in2, {diff_values}
+        FROM file1 a LEFT JOIN file2 b ON b.key = a.key AND b.occ = a.occ
+        UNION ALL
+        SELECT b.key, b.occ, {null_a}, {', '.join(f'b.{c}' for c in _FIELDS)}, 0, 1, {zero_diffs}
+        FROM file2 b WHERE NOT EXISTS (SELECT 1 FROM file1 a WHERE a.key = b.key AND a.occ = b.occ)
+    """)
+
+    any_diff = ' OR '.join(diff_columns) if diff_columns else '0'
+    # 差异字段：'、机型、用量' 去掉开头的分隔符
+    labels = ' || '.join(f"CASE WHEN {d} THEN '{DIFF_FIELDS_SEPARATOR}{col}' ELSE '' END"
+                         for col, d in zip(fields, diff_columns)) or "''"
+    # 按出现顺序配对时，键在另一文件中存在、但这一条没有对应序号的行为重复键多出
+    extra = "0"
+    if duplicate_mode == DUPLICATE_OCCURRENCE:
+        extra = """CASE WHEN in1 THEN EXISTS (SELECT 1 FROM file2 o WHERE o.key = j.key)
+                        ELSE EXISTS (SELECT 1 FROM file1 o WHERE o.key = j.key) END"""
+    conn.execute(f"""
+        CREATE TABLE result AS
+        SELECT key, occ, {', '.join(f'a_{c}' for c in _FIELDS)}, {', '.join(f'b_{c}' for c in _FIELDS)},
+               {', '.join(diff_columns) + ',' if diff_columns else ''}
+               CASE WHEN in1 AND in2 AND ({any_diff}) THEN '{STATUS_DIFF}'
+                    WHEN in1 AND in2 THEN '{STATUS_SAME}'
+                    WHEN {extra} THEN '{STATUS_DUPLICATE}'
+                    WHEN in1 THEN '{STATUS_ONLY_FILE1}'
+                    ELSE '{STATUS_ONLY_FILE2}' END AS status,
+               SUBSTR({labels}, 2) AS diff_fields
+        FROM joined j
+    """)
+    conn.execute("DROP TABLE joined")
+    conn.execute("CREATE INDEX result_key ON result (key, occ)")
+    return fields, diff_columns
+
+
+def compare_sqlite(source1, source2, key_columns, duplicate_mode=DUPLICATE_FIRST, db_dir=None, profiler=None,
+                   mapping=None):
+    """
+    在临时 SQLite 数据库中对比两个文件（xlsx 或 CSV/TSV），返回 SqliteComparison（用完需 close）。
+
+    source1/source2 为文件路径或文件对象；db_dir 为数据库文件所在目录（默认系统临时目录）；
+    mapping 为表头映射方案（默认取前5列）；
+    给出 profiler 时记录读取（写入数据库）和分类两个阶段。
+    """
+    validate_key_columns(key_columns)
+    if duplicate_mode not in DUPLICATE_MODES:
+        raise ValueError(f"不支持的重复键处理方式：{duplicate_mode}")
+    fd, path = tempfile.mkstemp(prefix='excel_compare_', suffix='.sqlite', dir=db_dir)
+    os.close(fd)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    try:
+        # 临时数据：不需要日志和同步；排序、索引使用磁盘临时文件
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute("PRAGMA temp_store = FILE")
+        conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KB}")
+        key_indexes = [FIXED_COLUMNS.index(col) for col in key_columns]
+        with profile_stage(profiler, 'read') as stage:
+            file1_rows = _load_side(conn, 'file1', iter_normalized_rows(source1, '第一个文件', mapping), key_indexes,
+                                    duplicate_mode)
+            file2_rows = _load_side(conn, 'file2', iter_normalized_rows(source2, '第二个文件', mapping), key_indexes,
+                                    duplicate_mode)
+            stage['rows'] = file1_rows + file2_rows
+        with profile_stage(profiler, 'classify') as stage:
+            fields, diff_columns = _classify(conn, key_columns, duplicate_mode)
+            conn.commit()
+
+            status_order = STATUS_ORDER
+            if duplicate_mode == DUPLICATE_OCCURRENCE:
+                status_order = STATUS_ORDER + [STATUS_DUPLICATE]
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM result GROUP BY status").fetchall())
+            status_counts = {status: counts.get(status, 0) for status in status_order}
+            diff_counts = {}
+            if diff_columns:
+                sums = conn.execute(f"SELECT {', '.join(f'IFNULL(SUM({d}), 0)' for d in diff_columns)} FROM result")
+                diff_counts = dict(zip(fields, sums.fetchone()))
+            stage['rows'] = sum(status_counts.values())
+    except Exception:
+        conn.close()
+        _remove_database(path)
+        raise
+    return SqliteComparison(conn, path, list(key_columns), status_counts, diff_counts, file1_rows, file2_rows,
+                            sum(status_counts.values()))
+
+
+def write_sqlite_report(comparison, path, report_format=REPORT_FORMAT_XLSX):
+    """把磁盘对比的结果按指定格式逐行流式写入报告"""
+    return write_rows_report(
+        path, REPORT_COLUMNS, comparison.iter_rows(), comparison.row_count,
+        list(comparison.diff_counts), build_summary(comparison), report_format
+    )
+
+
+def write_sqlite_report_tempfile(comparison, report_format=REPORT_FORMAT_XLSX):
+    """把磁盘对比的报告写入临时文件，返回 ReportFile 供下载"""
+    return report_tempfile(lambda path: write_sqlite_report(comparison, path, report_format), report_format)
@@ -0,0 +1,73 @@
+"""
+对比结果浏览：对比表留在服务端，按页取出（默认每页 PAGE_ROWS 行），可按对比状态、键的子串和差异字段筛选
+
+创建时预先建立索引：每个对比状态对应的行号、每个字段值不同的行号（来自差异矩阵）。
+筛选时只合并、求交这些行号数组，键的子串只在已筛出的行中查找；筛选结果按条件缓存，
+翻页只取出当前页的行，不会把整个对比表交给页面。
+"""
+import numpy as np
+import pandas as pd
+
+from compare_cache import LRUCache
+from compare_engine import MATCH_COLUMN, STATUS_COLUMN
+
+PAGE_ROWS = 500
+# 缓存的筛选结果个数（每个为一个行号数组）
+FILTER_CACHE_ENTRIES = 16
+
+_NO_ROWS = np.array([], dtype=np.intp)
+
+
+class ResultViewer:
+    """
+    一次对比结果的浏览索引：status_rows 为 {对比状态: 行号数组}，diff_rows 为 {字段: 值不同的行号数组}，
+    行号均按对比表中的顺序排列。
+    """
+
+    def __init__(self, result, page_rows=PAGE_ROWS):
+        self.comparison_df = result.comparison_df
+        self.page_rows = page_rows
+        codes, statuses = pd.factorize(self.comparison_df[STATUS_COLUMN])
+        # 按状态编码稳定排序后切分：每个状态的行号仍按对比表中的顺序
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(statuses) + 1))
+        self.status_rows = {status: order[bounds[i]:bounds[i + 1]] for i, status in enumerate(statuses)}
+        self.diff_rows = {field: np.flatnonzero(result.diff_mask[field].to_numpy())
+                          for field in result.diff_mask.columns}
+        self._filters = LRUCache(max_entries=FILTER_CACHE_ENTRIES)
+
+    @property
+    def row_count(self):
+        return len(self.comparison_df)
+
+    def filter(self, statuses=None, key_contains='', changed_field=None):
+        """
+        符合条件的行号（按对比表中的顺序）：statuses 为空时不按状态筛选，key_contains 为匹配字段中包含的文本
+        （不区分大小写），changed_field 为值不同的字段（None 时不按字段筛选）。
+        """
+        key = (tuple(statuses or ()), key_contains or '', changed_field)
+        return self._filters.get_or_create(key, lambda: self._filter(*key))
+
+    def _filter(self, statuses, key_contains, changed_field):
+        changed_rows = None if changed_field is None else self.diff_rows.get(changed_field, _NO_ROWS)
+        if statuses:
+            rows = [self.status_rows.get(status, _NO_ROWS) for status in statuses]
+            rows = rows[0] if len(rows) == 1 else np.sort(np.concatenate(rows))
+            if changed_rows is not None:
+                rows = np.intersect1d(rows, changed_rows, assume_unique=True)
+        elif changed_rows is not None:
+            rows = changed_rows
+        else:
+            rows = np.arange(self.row_count)
+        if key_contains:
+            keys = self.comparison_df[MATCH_COLUMN].iloc[rows].astype(str)
+            rows = rows[keys.str.contains(key_contains, case=False, regex=False).to_numpy(dtype=bool)]
+        return rows
+
+    def page_count(self, rows):
+        return max((len(rows) + self.page_rows - 1) // self.page_rows, 1)
+
+    def page(self, rows, page_number):
+        """第 page_number 页（从1开始）的数据行"""
+        start = (page_number - 1) * self.page_rows
+        return self.comparison_df.iloc[rows[start:start + self.page_rows]]
@@ -0,0 +1,237 @@
+"""
+Excel精确键值对比（无界面版本）
+
+流程：读取 → 标准化为固定表头 → 键值对比 → 生成报告
+
+命令行用法：
+    python excel_compare.py 文件1.xlsx 文件2.xlsx -k 替代料 -k 机型 -o 报告.xlsx
+    python excel_compare.py 文件1.xlsx 文件2.csv --mapping 供应商A -o 报告.xlsx   # 按表头名称（映射方案）找列
+    python excel_compare.py 文件1.xlsx 文件2.xlsx -o 报告.parquet   # 按扩展名选择报告格式（也可用 --format）
+"""
+import argparse
+import sys
+
+from compare_engine import (
+    FIXED_COLUMNS, KEY_MODES, KEY_MODE_TEXT, DUPLICATE_MODES, DUPLICATE_FIRST, Tolerance, compare
+)
+from compare_cache import DEFAULT_CACHE_DIR, DEFAULT_CACHE_MAX_MB, open_disk_cache
+from compare_fuzzy import DEFAULT_THRESHOLD, compare_fuzzy
+from compare_io import load_normalized_cached, optimize_memory
+from compare_mapping import DEFAULT_MAPPING_DIR, ColumnMapping, MappingStore
+from compare_memory import (
+    DEFAULT_MEMORY_BUDGET_MB, MEMORY_PLAN_LOW_MEMORY, MEMORY_PLAN_OUT_OF_CORE, estimate_footprint, plan_memory
+)
+from compare_multisheet import compare_workbooks
+from compare_profile import DEFAULT_PERF_LOG, StageProfiler, profile_stage, write_perf_log
+from compare_report import (
+    REPORT_FORMAT_XLSX, REPORT_FORMATS, report_format_for_path, write_multi_report, write_result_report
+)
+from compare_sqlite import compare_sqlite, write_sqlite_report
+
+# 对比引擎：auto 按内存预估自动选择，memory 在内存中对比，sqlite 在临时数据库中对比（内存占用与行数无关）
+ENGINE_AUTO = 'auto'
+ENGINE_MEMORY = 'memory'
+ENGINE_SQLITE = 'sqlite'
+ENGINES = [ENGINE_AUTO, ENGINE_MEMORY, ENGINE_SQLITE]
+
+
+def run_compare(file1, file2, key_columns, output, key_mode=KEY_MODE_TEXT, low_memory=False,
+                duplicate_mode=DUPLICATE_FIRST, disk_cache=None, fuzzy_threshold=None, tolerance=None,
+                compact=False, profiler=None, memory_budget_mb=None, engine=ENGINE_AUTO, mapping=None,
+                report_format=REPORT_FORMAT_XLSX):
+    """
+    读取两个文件、对比并把报告写入 output，返回对比结果。
+
+    low_memory=True 时使用流式写入（output 必须是文件路径）；
+    给出 disk_cache 时，已解析过的文件直接从磁盘缓存读取；
+    给出 fuzzy_threshold 时使用模糊键匹配（键值存储方式不再生效）；
+    给出 tolerance 时做类型感知比较（数值按容差比较）；
+    compact=True 时先把两个文件转为省内存的类型（分类类型、紧凑字符串）；
+    给出 profiler（StageProfiler）时按阶段记录耗时、CPU时间、行数和峰值内存；
+    给出 memory_budget_mb 时先预估内存，超出预算时自动改用低内存方式（省内存类型 + 流式报告），
+    仍超出时改用磁盘对比（engine=auto 且没有使用模糊匹配、类型感知比较时），否则抛出 MemoryBudgetError。
+    engine=sqlite 时直接使用磁盘对比，返回的 SqliteComparison 已关闭（只保留统计信息）；
+    给出 mapping（ColumnMapping）时按表头名称找到5个固定字段所在的列，默认取前5列；
+    report_format 为报告格式（compare_report.REPORT_FORMATS），CSV/Parquet 不做任何格式处理，也没有 xlsx 的行数上限。
+    """
+    exact = fuzzy_threshold is None and tolerance is None
+    if engine == ENGINE_SQLITE and not exact:
+        raise ValueError("磁盘对比不支持模糊匹配和类型感知比较")
+    if engine != ENGINE_SQLITE and memory_budget_mb:
+        plan = plan_memory(estimate_footprint(file1, file2, mapping), memory_budget_mb,
+                           out_of_core=engine == ENGINE_AUTO and exact)
+        if plan == MEMORY_PLAN_OUT_OF_CORE:
+            print(f"⚠️ 预计内存超出预算 {memory_budget_mb} MB，已自动改用磁盘对比（SQLite）", file=sys.stderr)
+            engine = ENGINE_SQLITE
+        elif plan == MEMORY_PLAN_LOW_MEMORY and not (low_memory and compact):
+            print(f"⚠️ 预计内存超出预算 {memory_budget_mb} MB，已自动切换为低内存模式（省内存类型 + 流式报告）",
+                  file=sys.stderr)
+            low_memory = compact = True
+    if engine == ENGINE_SQLITE:
+        with compare_sqlite(file1, file2, key_columns, duplicate_mode, profiler=profiler,
+                            mapping=mapping) as comparison:
+            with profile_stage(profiler, 'report_write', comparison.row_count):
+                write_sqlite_report(comparison, output, report_format)
+        return comparison
+
+    with profile_stage(profiler, 'read') as stage:
+        df1 = load_normalized_cached(file1, disk_cache, '第一个文件', mapping=mapping)
+        df2 = load_normalized_cached(file2, disk_cache, '第二个文件', mapping=mapping)
+        if compact:
+            df1, df2 = optimize_memory(df1, df2)
+        stage['rows'] = len(df1) + len(df2)
+    if fuzzy_threshold is None:
+        result = compare(df1, df2, key_columns, key_mode, duplicate_mode, tolerance, profiler)
+    else:
+        with profile_stage(profiler, 'compare', len(df1) + len(df2)):
+            result = compare_fuzzy(df1, df2, key_columns, duplicate_mode, fuzzy_threshold, tolerance)
+    with profile_stage(profiler, 'report_write', len(result.comparison_df)):
+        write_result_report(result, output, report_format, low_memory)
+    return result
+
+
+def run_compare_workbooks(file1, file2, key_columns, output, key_mode=KEY_MODE_TEXT,
+                          duplicate_mode=DUPLICATE_FIRST, max_workers=None, worker_memory_mb=None, tolerance=None,
+                          mapping=None):
+    """对比两个工作簿中所有同名工作表（多进程并行），把合并报告写入 output"""
+    multi = compare_workbooks(
+        file1, file2, key_columns, key_mode, duplicate_mode,
+        max_workers=max_workers, worker_memory_mb=worker_memory_mb, tolerance=tolerance, mapping=mapping
+    )
+    write_multi_report(multi, output)
+    return multi
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Excel精确键值对比工具")
+    parser.add_argument('file1', help="第一个Excel文件")
+    parser.add_argument('file2', help="第二个Excel文件")
+    parser.add_argument('-k', '--key', dest='key_columns', action='append', choices=FIXED_COLUMNS,
+                        help="用于数据匹配的字段，可重复指定（默认：替代料）")
+    parser.add_argument('-o', '--output', required=True, help="对比报告输出路径（.xlsx/.csv/.parquet/.html）")
+    parser.add_argument('--format', dest='report_format', choices=REPORT_FORMATS,
+                        help="报告格式（默认按输出路径的扩展名）：xlsx 带颜色标识；csv、parquet 只写对比表，速度快且没有行数上限；"
+                             "html 为单个网页文件的差异视图（只适合较小的结果）")
+    parser.add_argument('--key-mode', choices=KEY_MODES, default=KEY_MODE_TEXT, help="键值存储方式")
+    parser.add_argument('--duplicates', dest='duplicate_mode', choices=DUPLICATE_MODES, default=DUPLICATE_FIRST,
+                        help="重复键处理方式：first 只取首条，occurrence 按出现顺序逐条配对")
+    parser.add_argument('--low-memory', action='store_true', help="低内存模式：流式写入报告，按状态条件格式着色")
+    parser.add_argument('--fuzzy', action='store_true',
+                        help="模糊键匹配：键规范化（全角、空白、大小写）后匹配，剩余的键按相似度配对")
+    parser.add_argument('--fuzzy-threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help=f"模糊匹配的相似度阈值（0~1，默认 {DEFAULT_THRESHOLD}）")
+    parser.add_argument('--type-aware', action='store_true',
+                        help="类型感知比较：数值字段（如用量）按容差比较，文本去掉首尾空白后比较")
+    parser.add_argument('--abs-tol', type=float, default=0.0, help="类型感知比较的绝对容差（默认 0）")
+    parser.add_argument('--rel-tol', type=float, default=1e-9, help="类型感知比较的相对容差（默认 1e-9）")
+    parser.add_argument('--compact', action='store_true',
+                        help="省内存模式：重复值多的字段转为分类类型，文本转为紧凑字符串")
+    parser.add_argument('--cache', action='store_true', help="启用磁盘缓存：同样内容的文件只解析一次")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help="磁盘缓存目录")
+    parser.add_argument('--cache-max-mb', type=int, default=DEFAULT_CACHE_MAX_MB, help="磁盘缓存大小上限（MB）")
+    parser.add_argument('--all-sheets', action='store_true', help="多工作表模式：按名称配对并对比所有工作表")
+    parser.add_argument('--workers', type=int, help="多工作表模式的并行进程数（默认CPU核数）")
+    parser.add_argument('--worker-memory-mb', type=int, help="多工作表模式下单个工作进程的内存上限（MB）")
+    parser.add_argument('--memory-budget-mb', type=int, default=DEFAULT_MEMORY_BUDGET_MB,
+                        help=f"内存预算（MB，默认 {DEFAULT_MEMORY_BUDGET_MB}）：解析前预估内存，超出时自动改用低内存模式"
+                             f"、磁盘对比或停止对比；设为 0 不检查")
+    parser.add_argument('--engine', choices=ENGINES, default=ENGINE_AUTO,
+                        help="对比引擎：auto 超出内存预算时自动改用磁盘对比，memory 只在内存中对比，"
+                             "sqlite 在临时 SQLite 数据库中对比（内存占用与行数无关，不支持模糊匹配和类型感知比较）")
+    mapping_group = parser.add_mutually_exclusive_group()
+    mapping_group.add_argument('--mapping', help="按已保存的表头映射方案找列（见 compare_mapping.py）；默认取前5列")
+    mapping_group.add_argument('--by-header', action='store_true',
+                               help="按表头名称找列（表头须与固定字段同名，列顺序可以不同）")
+    parser.add_argument('--mapping-dir', default=DEFAULT_MAPPING_DIR, help="表头映射方案存储目录")
+    parser.add_argument('--profile', action='store_true', help="打印各阶段的耗时、CPU时间、行数和峰值内存")
+    parser.add_argument('--perf-log', default=DEFAULT_PERF_LOG, help="性能日志路径（每次对比写一行JSON，设为空则不写）")
+    return parser
+
+
+def _print_profile(profiler):
+    summary = profiler.to_dict()
+    print(f"\n性能详情：总耗时 {summary['wall_seconds']:.3f}s，CPU {summary['cpu_seconds']:.3f}s，"
+          f"峰值内存 {summary['peak_rss_mb']} MB")
+    for row in profiler.table():
+        print(f"  {row['阶段']:\u3000<5}{row['耗时（秒）']:>9.3f}s  CPU {row['CPU时间（秒）']:>8.3f}s  "
+              f"{row['行数']:>9} 行  {row['峰值内存（MB）']} MB")
+
+
+def _print_multi_summary(multi):
+    for name, result in multi.results.items():
+        counts = '，'.join(f"{status} {count}" for status, count in result.status_counts.items())
+        print(f"[{name}] {counts}")
+    for name, error in multi.errors.items():
+        print(f"[{name}] ❌ {error}")
+    for name in multi.pairing.only_file1:
+        print(f"[{name}] 仅第一个工作簿有此工作表")
+    for name in multi.pairing.only_file2:
+        print(f"[{name}] 仅第二个工作簿有此工作表")
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    key_columns = args.key_columns or ['替代料']
+    tolerance = None
+    if args.type_aware:
+        if args.abs_tol < 0 or args.rel_tol < 0:
+            parser.error("容差不能为负数")
+        tolerance = Tolerance(args.abs_tol, args.rel_tol)
+    if args.all_sheets and args.low_memory:
+        parser.error("多工作表模式暂不支持 --low-memory")
+    if args.all_sheets and args.fuzzy:
+        parser.error("多工作表模式暂不支持 --fuzzy")
+    report_format = args.report_format or report_format_for_path(args.output)
+    if args.all_sheets and report_format != REPORT_FORMAT_XLSX:
+        parser.error("多工作表模式只能生成 xlsx 报告")
+    if args.engine == ENGINE_SQLITE and (args.all_sheets or args.fuzzy or args.type_aware):
+        parser.error("--engine sqlite 不支持 --all-sheets、--fuzzy 和 --type-aware")
+    mapping = ColumnMapping() if args.by_header else None
+    if args.mapping:
+        try:
+            mapping = MappingStore(args.mapping_dir).load(args.mapping)
+        except (ValueError, OSError) as e:
+            print(f"❌ {e}", file=sys.stderr)
+            return 1
+
+    if args.all_sheets:
+        try:
+            multi = run_compare_workbooks(
+                args.file1, args.file2, key_columns, args.output, args.key_mode,
+                args.duplicate_mode, args.workers, args.worker_memory_mb, tolerance, mapping
+            )
+        except (ValueError, OSError) as e:
+            print(f"❌ 处理文件时出错：{e}", file=sys.stderr)
+            return 1
+        _print_multi_summary(multi)
+        print(f"报告已生成：{args.output}")
+        return 0
+
+    profiler = StageProfiler()
+    try:
+        disk_cache = open_disk_cache(args.cache_dir, args.cache_max_mb) if args.cache else None
+        result = run_compare(
+            args.file1, args.file2, key_columns, args.output,
+            args.key_mode, args.low_memory, args.duplicate_mode, disk_cache,
+            args.fuzzy_threshold if args.fuzzy else None, tolerance, args.compact, profiler,
+            args.memory_budget_mb, args.engine, mapping, report_format
+        )
+    except (ValueError, OSError) as e:
+        print(f"❌ 处理文件时出错：{e}", file=sys.stderr)
+        return 1
+    write_perf_log(
+        profiler, args.perf_log, mode='cli', key_columns=key_columns, low_memory=args.low_memory,
+        fuzzy=args.fuzzy, file1_rows=result.file1_rows, file2_rows=result.file2_rows
+    )
+
+    for status, count in result.status_counts.items():
+        print(f"{status}: {count}")
+    if args.profile:
+        _print_profile(profiler)
+    print(f"报告已生成：{args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
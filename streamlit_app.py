@@ -1,8 +1,49 @@
-import streamlit as st
+import os
 import pandas as pd
-import numpy as np
+import streamlit as st
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
-import xlsxwriter
+
+from compare_engine import (
+    FIXED_COLUMNS, REPORT_COLUMNS, KEY_MODES, KEY_MODE_TEXT, KEY_MODE_TUPLE, KEY_MODE_HASH,
+    DUPLICATE_MODES, DUPLICATE_FIRST, DUPLICATE_OCCURRENCE, Tolerance, compare
+)
+from compare_baseline import build_baseline, compare_to_baseline, open_baseline_store
+from compare_cache import (
+    DEFAULT_MEMORY_CACHE_MB, LRUCache, comparison_cache_key, content_hash, entry_key, open_disk_cache
+)
+from compare_fuzzy import DEFAULT_THRESHOLD, compare_fuzzy
+from compare_io import (
+    InputFormatError, frame_memory_mb, is_text_table, load_normalized_cached, optimize_memory, source_head
+)
+from compare_mapping import ColumnMapping, MappingStore
+from compare_memory import (
+    DEFAULT_MEMORY_BUDGET_MB, MEMORY_PLAN_LOW_MEMORY, MEMORY_PLAN_OUT_OF_CORE, MemoryBudgetError,
+    estimate_footprint, plan_memory
+)
+from compare_multisheet import compare_workbooks
+from compare_profile import StageProfiler, profile_stage, write_perf_log
+from compare_report import (
+    REPORT_FORMAT_XLSX, REPORT_FORMAT_CSV, REPORT_FORMAT_PARQUET, REPORT_FORMAT_HTML, REPORT_MIMES, XLSX_MIME,
+    available_report_formats, build_multi_summary, report_file_name, write_multi_report, write_report,
+    write_result_report_tempfile, write_streaming_report_tempfile
+)
+from compare_sqlite import compare_sqlite, write_sqlite_report_tempfile
+from compare_viewer import ResultViewer
+
+# 可上传的文件类型：Excel，或 UTF-8/GBK 编码的 CSV/TSV（可 gzip 压缩，如 .csv.gz）
+UPLOAD_TYPES = ["xlsx", "xls", "csv", "tsv", "gz"]
+# 表头映射的两个内置选项，其余选项为已保存的映射方案
+MAPPING_BY_POSITION = '按列顺序（取前5列）'
+MAPPING_BY_HEADER = '按表头名称（列顺序可以不同）'
+# 结果浏览器的控件（切换到另一次对比的结果时清空）
+VIEWER_KEYS = ['viewer_statuses', 'viewer_key', 'viewer_field', 'viewer_page']
+REPORT_FORMAT_LABELS = {
+    REPORT_FORMAT_XLSX: 'Excel（带颜色标识）',
+    REPORT_FORMAT_CSV: 'CSV（最快，含对比状态列，没有行数上限）',
+    REPORT_FORMAT_PARQUET: 'Parquet（最快，便于后续分析，没有行数上限）',
+    REPORT_FORMAT_HTML: 'HTML 网页（单个文件，带颜色标识，适合较小的结果）'
+}
 
 # ========================
 # 页面配置
@@ -17,44 +58,600 @@ st.set_page_config(
 # 页面标题
 # ========================
 st.title("📊 Excel精确键值对比工具")
-st.markdown("上传两个Excel文件，系统将自动标准化为以下5列，基于键值进行精确对比")
-
-# 固定列名标准
-FIXED_COLUMNS = ['替代料', '机型', '型号', '规格型号', '用量']
+st.markdown("上传两个Excel文件（也支持 CSV/TSV 及 gzip 压缩的 CSV），系统将自动标准化为以下5列，基于键值进行精确对比")
 
 # 显示固定表头说明
 st.info(f"""
 **系统将统一使用以下5个字段作为表头：**
 > {', '.join(FIXED_COLUMNS)}
 
-请确保你的Excel文件至少包含5列，且顺序对应。
+请确保你的Excel文件至少包含5列，且顺序对应；列顺序不同或表头名称不同（如“物料编码”）时，
+请选择“按表头名称”或在侧边栏保存表头映射方案，此时只读取映射到的5列。
 """)
 
 # ========================
-# 上传文件
+# 缓存：页面每次交互都会重新运行脚本，解析结果和对比结果按文件内容哈希缓存
 # ========================
-file1 = st.file_uploader("📤 上传【第一个】Excel文件", type=["xlsx", "xls"], key="file1")
-file2 = st.file_uploader("📥 上传【第二个】Excel文件", type=["xlsx", "xls"], key="file2")
+@st.cache_resource
+def get_caches():
+    """进程内共享的缓存：(已标准化的上传文件, 对比结果, 磁盘列式缓存)；内存中的两个缓存按估算的内存占用淘汰"""
+    return LRUCache(max_mb=DEFAULT_MEMORY_CACHE_MB), LRUCache(max_mb=DEFAULT_MEMORY_CACHE_MB), open_disk_cache()
+
+
+@st.cache_resource
+def get_baseline_store():
+    """基准快照存储；未安装 pyarrow 时为 None"""
+    return open_baseline_store()
+
+
+@st.cache_resource
+def get_result_viewers():
+    """对比结果的浏览索引（按对比缓存键），翻页和筛选时直接使用，不重新建立"""
+    return LRUCache(max_entries=8)
+
+
+@st.cache_resource
+def get_mapping_store():
+    """表头映射方案存储"""
+    return MappingStore()
+
+
+@st.cache_resource
+def get_report_workers():
+    """
+    后台生成Excel报告的线程池 + 按对比缓存键记录的报告任务。
+
+    任务在进程内共享，页面重新运行（切换预览、下载等交互）时直接取回同一个任务，不会重新生成。
+    """
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix='report'), LRUCache(max_entries=8)
+
+
+upload_cache, result_cache, disk_cache = get_caches()
+baseline_store = get_baseline_store()
+mapping_store = get_mapping_store()
+result_viewers = get_result_viewers()
+report_executor, report_jobs = get_report_workers()
+
+
+def timed_load(data, label, mapping=None):
+    """读取并标准化文件，同时记录读取阶段的性能数据"""
+    profiler = StageProfiler()
+    with profiler.stage('read') as stage:
+        df = load_normalized_cached(data, disk_cache, label, mapping=mapping)
+        stage['rows'] = len(df)
+    return df, profiler.stages[0]
+
+
+def load_upload(uploaded, label, mapping=None):
+    """
+    读取上传文件，同样内容的文件只解析一次：先查内存缓存，再查磁盘缓存。
+
+    返回 (文件哈希, 数据表, 首次读取时记录的读取阶段)；使用表头映射方案时，文件哈希中包含映射方案，
+    同一个文件按不同方案读取的结果分别缓存。
+    """
+    data = uploaded.getvalue()
+    file_hash = content_hash(data)
+    if mapping is not None:
+        file_hash = entry_key(file_hash, repr(mapping))
+    df, read_stage = upload_cache.get_or_create(file_hash, lambda: timed_load(data, label, mapping))
+    return file_hash, df, read_stage
+
+
+def select_mapping(key='mapping'):
+    """表头映射：按列顺序（默认）、按表头名称或已保存的映射方案，返回 ColumnMapping（按列顺序时为 None）"""
+    mappings = {mapping.name: mapping for mapping in mapping_store.list()}
+    choice = st.selectbox("表头映射", options=[MAPPING_BY_POSITION, MAPPING_BY_HEADER] + list(mappings), key=key)
+    if choice == MAPPING_BY_POSITION:
+        return None
+    if choice == MAPPING_BY_HEADER:
+        return ColumnMapping()
+    return mappings[choice]
+
+
+# 侧边栏：磁盘缓存管理
+if disk_cache is not None:
+    with st.sidebar.expander("🗄️ 磁盘缓存"):
+        cache_entries = disk_cache.entries()
+        st.write(f"共 {len(cache_entries)} 个文件，{sum(e['size'] for e in cache_entries) / 1024 / 1024:.1f} MB")
+        if st.button("清空磁盘缓存"):
+            disk_cache.purge()
+            upload_cache.clear()
+            st.success("已清空")
+
+# 侧边栏：表头映射方案管理
+with st.sidebar.expander("🧭 表头映射方案"):
+    st.caption("每个字段总是匹配同名表头，另外可以填写别名（多个用逗号分隔）；匹配时忽略空白、大小写和全角/半角")
+    mapping_name = st.text_input("方案名称", key="mapping_name")
+    mapping_aliases = {
+        field: [alias.strip() for alias in st.text_input(f"“{field}”的别名", key=f"mapping_alias_{field}")
+                .replace('，', ',').split(',')]
+        for field in FIXED_COLUMNS
+    }
+    if st.button("保存映射方案"):
+        if not mapping_name.strip():
+            st.warning("⚠️ 请填写方案名称")
+        else:
+            mapping_store.save(ColumnMapping(mapping_aliases, mapping_name.strip()))
+            st.success(f"映射方案“{mapping_name.strip()}”已保存")
+    saved_mappings = [mapping.name for mapping in mapping_store.list()]
+    if saved_mappings:
+        deleted_mapping = st.selectbox("已保存的方案", options=saved_mappings, key="mapping_delete")
+        if st.button("删除该方案"):
+            mapping_store.delete(deleted_mapping)
+            st.success(f"映射方案“{deleted_mapping}”已删除")
+
+
+def check_memory(file1, file2, mapping=None):
+    """
+    解析前预估两个上传文件对比所需的内存（结果按文件内容和表头映射方案缓存）。
+
+    返回执行方式（compare_memory.MEMORY_PLAN_*）：低内存方式也超出预算时改用磁盘对比，
+    磁盘对比不可用（xls 文件）时显示原因并停止，不再解析文件。
+    """
+    data1, data2 = file1.getvalue(), file2.getvalue()
+    estimate = upload_cache.get_or_create(
+        ('estimate', content_hash(data1), content_hash(data2), repr(mapping)),
+        lambda: estimate_footprint(data1, data2, mapping)
+    )
+    try:
+        plan = plan_memory(estimate, DEFAULT_MEMORY_BUDGET_MB, out_of_core=True)
+    except MemoryBudgetError as e:
+        st.error(f"❌ {e}")
+        st.stop()
+    if plan == MEMORY_PLAN_LOW_MEMORY:
+        st.warning(f"⚠️ 预计需要约 {estimate.in_memory_mb:.0f} MB 内存，超出内存预算 {DEFAULT_MEMORY_BUDGET_MB} MB，"
+                   f"已自动使用低内存模式（省内存类型 + 流式报告）")
+    elif plan == MEMORY_PLAN_OUT_OF_CORE:
+        st.warning(f"⚠️ 预计需要约 {estimate.low_memory_mb:.0f} MB 内存（低内存方式），超出内存预算 "
+                   f"{DEFAULT_MEMORY_BUDGET_MB} MB，已自动改用磁盘对比（在临时数据库中对比，不加载到内存）")
+    return plan
+
+
+def run_comparison(df1, df2, key_columns, key_mode, duplicate_mode, fuzzy_threshold=None, tolerance=None,
+                   profiler=None):
+    """键值对比（不生成报告）；给出 fuzzy_threshold 时使用模糊键匹配"""
+    if fuzzy_threshold is None:
+        return compare(df1, df2, key_columns, key_mode, duplicate_mode, tolerance, profiler)
+    with profile_stage(profiler, 'compare', len(df1) + len(df2)):
+        return compare_fuzzy(df1, df2, key_columns, duplicate_mode, fuzzy_threshold, tolerance)
+
+
+def build_report(result, low_memory, profiler, log_context, report_format=REPORT_FORMAT_XLSX):
+    """
+    生成报告：Excel 报告在低内存模式下写入临时文件（ReportFile），否则返回报告内容（bytes）；
+    其他格式写入临时文件。
+
+    写报告阶段记入 profiler，完成后把这次对比的性能数据写入性能日志。
+    """
+    with profiler.stage('report_write', len(result.comparison_df)):
+        if report_format != REPORT_FORMAT_XLSX:
+            report = write_result_report_tempfile(result, report_format)
+        elif low_memory:
+            report = write_streaming_report_tempfile(result)
+        else:
+            report = write_report(result, BytesIO()).getvalue()
+    write_perf_log(profiler, low_memory=low_memory, file1_rows=result.file1_rows, file2_rows=result.file2_rows,
+                   report_format=report_format, **log_context)
+    return report
+
+
+def submit_report(cache_key, result, low_memory, profiler, report_format=REPORT_FORMAT_XLSX, **log_context):
+    """
+    提交后台报告任务，返回 (任务, 该任务的性能记录)；同一对比、同一格式已有任务时直接返回该任务
+    （页面重新运行不会重新生成）。
+
+    每个任务使用对比性能记录的一份副本，缓存的对比结果生成多个报告时，写报告阶段不会累积到同一份记录中。
+    """
+    def submit():
+        job_profiler = profiler.copy()
+        return report_executor.submit(build_report, result, low_memory, job_profiler, log_context,
+                                      report_format), job_profiler
+
+    return report_jobs.get_or_create(cache_key + (report_format,), submit)
+
+
+def select_report_format(key='report_format'):
+    """报告格式：CSV、Parquet 跳过所有单元格格式处理，大结果也能很快生成"""
+    return st.selectbox(
+        "报告格式",
+        options=available_report_formats(),
+        format_func=lambda fmt: REPORT_FORMAT_LABELS[fmt],
+        key=key
+    )
+
+
+def render_profile(profiler, job):
+    """性能详情：各阶段的耗时、CPU时间、行数和峰值内存"""
+    with st.expander("⏱️ 性能详情"):
+        summary = profiler.to_dict()
+        col1, col2, col3 = st.columns(3)
+        col1.metric("总耗时（秒）", f"{summary['wall_seconds']:.3f}")
+        col2.metric("CPU时间（秒）", f"{summary['cpu_seconds']:.3f}")
+        col3.metric("峰值内存（MB）", summary['peak_rss_mb'])
+        st.dataframe(profiler.table(), use_container_width=True)
+        if job is not None and not job.done():
+            st.caption("写报告阶段完成后补充")
+        st.caption("峰值内存为进程常驻内存，读取阶段为文件首次解析时的记录")
+
+
+@st.fragment(run_every=1)
+def wait_for_report(job):
+    """报告生成期间每秒检查一次，只刷新这一小块；完成后重新运行整个页面以显示下载按钮"""
+    if job.done():
+        st.rerun()
+    st.info("⏳ 正在后台生成报告，完成后这里会出现下载按钮（可以先查看上面的结果）")
+
+
+def render_download(job, report_format=REPORT_FORMAT_XLSX):
+    """报告已生成时显示下载按钮（低内存模式和非 xlsx 格式从临时文件读取报告），否则显示等待提示"""
+    if not job.done():
+        wait_for_report(job)
+        return
+    try:
+        report = job.result()
+    except Exception as e:
+        st.error(f"❌ 生成报告时出错：{e}")
+        return
+    render_report_download(report, report_format)
+
+
+def render_report_download(report, report_format=REPORT_FORMAT_XLSX):
+    """下载按钮：report 为报告内容（bytes）或报告临时文件（ReportFile）"""
+    report_data = report
+    if not isinstance(report, bytes):
+        def report_data():
+            # 点击下载时才读取报告临时文件，页面重新运行时不会把整个报告读入内存
+            with report.open() as f:
+                return f.read()
+    st.download_button(
+        label="📥 下载精确对比报告",
+        data=report_data,
+        file_name=report_file_name(report_format),
+        mime=REPORT_MIMES[report_format]
+    )
+
+
+def select_compare_options(exact_only=False):
+    """
+    对比选项：匹配字段、键值存储方式、重复键处理方式、类型感知比较（不启用时为 None）。
+
+    exact_only=True（磁盘对比）时只按文本精确比较，不显示键值存储方式和类型感知比较。
+    """
+    # 用户选择匹配字段
+    key_columns = st.multiselect(
+        "请选择用于数据匹配的字段（可多选）",
+        options=FIXED_COLUMNS,
+        default=['替代料']  # 默认选“替代料”
+    )
+
+    # 键值存储方式：元组/哈希整数比拼接字符串占用更少内存
+    key_mode = KEY_MODE_TEXT
+    if not exact_only:
+        key_mode_labels = {
+            KEY_MODE_TEXT: '拼接字符串（默认）',
+            KEY_MODE_TUPLE: '元组',
+            KEY_MODE_HASH: '64位哈希整数（省内存）'
+        }
+        key_mode = st.selectbox(
+            "键值存储方式",
+            options=KEY_MODES,
+            format_func=lambda m: key_mode_labels[m]
+        )
+    duplicate_mode_labels = {
+        DUPLICATE_FIRST: '只取首条（默认）',
+        DUPLICATE_OCCURRENCE: '按出现顺序逐条配对，多出的重复行单独标记'
+    }
+    duplicate_mode = st.selectbox(
+        "重复键处理方式",
+        options=DUPLICATE_MODES,
+        format_func=lambda m: duplicate_mode_labels[m]
+    )
+
+    # 类型感知比较：用量等数值字段按容差比较，2 与 2.0 不再算作差异
+    tolerance = None
+    if not exact_only and st.checkbox("类型感知比较（数值字段按容差比较，文本去掉首尾空白后比较）"):
+        col1, col2 = st.columns(2)
+        abs_tol = col1.number_input("绝对容差", min_value=0.0, value=0.0, format="%g")
+        rel_tol = col2.number_input("相对容差", min_value=0.0, value=1e-9, format="%g")
+        tolerance = Tolerance(abs_tol, rel_tol)
+    return key_columns, key_mode, duplicate_mode, tolerance
+
+
+def display_frame(df):
+    """页面显示用：数值和文本混杂的列（如用量）转为文本，空值保持为空（页面按 Arrow 格式传输数据）"""
+    df = df.copy()
+    for col in df.columns[df.dtypes == object]:
+        df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+
+@st.fragment
+def render_viewer(viewer, diff_fields):
+    """结果浏览：按对比状态、匹配字段的子串和差异字段筛选，按页显示；筛选和翻页只刷新这一块"""
+    if st.session_state.get('viewer_id') != id(viewer):
+        for key in VIEWER_KEYS:
+            st.session_state.pop(key, None)
+        st.session_state['viewer_id'] = id(viewer)
+    col1, col2, col3 = st.columns([2, 2, 1])
+    statuses = col1.multiselect("对比状态", options=list(viewer.status_rows), key='viewer_statuses')
+    key_contains = col2.text_input("匹配字段包含", key='viewer_key').strip()
+    changed_field = col3.selectbox("差异字段", options=['全部'] + diff_fields, key='viewer_field')
+    filter_key = (tuple(statuses), key_contains, changed_field)
+    if st.session_state.get('viewer_filter') != filter_key:
+        # 筛选条件变化时回到第一页
+        st.session_state['viewer_filter'] = filter_key
+        st.session_state['viewer_page'] = 1
+    rows = viewer.filter(statuses, key_contains, None if changed_field == '全部' else changed_field)
+    page_count = viewer.page_count(rows)
+    page_number = st.number_input(f"页码（共 {page_count} 页）", min_value=1, max_value=page_count, key='viewer_page')
+    page_df = viewer.page(rows, page_number)
+    st.caption(f"符合条件 {len(rows)} 行，第 {page_number}/{page_count} 页（每页 {viewer.page_rows} 行）")
+    rename_dict = {c: c.replace('文件1_', '文件1.').replace('文件2_', '文件2.') for c in page_df.columns}
+    st.dataframe(display_frame(page_df).rename(columns=rename_dict), use_container_width=True, hide_index=True)
+
+
+def render_result(result, job, profiler, report_format=REPORT_FORMAT_XLSX, cache_key=None):
+    """
+    展示对比结果，报告在后台生成；job 为报告任务（结果为报告内容 bytes 或报告临时文件），
+    profiler 为这次对比的分阶段性能记录，report_format 为报告格式，
+    cache_key 为对比缓存键（结果浏览索引按它缓存）。
+    """
+    status_counts = result.status_counts
+
+    # ========================
+    # 在网页上展示结果
+    # ========================
+    st.subheader("📊 精确对比结果")
+
+    if report_format in (REPORT_FORMAT_CSV, REPORT_FORMAT_PARQUET):
+        st.info("**报告为对比表本身**（不含颜色标识），“对比状态”列标出每行的状态，“差异字段”列列出值不同的字段")
+    else:
+        st.info("""
+        **Excel报告包含2个工作表：**
+        - 🔍 **精确键值对比**：左右并排显示，带颜色标识
+        - 📈 **差异汇总**：统计信息
+
+        **颜色标识说明：**
+        - 🟢 浅绿色：仅出现在第一个文件
+        - 🔴 浅红色：仅出现在第二个文件  
+        - 🟡 浅黄色：值不同的单元格（差异字段列列出变化的字段）
+        - 🟠 浅橙色：重复键多出的行（按出现顺序配对时）
+        - 🔵 浅蓝色：模糊匹配的行（键不完全相同，匹配得分列给出相似度）
+        """)
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("📄 文件1总行数", result.file1_rows)
+    col2.metric("📄 文件2总行数", result.file2_rows)
+    col3.metric("✅ 数据一致", status_counts['数据一致'])
+    col4.metric("⚠️ 字段差异", status_counts['字段差异'])
+
+    # 各字段差异数量
+    if result.diff_counts:
+        st.write("各字段差异数量：")
+        st.dataframe(
+            {'字段': list(result.diff_counts), '差异行数': list(result.diff_counts.values())},
+            use_container_width=True
+        )
+
+    # 结果浏览：对比表留在服务端，只把当前页交给页面
+    st.write("### 👀 对比结果浏览")
+    viewer = result_viewers.get_or_create(cache_key, lambda: ResultViewer(result))
+    render_viewer(viewer, list(result.diff_mask.columns))
+
+    # 完全一致提示
+    if result.total_diff == 0:
+        st.balloons()
+        st.success("🎉 两个文件数据完全一致！")
+
+    render_profile(profiler, job)
+    render_download(job, report_format)
+
+
+def run_multi_sheet_comparison(data1, data2, key_columns, key_mode, duplicate_mode, max_workers, worker_memory_mb,
+                               tolerance=None, mapping=None):
+    """多工作表对比并生成合并报告"""
+    multi = compare_workbooks(
+        data1, data2, key_columns, key_mode, duplicate_mode,
+        max_workers=max_workers, worker_memory_mb=worker_memory_mb or None, tolerance=tolerance, mapping=mapping
+    )
+    return multi, write_multi_report(multi, BytesIO()).getvalue()
+
+
+def render_multi_sheet(file1, file2, mapping=None):
+    """多工作表模式：按名称配对两个工作簿的所有工作表，并行对比"""
+    data1 = file1.getvalue()
+    data2 = file2.getvalue()
+    if any(is_text_table(source_head(data)) for data in (data1, data2)):
+        st.error("❌ CSV/TSV 文件没有多个工作表，请取消多工作表模式，使用两个文件对比")
+        return
+    key_columns, key_mode, duplicate_mode, tolerance = select_compare_options()
+    col1, col2 = st.columns(2)
+    max_workers = col1.number_input("并行进程数", min_value=1, max_value=64, value=os.cpu_count() or 1)
+    worker_memory_mb = col2.number_input("单个进程内存上限（MB，0 表示不限制）", min_value=0, value=0, step=512)
+
+    if len(key_columns) == 0:
+        st.warning("⚠️ 请至少选择一个匹配字段")
+        return
+
+    cache_key = comparison_cache_key(
+        content_hash(data1), content_hash(data2), key_columns, key_mode, duplicate_mode, tolerance, repr(mapping),
+        'all_sheets'
+    )
+    if st.button("🔍 开始多工作表对比"):
+        st.session_state['compare_key'] = cache_key
+    if st.session_state.get('compare_key') != cache_key:
+        return
 
-if file1 and file2:
     try:
-        # 读取原始数据
-        df1_raw = pd.read_excel(file1)
-        df2_raw = pd.read_excel(file2)
+        with st.spinner("正在并行对比所有工作表..."):
+            multi, excel_data = result_cache.get_or_create(
+                cache_key,
+                lambda: run_multi_sheet_comparison(
+                    data1, data2, key_columns, key_mode, duplicate_mode, max_workers, worker_memory_mb, tolerance,
+                    mapping
+                )
+            )
+    except InputFormatError as e:
+        st.error(f"❌ {e}")
+        return
+
+    st.subheader("📊 多工作表对比结果")
+    col1, col2, col3 = st.columns(3)
+    col1.metric("📑 配对工作表", len(multi.pairing.paired))
+    col2.metric("❌ 出错工作表", len(multi.errors))
+    col3.metric("⚠️ 不一致数据合计", multi.total_diff)
+    st.dataframe(build_multi_summary(multi), use_container_width=True)
+    st.download_button(
+        label="📥 下载多工作表对比报告",
+        data=excel_data,
+        file_name=report_file_name(),
+        mime=XLSX_MIME
+    )
+
+
+def render_baseline_mode():
+    """基准快照模式：上传一个新版本与已保存的基准对比（基准为文件1，新版本为文件2）"""
+    uploaded = st.file_uploader("📤 上传新版本Excel文件", type=UPLOAD_TYPES, key="baseline_file")
+    if not uploaded:
+        return
+    mapping = select_mapping(key="baseline_mapping")
+    try:
+        file_hash, df, read_stage = load_upload(uploaded, '上传的文件', mapping)
+    except InputFormatError as e:
+        st.error(f"❌ {e}")
+        return
+    st.write(f"数据行数: {len(df)}")
+
+    with st.expander("💾 把这个文件保存为新基准"):
+        name = st.text_input("基准名称", value=os.path.splitext(uploaded.name)[0])
+        key_columns = st.multiselect("匹配字段", options=FIXED_COLUMNS, default=['替代料'], key="baseline_keys")
+        if st.button("保存基准"):
+            if not name.strip() or not key_columns:
+                st.warning("⚠️ 请填写基准名称并至少选择一个匹配字段")
+            else:
+                meta = baseline_store.save(build_baseline(name.strip(), df, key_columns))
+                st.success(f"基准“{meta['name']}”已保存：{meta['rows']} 行，{meta['keys']} 个键")
+
+    baselines = {meta['name']: meta for meta in baseline_store.list()}
+    if not baselines:
+        st.info("还没有保存的基准，请先把一个文件保存为基准")
+        return
+    name = st.selectbox(
+        "选择基准",
+        options=list(baselines),
+        format_func=lambda n: f"{n}（匹配字段：{'、'.join(baselines[n]['key_columns'])}，{baselines[n]['created']}）"
+    )
+    low_memory = st.checkbox("低内存模式（大文件推荐：流式写入报告，按状态条件格式着色）", key="baseline_low_memory")
+    report_format = select_report_format(key="baseline_report_format")
+
+    cache_key = comparison_cache_key(name, file_hash, baselines[name]['key_columns'],
+                                     baselines[name]['created'], 'baseline', low_memory)
+    if st.button("🔍 与基准对比"):
+        st.session_state['compare_key'] = cache_key
+    if st.session_state.get('compare_key') != cache_key:
+        return
+
+    def run_baseline_comparison():
+        profiler = StageProfiler()
+        profiler.add(read_stage)
+        with profiler.stage('compare', len(df)):
+            result = compare_to_baseline(baseline_store.load(name), df)
+        return result, profiler
+
+    with st.spinner("正在与基准对比..."):
+        result, profiler = result_cache.get_or_create(cache_key, run_baseline_comparison)
+    job, job_profiler = submit_report(cache_key, result, low_memory, profiler, report_format, mode='baseline',
+                                      key_columns=baselines[name]['key_columns'])
+    render_result(result, job, job_profiler, report_format, cache_key)
+
+
+def run_sqlite_comparison(data1, data2, key_columns, duplicate_mode, mapping=None, report_format=REPORT_FORMAT_XLSX):
+    """
+    磁盘对比：两个文件逐行写入临时数据库后对比，报告直接从数据库流式写入临时文件。
+
+    返回 (对比统计, 预览行, 报告临时文件, 性能记录)；数据库在返回前删除，对比统计只保留数量。
+    """
+    profiler = StageProfiler()
+    with compare_sqlite(BytesIO(data1), BytesIO(data2), key_columns, duplicate_mode, profiler=profiler,
+                        mapping=mapping) as comparison:
+        preview = list(comparison.iter_rows(limit=10))
+        with profiler.stage('report_write', comparison.row_count):
+            report = write_sqlite_report_tempfile(comparison, report_format)
+    write_perf_log(profiler, mode='two_files', engine='sqlite', key_columns=key_columns, report_format=report_format,
+                   file1_rows=comparison.file1_rows, file2_rows=comparison.file2_rows)
+    return comparison, preview, report, profiler
+
+
+def render_out_of_core(file1, file2, mapping=None):
+    """超出内存预算时的磁盘对比：只支持精确匹配（不支持模糊匹配和类型感知比较）"""
+    key_columns, _, duplicate_mode, _ = select_compare_options(exact_only=True)
+    report_format = select_report_format()
+    if len(key_columns) == 0:
+        st.warning("⚠️ 请至少选择一个匹配字段")
+        return
+    data1, data2 = file1.getvalue(), file2.getvalue()
+    cache_key = ('sqlite', content_hash(data1), content_hash(data2), tuple(key_columns), duplicate_mode,
+                 repr(mapping), report_format)
+    if st.button("🔍 开始精确对比（磁盘）"):
+        st.session_state['compare_key'] = cache_key
+    if st.session_state.get('compare_key') != cache_key:
+        return
+    with st.spinner("正在磁盘对比并生成报告..."):
+        comparison, preview, report, profiler = result_cache.get_or_create(
+            cache_key, lambda: run_sqlite_comparison(data1, data2, key_columns, duplicate_mode, mapping, report_format)
+        )
+
+    st.subheader("📊 精确对比结果")
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("📄 文件1总行数", comparison.file1_rows)
+    col2.metric("📄 文件2总行数", comparison.file2_rows)
+    col3.metric("✅ 数据一致", comparison.status_counts['数据一致'])
+    col4.metric("⚠️ 字段差异", comparison.status_counts['字段差异'])
+    if comparison.diff_counts:
+        st.write("各字段差异数量：")
+        st.dataframe(
+            {'字段': list(comparison.diff_counts), '差异行数': list(comparison.diff_counts.values())},
+            use_container_width=True
+        )
+    st.write("### 👀 对比结果预览")
+    st.dataframe(pd.DataFrame(preview, columns=REPORT_COLUMNS), use_container_width=True)
+    if comparison.total_diff == 0:
+        st.success("🎉 两个文件数据完全一致！")
+    render_profile(profiler, None)
+    render_report_download(report, report_format)
 
-        # 检查列数是否足够
-        if len(df1_raw.columns) < 5:
-            st.error("❌ 第一个文件的列数少于5列，无法映射到固定表头")
-            st.stop()
-        if len(df2_raw.columns) < 5:
-            st.error("❌ 第二个文件的列数少于5列，无法映射到固定表头")
-            st.stop()
 
-        # 取前5列并重命名为固定列名
-        df1 = df1_raw.iloc[:, :5].copy()
-        df2 = df2_raw.iloc[:, :5].copy()
-        df1.columns = FIXED_COLUMNS
-        df2.columns = FIXED_COLUMNS
+# ========================
+# 上传文件
+# ========================
+compare_mode = '两个文件对比'
+if baseline_store is not None:
+    compare_mode = st.radio("对比方式", ['两个文件对比', '与基准快照对比'], horizontal=True)
+if compare_mode == '与基准快照对比':
+    render_baseline_mode()
+    st.stop()
+
+file1 = st.file_uploader("📤 上传【第一个】Excel/CSV文件", type=UPLOAD_TYPES, key="file1")
+file2 = st.file_uploader("📥 上传【第二个】Excel/CSV文件", type=UPLOAD_TYPES, key="file2")
+multi_sheet = st.checkbox("📑 多工作表模式：按名称配对并对比两个工作簿中的所有工作表")
+mapping = select_mapping()
+
+if file1 and file2 and multi_sheet:
+    render_multi_sheet(file1, file2, mapping)
+elif file1 and file2:
+    try:
+        # 读取并标准化为固定表头（先预估内存，超出预算时不解析）
+        try:
+            memory_plan = check_memory(file1, file2, mapping)
+            if memory_plan == MEMORY_PLAN_OUT_OF_CORE:
+                render_out_of_core(file1, file2, mapping)
+                st.stop()
+            force_low_memory = memory_plan == MEMORY_PLAN_LOW_MEMORY
+            hash1, df1, read_stage1 = load_upload(file1, '第一个文件', mapping)
+            hash2, df2, read_stage2 = load_upload(file2, '第二个文件', mapping)
+        except InputFormatError as e:
+            st.error(f"❌ {e}")
+            st.stop()
 
         st.success("✅ 文件读取成功，并已应用固定表头！")
 
@@ -69,201 +666,47 @@ if file1 and file2:
             st.dataframe(df2.head(3), use_container_width=True)
             st.write(f"数据行数: {len(df2)}")
 
-        # 用户选择匹配字段
-        key_columns = st.multiselect(
-            "请选择用于数据匹配的字段（可多选）",
-            options=FIXED_COLUMNS,
-            default=['替代料']  # 默认选“替代料”
-        )
+        key_columns, key_mode, duplicate_mode, tolerance = select_compare_options()
+        low_memory = st.checkbox("低内存模式（大文件推荐：流式写入报告，按状态条件格式着色）",
+                                 value=force_low_memory, disabled=force_low_memory)
+        fuzzy = st.checkbox("模糊键匹配（规范化全角字符、空白、大小写，剩余的键按相似度配对）")
+        fuzzy_threshold = None
+        if fuzzy:
+            fuzzy_threshold = st.slider("相似度阈值", min_value=0.5, max_value=1.0, value=DEFAULT_THRESHOLD, step=0.05)
+        compact = st.checkbox("省内存模式（重复值多的字段转为分类类型，文本转为紧凑字符串）",
+                              value=force_low_memory, disabled=force_low_memory)
+        report_format = select_report_format()
+        if compact:
+            before_mb = frame_memory_mb(df1, df2)
+            df1, df2 = upload_cache.get_or_create(('compact', hash1, hash2), lambda: optimize_memory(df1, df2))
+            st.caption(f"两个文件的内存占用：{before_mb:.2f} MB → {frame_memory_mb(df1, df2):.2f} MB")
 
         if len(key_columns) == 0:
             st.warning("⚠️ 请至少选择一个匹配字段")
         else:
+            cache_key = comparison_cache_key(
+                hash1, hash2, key_columns, key_mode, duplicate_mode, low_memory, fuzzy_threshold, tolerance, compact
+            )
             if st.button("🔍 开始精确对比"):
-                with st.spinner("正在生成精确对比报告..."):
-                    # 创建唯一键
-                    df1['__key__'] = df1[key_columns].astype(str).apply(lambda x: '｜'.join(x), axis=1)
-                    df2['__key__'] = df2[key_columns].astype(str).apply(lambda x: '｜'.join(x), axis=1)
-
-                    # 合并对比
-                    combined = pd.merge(
-                        df1,
-                        df2,
-                        on='__key__',
-                        how='outer',
-                        suffixes=('_文件1', '_文件2'),
-                        indicator=True
-                    )
-
-                    # 分离不同情况
-                    only_in_file1 = combined[combined['_merge'] == 'left_only'].copy()
-                    only_in_file2 = combined[combined['_merge'] == 'right_only'].copy()
-                    common = combined[combined['_merge'] == 'both'].copy()
-
-                    # ========================
-                    # 生成精确对比的Excel报告
-                    # ========================
-                    output = BytesIO()
-
-                    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-                        workbook = writer.book
-
-                        # 定义格式
-                        format_green = workbook.add_format({'bg_color': '#C6EFCE', 'font_color': '#006100'})  # 绿
-                        format_red = workbook.add_format({'bg_color': '#FFC7CE', 'font_color': '#9C0006'})     # 红
-                        format_yellow = workbook.add_format({'bg_color': '#FFEB9C', 'font_color': '#9C0000'}) # 黄
-                        format_header = workbook.add_format({'bold': True, 'bg_color': '#366092', 'font_color': 'white'})
-
-                        # 构建对比数据
-                        comparison_data = []
-                        all_keys = set(df1['__key__'].tolist() + df2['__key__'].tolist())
-
-                        for key in all_keys:
-                            row_data = {'匹配字段': key}
-                            f1_row = df1[df1['__key__'] == key]
-                            f2_row = df2[df2['__key__'] == key]
-
-                            # 文件1数据
-                            for col in FIXED_COLUMNS:
-                                val = f1_row.iloc[0][col] if not f1_row.empty else ""
-                                row_data[f'文件1_{col}'] = val
-
-                            # 文件2数据
-                            for col in FIXED_COLUMNS:
-                                val = f2_row.iloc[0][col] if not f2_row.empty else ""
-                                row_data[f'文件2_{col}'] = val
-
-                            # 判断状态
-                            if not f1_row.empty and not f2_row.empty:
-                                has_diff = False
-                                for col in FIXED_COLUMNS:
-                                    if col not in key_columns:
-                                        v1 = str(f1_row.iloc[0][col]) if not pd.isna(f1_row.iloc[0][col]) else ""
-                                        v2 = str(f2_row.iloc[0][col]) if not pd.isna(f2_row.iloc[0][col]) else ""
-                                        if v1 != v2:
-                                            has_diff = True
-                                            break
-                                row_data['对比状态'] = '字段差异' if has_diff else '数据一致'
-                            elif not f1_row.empty:
-                                row_data['对比状态'] = '仅文件1有'
-                            else:
-                                row_data['对比状态'] = '仅文件2有'
-
-                            comparison_data.append(row_data)
-
-                        comparison_df = pd.DataFrame(comparison_data)
-
-                        # 重新排序列
-                        file1_cols = [f'文件1_{col}' for col in FIXED_COLUMNS]
-                        file2_cols = [f'文件2_{col}' for col in FIXED_COLUMNS]
-                        final_cols = ['匹配字段'] + file1_cols + file2_cols + ['对比状态']
-                        comparison_df = comparison_df[final_cols]
-
-                        # 写入主表
-                        comparison_df.to_excel(writer, sheet_name='精确键值对比', index=False)
-                        worksheet = writer.sheets['精确键值对比']
-
-                        # 设置列宽
-                        worksheet.set_column(0, 0, 25)  # 匹配字段
-                        for i in range(1, len(final_cols)-1):
-                            worksheet.set_column(i, i, 18)
-                        worksheet.set_column(len(final_cols)-1, len(final_cols)-1, 15)
-
-                        # 应用颜色
-                        for row_idx in range(1, len(comparison_df)+1):
-                            status = comparison_df.iloc[row_idx-1]['对比状态']
-                            if status == '仅文件1有':
-                                worksheet.set_row(row_idx, None, format_green)
-                            elif status == '仅文件2有':
-                                worksheet.set_row(row_idx, None, format_red)
-                            elif status == '字段差异':
-                                worksheet.set_row(row_idx, None, format_yellow)
-
-                        # 标题行格式
-                        for col_num, value in enumerate(comparison_df.columns):
-                            worksheet.write(0, col_num, value, format_header)
-
-                        # 差异汇总表
-                        status_counts = {
-                            '数据一致': len(comparison_df[comparison_df['对比状态'] == '数据一致']),
-                            '仅文件1有': len(comparison_df[comparison_df['对比状态'] == '仅文件1有']),
-                            '仅文件2有': len(comparison_df[comparison_df['对比状态'] == '仅文件2有']),
-                            '字段差异': len(comparison_df[comparison_df['对比状态'] == '字段差异'])
-                        }
-
-                        summary_data = {
-                            '对比状态': ['数据一致', '仅文件1有', '仅文件2有', '字段差异', '文件1总行数', '文件2总行数'],
-                            '数量': [
-                                status_counts['数据一致'],
-                                status_counts['仅文件1有'],
-                                status_counts['仅文件2有'],
-                                status_counts['字段差异'],
-                                len(df1),
-                                len(df2)
-                            ],
-                            '说明': [
-                                '两个文件完全一致的数据',
-                                '仅出现在第一个文件的数据',
-                                '仅出现在第二个文件的数据',
-                                '键相同但字段值不同的数据',
-                                '第一个文件总数据量',
-                                '第二个文件总数据量'
-                            ]
-                        }
-                        summary_df = pd.DataFrame(summary_data)
-                        summary_df.to_excel(writer, sheet_name='差异汇总', index=False)
-
-                        worksheet_summary = writer.sheets['差异汇总']
-                        worksheet_summary.set_column(0, 0, 15)
-                        worksheet_summary.set_column(1, 1, 10)
-                        worksheet_summary.set_column(2, 2, 40)
-                        for col_num, value in enumerate(summary_df.columns):
-                            worksheet_summary.write(0, col_num, value, format_header)
-
-                    # ========================
-                    # 在网页上展示结果
-                    # ========================
-                    st.subheader("📊 精确对比结果")
-
-                    st.info("""
-                    **Excel报告包含2个工作表：**
-                    - 🔍 **精确键值对比**：左右并排显示，带颜色标识
-                    - 📈 **差异汇总**：统计信息
-
-                    **颜色标识说明：**
-                    - 🟢 浅绿色：仅出现在第一个文件
-                    - 🔴 浅红色：仅出现在第二个文件  
-                    - 🟡 浅黄色：字段值不同
-                    """)
-
-                    col1, col2, col3, col4 = st.columns(4)
-                    col1.metric("📄 文件1总行数", len(df1))
-                    col2.metric("📄 文件2总行数", len(df2))
-                    col3.metric("✅ 数据一致", status_counts['数据一致'])
-                    col4.metric("⚠️ 字段差异", status_counts['字段差异'])
-
-                    # 预览
-                    preview_cols = ['匹配字段'] + file1_cols[:3] + file2_cols[:3] + ['对比状态']
-                    preview_df = comparison_df[preview_cols].head(10)
-                    rename_dict = {c: c.replace('文件1_', '文件1.').replace('文件2_', '文件2.') for c in preview_cols}
-                    preview_df = preview_df.rename(columns=rename_dict)
-                    st.write("### 👀 对比结果预览")
-                    st.dataframe(preview_df, use_container_width=True)
-
-                    # 完全一致提示
-                    total_diff = status_counts['仅文件1有'] + status_counts['仅文件2有'] + status_counts['字段差异']
-                    if total_diff == 0:
-                        st.balloons()
-                        st.success("🎉 两个文件数据完全一致！")
-
-                    # 下载按钮
-                    excel_data = output.getvalue()
-                    st.download_button(
-                        label="📥 下载精确对比报告",
-                        data=excel_data,
-                        file_name=f"精确对比报告_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                st.session_state['compare_key'] = cache_key
+
+            # 点击对比后，下载等交互引起的重新运行直接使用缓存结果和同一个报告任务
+            if st.session_state.get('compare_key') == cache_key:
+                def run_profiled_comparison():
+                    profiler = StageProfiler()
+                    profiler.add(read_stage1)
+                    profiler.add(read_stage2)
+                    result = run_comparison(
+                        df1, df2, key_columns, key_mode, duplicate_mode, fuzzy_threshold, tolerance, profiler
                     )
+                    return result, profiler
+
+                with st.spinner("正在精确对比..."):
+                    result, profiler = result_cache.get_or_create(cache_key, run_profiled_comparison)
+                job, job_profiler = submit_report(cache_key, result, low_memory, profiler, report_format,
+                                                  mode='two_files', key_columns=key_columns,
+                                                  fuzzy=fuzzy_threshold is not None)
+                render_result(result, job, job_profiler, report_format, cache_key)
 
     except Exception as e:
         st.error(f"❌ 处理文件时出错：{str(e)}")
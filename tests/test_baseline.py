@@ -0,0 +1,43 @@
+import pandas as pd
+import pytest
+
+from compare_baseline import BaselineStore, build_baseline, compare_to_baseline
+from compare_engine import FIXED_COLUMNS, MATCH_COLUMN, Tolerance, add_key_column, compare_frames
+
+
+def frame(rows):
+    return pd.DataFrame(rows, columns=FIXED_COLUMNS)
+
+
+def direct(old, new, key_columns, tolerance=None):
+    return compare_frames(add_key_column(old.copy(), key_columns), add_key_column(new.copy(), key_columns),
+                          key_columns, tolerance=tolerance)
+
+
+OLD = frame([['A', 'M1', 'X', 'S', 2], ['B', 'M1', 'Y', 'S', 2], ['C', 'M1', 'Z', 'S', 3]])
+CASES = {
+    'removed': frame([['A', 'M1', 'X', 'S', 2], ['B', 'M2', 'Y', 'S', 2]]),
+    'added': frame([['A', 'M1', 'X', 'S', 2], ['B', 'M2', 'Y', 'S', 2], ['C', 'M1', 'Z', 'S', 3],
+                    ['D', 'M1', 'W', 'S', 4]]),
+    'added_and_removed': frame([['B', 'M2', 'Y', 'S', 2], ['D', 'M1', 'W', 'S', 4], ['A', 'M1', 'X', 'S', 5]]),
+}
+
+
+@pytest.mark.parametrize('case', list(CASES))
+@pytest.mark.parametrize('tolerance', [None, Tolerance()])
+def test_matches_direct_comparison(tmp_path, case, tolerance):
+    new = CASES[case]
+    store = BaselineStore(str(tmp_path))
+    store.save(build_baseline('主BOM', OLD, ['替代料']))
+    result = compare_to_baseline(store.load('主BOM'), new, tolerance)
+    expected = direct(OLD, new, ['替代料'], tolerance)
+    pd.testing.assert_frame_equal(result.comparison_df, expected.comparison_df)
+    assert result.status_counts == expected.status_counts
+    assert result.diff_counts == expected.diff_counts
+
+
+def test_changed_row_next_to_removed_key():
+    result = compare_to_baseline(build_baseline('主BOM', OLD, ['替代料']), CASES['removed'])
+    row = result.comparison_df.set_index(MATCH_COLUMN).loc['B']
+    assert row['差异字段'] == '机型'
+    assert str(row['文件1_用量']) == '2' and str(row['文件2_用量']) == '2'
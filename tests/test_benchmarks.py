@@ -0,0 +1,32 @@
+import pandas as pd
+
+from benchmarks.bom_generator import generate_bom_pair, write_bom_pair
+from compare_engine import DUPLICATE_OCCURRENCE, FIXED_COLUMNS, compare
+from compare_io import load_normalized
+
+
+def test_written_workbooks_match_generated_data(tmp_path):
+    path1, path2 = write_bom_pair(str(tmp_path), 500, seed=3)
+    expected1, expected2 = generate_bom_pair(500, seed=3)
+    for path, expected in ((path1, expected1), (path2, expected2)):
+        actual = pd.read_excel(path)
+        assert list(actual.columns) == FIXED_COLUMNS
+        assert actual.notna().all().all()
+        pd.testing.assert_frame_equal(actual, expected.reset_index(drop=True), check_dtype=False)
+
+
+def test_generated_pair_has_every_status(tmp_path):
+    path1, path2 = write_bom_pair(str(tmp_path), 2000, seed=1)
+    result = compare(load_normalized(path1), load_normalized(path2), ['替代料', '机型'])
+    for status in ('数据一致', '仅文件1有', '仅文件2有', '字段差异'):
+        assert result.status_counts[status] > 0
+
+
+def test_duplicates_repeat_the_benchmark_key():
+    # 基准测试默认按（替代料, 机型）匹配，重复行必须重复整个键
+    df1, df2 = generate_bom_pair(5000, duplicate_rate=0.05, seed=2)
+    duplicated = df1.duplicated(['替代料', '机型'])
+    assert 0.03 < duplicated.mean() < 0.07
+    assert (df1.duplicated('替代料') == duplicated).all()
+    result = compare(df1, df2, ['替代料', '机型'], duplicate_mode=DUPLICATE_OCCURRENCE)
+    assert result.status_counts['重复键多出'] > 0
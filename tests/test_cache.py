@@ -0,0 +1,82 @@
+import pandas as pd
+import pytest
+
+import compare_io
+from compare_cache import LRUCache, estimate_size, open_disk_cache
+from compare_engine import FIXED_COLUMNS
+from compare_mapping import ColumnMapping
+
+
+def frame(rows):
+    return pd.DataFrame([[f'A{i}', 'M1', 'X', 'S', i] for i in range(rows)], columns=FIXED_COLUMNS)
+
+
+def test_lru_cache_evicts_by_estimated_size():
+    df = frame(1000)
+    size = estimate_size(df)
+    assert size == df.memory_usage(index=True, deep=True).sum()
+    # 元组、普通对象中的数据表也计入条目大小
+    assert estimate_size((df, 'read')) == size + len('read')
+    cache = LRUCache(max_mb=2.5 * size / 1024 / 1024)
+    cache.put('a', df)
+    cache.put('b', (df, 'read'))
+    cache.get('a')
+    cache.put('c', df)
+    assert 'b' not in cache and 'a' in cache and 'c' in cache
+    assert cache.total_bytes == 2 * size
+
+
+def test_lru_cache_keeps_newest_oversized_entry():
+    cache = LRUCache(max_mb=1e-6)
+    cache.put('a', frame(10))
+    cache.put('b', frame(10))
+    assert list(cache._data) == ['b']
+    cache.clear()
+    assert cache.total_bytes == 0 and len(cache) == 0
+
+
+def test_lru_cache_requires_a_limit():
+    with pytest.raises(ValueError):
+        LRUCache()
+    cache = LRUCache(max_entries=1)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert 'a' not in cache and cache.get('b') == 2
+
+
+def test_disk_cache_key_includes_reader_version(tmp_path, monkeypatch):
+    # 读取方式的版本变化后不再使用旧条目
+    pytest.importorskip('pyarrow')
+    path = tmp_path / 'bom.xlsx'
+    frame(5).to_excel(path, index=False)
+    disk_cache = open_disk_cache(str(tmp_path / 'cache'))
+    calls = []
+    load_normalized = compare_io.load_normalized
+    monkeypatch.setattr(compare_io, 'load_normalized', lambda *args: calls.append(args) or load_normalized(*args))
+    compare_io.load_normalized_cached(str(path), disk_cache)
+    compare_io.load_normalized_cached(str(path), disk_cache)
+    assert len(calls) == 1
+    monkeypatch.setattr(compare_io, 'READER_VERSION', compare_io.READER_VERSION + 1)
+    compare_io.load_normalized_cached(str(path), disk_cache)
+    assert len(calls) == 2
+    assert len(disk_cache.entries()) == 2
+
+
+def test_disk_cache_hit_returns_same_frame(tmp_path, monkeypatch):
+    # 第二次读取直接从磁盘缓存取出（不再解析 xlsx），数据与首次读取一致；混有数字和文本的列转为文本保存
+    pytest.importorskip('pyarrow')
+    df = frame(20).astype(object)
+    df.loc[3, '型号'] = 7
+    path = tmp_path / 'bom.xlsx'
+    df.to_excel(path, index=False)
+    disk_cache = open_disk_cache(str(tmp_path / 'cache'))
+    first = compare_io.load_normalized_cached(str(path), disk_cache)
+    monkeypatch.setattr(compare_io, 'load_normalized', None)
+    cached = compare_io.load_normalized_cached(str(path), disk_cache)
+    pd.testing.assert_frame_equal(cached.drop(columns='型号'), first.drop(columns='型号'), check_dtype=False)
+    assert cached['型号'].tolist() == first['型号'].astype(str).tolist()
+    assert len(disk_cache.entries()) == 1
+    # 按表头名称读取（表头映射方案）时另建条目
+    monkeypatch.undo()
+    compare_io.load_normalized_cached(str(path), disk_cache, mapping=ColumnMapping())
+    assert len(disk_cache.entries()) == 2
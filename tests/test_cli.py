@@ -0,0 +1,45 @@
+import pandas as pd
+import pytest
+
+from compare_engine import FIXED_COLUMNS, STATUS_COLUMN
+from excel_compare import main
+
+
+@pytest.fixture
+def workbooks(tmp_path):
+    df1 = pd.DataFrame([['A1', 'M1', 'X', 'S', 2], ['A2', 'M1', 'Y', 'S', 3]], columns=FIXED_COLUMNS)
+    df2 = pd.DataFrame([['A1', 'M2', 'X', 'S', 2], ['A3', 'M1', 'Z', 'S', 3]], columns=FIXED_COLUMNS)
+    paths = [str(tmp_path / 'file1.xlsx'), str(tmp_path / 'file2.xlsx')]
+    df1.to_excel(paths[0], index=False)
+    df2.to_excel(paths[1], index=False)
+    return paths
+
+
+def test_success_writes_report(tmp_path, workbooks, capsys):
+    output = str(tmp_path / 'report.csv')
+    assert main(workbooks + ['-o', output, '--perf-log', '']) == 0
+    assert '字段差异: 1' in capsys.readouterr().out
+    report = pd.read_csv(output, encoding='utf-8-sig')
+    assert sorted(report[STATUS_COLUMN]) == ['仅文件1有', '仅文件2有', '字段差异']
+
+
+def test_unreadable_input_returns_1(tmp_path, workbooks, capsys):
+    # 文件不存在、列数不足都按处理文件出错返回 1，不输出报告
+    output = tmp_path / 'report.xlsx'
+    assert main([workbooks[0], str(tmp_path / 'missing.xlsx'), '-o', str(output), '--perf-log', '']) == 1
+    pd.DataFrame([['A1', 'M1']], columns=['替代料', '机型']).to_excel(tmp_path / 'narrow.xlsx', index=False)
+    assert main([workbooks[0], str(tmp_path / 'narrow.xlsx'), '-o', str(output), '--perf-log', '']) == 1
+    assert capsys.readouterr().err.count('❌') == 2
+    assert not output.exists()
+
+
+@pytest.mark.parametrize('options', [
+    ['--engine', 'sqlite', '--fuzzy'],
+    ['--all-sheets', '--low-memory'],
+    ['--type-aware', '--abs-tol', '-1'],
+    ['-k', '不存在的字段'],
+])
+def test_invalid_options_exit_with_usage_error(tmp_path, workbooks, options):
+    with pytest.raises(SystemExit) as exc:
+        main(workbooks + ['-o', str(tmp_path / 'report.xlsx')] + options)
+    assert exc.value.code == 2
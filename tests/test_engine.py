@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from compare_engine import (
+    DIFF_FIELDS_COLUMN, DUPLICATE_FIRST, DUPLICATE_OCCURRENCE, FIXED_COLUMNS, KEY_MODE_HASH, KEY_MODE_TUPLE,
+    MATCH_COLUMN, STATUS_COLUMN, STATUS_DIFF, Tolerance, add_key_column, align_frames, build_key,
+    classify_aligned, compare
+)
+
+
+def frame(rows):
+    if isinstance(rows, dict):
+        return pd.DataFrame(rows)[FIXED_COLUMNS]
+    return pd.DataFrame(rows, columns=FIXED_COLUMNS)
+
+
+def loop_compare(df1, df2, key_columns):
+    """原先逐键扫描的对比方式：重复键取首条，字段按 str(v) 比较，返回 {匹配字段: (对比状态, 差异字段)}"""
+    def rows_by_key(df):
+        rows = {}
+        for _, row in df.iterrows():
+            rows.setdefault('｜'.join(str(row[col]) for col in key_columns), row)
+        return rows
+
+    rows1, rows2 = rows_by_key(df1), rows_by_key(df2)
+    expected = {}
+    for key in list(rows1) + [key for key in rows2 if key not in rows1]:
+        if key not in rows2:
+            expected[key] = ('仅文件1有', '')
+        elif key not in rows1:
+            expected[key] = ('仅文件2有', '')
+        else:
+            fields = [col for col in FIXED_COLUMNS
+                      if col not in key_columns and str(rows1[key][col]) != str(rows2[key][col])]
+            expected[key] = (STATUS_DIFF if fields else '数据一致', '、'.join(fields))
+    return expected
+
+
+@pytest.mark.parametrize('duplicate_mode', [DUPLICATE_FIRST, DUPLICATE_OCCURRENCE])
+@pytest.mark.parametrize('tolerance', [None, Tolerance()])
+def test_one_sided_rows_keep_int_values(duplicate_mode, tolerance):
+    # 两侧都有只在本侧出现的键，外连接会给整数列填空值
+    df1 = frame([['A', 'M1', 'X', 'S', 2], ['A', 'M1', 'Y', 'S', 3]])
+    df2 = frame([['A', 'M2', 'X', 'S', 2], ['A', 'M1', 'Z', 'S', 4]])
+    result = compare(df1, df2, ['型号'], duplicate_mode=duplicate_mode, tolerance=tolerance)
+    df = result.comparison_df.set_index(MATCH_COLUMN)
+    assert df.loc['X', STATUS_COLUMN] == STATUS_DIFF
+    assert df.loc['X', DIFF_FIELDS_COLUMN] == '机型'
+    assert result.diff_counts['用量'] == 0
+    assert df.loc['X', '文件1_用量'] == 2 and str(df.loc['X', '文件2_用量']) == '2'
+    assert str(df.loc['Y', '文件1_用量']) == '3' and str(df.loc['Z', '文件2_用量']) == '4'
+
+
+def test_one_sided_rows_only_in_file1():
+    # 只有文件1有多出的行时，文件2一侧的整数列不能变成浮点数
+    df1 = frame([['A', 'M1', 'X', 'S', 2], ['A', 'M1', 'Y', 'S', 3]])
+    df2 = frame([['A', 'M2', 'X', 'S', 2]])
+    result = compare(df1, df2, ['型号'])
+    row = result.comparison_df.set_index(MATCH_COLUMN).loc['X']
+    assert row[DIFF_FIELDS_COLUMN] == '机型'
+    assert str(row['文件2_用量']) == '2'
+
+
+def test_matches_row_loop():
+    df1 = frame([['A', 'M1', 'X', 'S', 2], ['A', 'M1', 'Y', 'S', 3], ['B', 'M1', 'W', 'S', True],
+                 ['A', 'M1', 'X', 'S', 9]])
+    df2 = frame([['A', 'M2', 'X', 'S', 2], ['A', 'M1', 'Z', 'S', 4], ['B', 'M1', 'W', 'T', 1]])
+    result = compare(df1, df2, ['型号'])
+    actual = {row[MATCH_COLUMN]: (row[STATUS_COLUMN], row[DIFF_FIELDS_COLUMN])
+              for _, row in result.comparison_df.iterrows()}
+    assert actual == loop_compare(df1, df2, ['型号'])
+
+
+@pytest.mark.parametrize('values1, values2', [
+    ([1, 'a'], [1.0, 'a']),
+    ([True, 'a'], [1, 'a']),
+    ([1, 'a'], [1.0, 'b']),
+    ([0, None], [False, None]),
+])
+def test_equal_values_with_different_text_are_diffs(values1, values2):
+    df1 = frame([['A', 'M1', 'X', 'S', values1[0]], ['A', 'M1', 'Y', 'S', values1[1]]])
+    df2 = frame([['A', 'M1', 'X', 'S', values2[0]], ['A', 'M1', 'Y', 'S', values2[1]]])
+    result = compare(df1, df2, ['型号'])
+    row = result.comparison_df.set_index(MATCH_COLUMN).loc['X']
+    assert row[STATUS_COLUMN] == STATUS_DIFF
+    assert row[DIFF_FIELDS_COLUMN] == '用量'
+
+
+@pytest.mark.parametrize('seed', range(20))
+@pytest.mark.parametrize('tolerance', [None, Tolerance()])
+def test_fast_path_matches_field_comparison(seed, tolerance):
+    # 整行哈希筛选（默认）与所有行都逐字段比较的结果必须一致
+    rng = np.random.default_rng(seed)
+    pool = np.array([1, 1.0, True, 0, False, '1', ' 1', None, np.nan, ''], dtype=object)
+
+    def random_frame(size):
+        # 只有两个字段取随机值，值相等但类型不同的行才容易整行哈希相同
+        df = frame({col: np.full(size, 'A', dtype=object) for col in FIXED_COLUMNS})
+        df['型号'] = rng.integers(0, 40, size).astype(str)
+        df['用量'] = rng.choice(pool, size)
+        df['机型'] = rng.choice(pool[:3], size)
+        return add_key_column(df, ['型号'])
+
+    aligned = align_frames(random_frame(60), random_frame(60))
+    fast = classify_aligned(aligned, ['型号'], tolerance=tolerance)
+    slow = classify_aligned(aligned, ['型号'], candidates=np.ones(len(aligned.merged), dtype=bool),
+                            tolerance=tolerance)
+    pd.testing.assert_frame_equal(fast.comparison_df, slow.comparison_df)
+    pd.testing.assert_frame_equal(fast.diff_mask, slow.diff_mask)
+
+
+@pytest.mark.parametrize('key_mode', [KEY_MODE_TUPLE, KEY_MODE_HASH])
+@pytest.mark.parametrize('duplicate_mode', [DUPLICATE_FIRST, DUPLICATE_OCCURRENCE])
+def test_key_modes_match_text_keys(key_mode, duplicate_mode):
+    # 元组键、哈希键与拼接字符串键分组相同，对比结果（不计行的先后顺序）一致；含空值、重复键和复合键
+    rng = np.random.default_rng(0)
+
+    def random_frame(size):
+        df = frame({col: rng.choice(['A', 'B', 'C'], size).astype(object) for col in FIXED_COLUMNS})
+        df['替代料'] = rng.choice(np.array(['P1', 'P2', 'P3', None, 'P1｜S'], dtype=object), size)
+        df['机型'] = rng.choice(np.array(['M1', 'M2', None], dtype=object), size)
+        return df
+
+    df1, df2 = random_frame(80), random_frame(80)
+    key_columns = ['替代料', '机型']
+    text_keys = build_key(df1, key_columns)
+    assert (pd.factorize(build_key(df1, key_columns, key_mode))[0] == pd.factorize(text_keys)[0]).all()
+
+    def sorted_rows(result):
+        return result.comparison_df.sort_values(list(result.comparison_df.columns)).reset_index(drop=True)
+
+    expected = compare(df1, df2, key_columns, duplicate_mode=duplicate_mode)
+    result = compare(df1, df2, key_columns, key_mode, duplicate_mode)
+    pd.testing.assert_frame_equal(sorted_rows(result), sorted_rows(expected))
+    assert result.status_counts == expected.status_counts
+    assert result.diff_counts == expected.diff_counts
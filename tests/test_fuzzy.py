@@ -0,0 +1,108 @@
+import random
+
+import pandas as pd
+import pytest
+
+from compare_engine import FIXED_COLUMNS, MATCH_COLUMN, STATUS_COLUMN, STATUS_FUZZY, STATUS_SAME
+from compare_fuzzy import _ngrams, compare_fuzzy, match_keys
+
+
+def frame(rows):
+    return pd.DataFrame(rows, columns=FIXED_COLUMNS)
+
+
+def brute_force_match(keys1, keys2, threshold):
+    """逐对计算 Dice 系数，按与 match_keys 相同的顺序（得分降序、键序号升序）贪心配对"""
+    scored = []
+    for i, key1 in enumerate(keys1):
+        for j, key2 in enumerate(keys2):
+            grams1, grams2 = _ngrams(key1), _ngrams(key2)
+            total = len(grams1) + len(grams2)
+            score = 2 * len(grams1 & grams2) / max(total, 1)
+            if score >= threshold:
+                scored.append((-score, i, j))
+    used1, used2, pairs = set(), set(), []
+    for negative_score, i, j in sorted(scored):
+        if i in used1 or j in used2:
+            continue
+        used1.add(i)
+        used2.add(j)
+        pairs.append((keys1[i], keys2[j], -negative_score))
+    return pairs
+
+
+def test_match_keys_pruned_to_no_candidates():
+    pairs = match_keys(['cbc-baea', 'aced--a'], ['abb--ddac', 'cbcccace'], 0.5)
+    assert pairs.empty
+    assert list(pairs.columns) == ['key1', 'key2', 'score']
+
+
+def test_compare_fuzzy_pruned_to_no_candidates():
+    df1 = frame([['A', 'M1', 'cbc-baea', 'S', 1], ['A', 'M1', 'aced--a', 'S', 1]])
+    df2 = frame([['A', 'M1', 'abb--ddac', 'S', 1], ['A', 'M1', 'cbcccace', 'S', 1]])
+    result = compare_fuzzy(df1, df2, ['型号'], threshold=0.5)
+    assert result.status_counts[STATUS_FUZZY] == 0
+    assert result.status_counts['仅文件1有'] == 2
+    assert result.status_counts['仅文件2有'] == 2
+
+
+@pytest.mark.parametrize('seed', range(30))
+@pytest.mark.parametrize('threshold', [0.3, 0.5, 0.8])
+def test_match_keys_agrees_with_brute_force(seed, threshold):
+    rng = random.Random(seed)
+
+    def random_key():
+        return ''.join(rng.choice('abcd-') for _ in range(rng.randint(0, 9)))
+
+    keys1 = list(dict.fromkeys(random_key() for _ in range(rng.randint(1, 12))))
+    keys2 = list(dict.fromkeys(random_key() for _ in range(rng.randint(1, 12))))
+    pairs = match_keys(keys1, keys2, threshold)
+    assert list(pairs.itertuples(index=False, name=None)) == brute_force_match(keys1, keys2, threshold)
+
+
+def test_exact_int_key_is_not_fuzzy():
+    # 文件1多出一行，外连接后整数键列会带空位
+    df1 = frame([['A', 'M1', 101, 'S', 2], ['A', 'M1', 102, 'S', 2]])
+    df2 = frame([['A', 'M1', 101, 'S', 2]])
+    result = compare_fuzzy(df1, df2, ['型号'])
+    df = result.comparison_df
+    matched = df[df[MATCH_COLUMN] == '101']
+    assert len(matched) == 1
+    assert matched[STATUS_COLUMN].iloc[0] == STATUS_SAME
+    assert result.status_counts[STATUS_FUZZY] == 0
+    assert sorted(df[MATCH_COLUMN]) == ['101', '102']
+
+
+def test_fuzzy_pair_shows_raw_keys():
+    df1 = frame([['A', 'M1', 'ABC-1234', 'S', 2], ['A', 'M1', 'XYZ', 'S', 2]])
+    df2 = frame([['A', 'M1', 'ＡＢＣ 1234', 'S', 2], ['A', 'M1', 'QQQ', 'S', 2]])
+    result = compare_fuzzy(df1, df2, ['型号'], threshold=0.5)
+    df = result.comparison_df
+    fuzzy = df[df[STATUS_COLUMN] == STATUS_FUZZY]
+    assert list(fuzzy[MATCH_COLUMN]) == ['ABC-1234']
+    assert set(df[MATCH_COLUMN]) == {'ABC-1234', 'XYZ', 'QQQ'}
+
+
+def test_variants_normalising_to_one_key_are_kept():
+    # 文件2中 'abc1' 与 'ABC 1' 规范化后相同：与文件1原始键相同的一条配对，另一条作为仅文件2有列出，不会被丢弃
+    df1 = frame([['A', 'M1', 'abc1', 'S', 1], ['A', 'M1', 'XYZ', 'S', 1]])
+    df2 = frame([['A', 'M1', 'ABC 1', 'S', 2], ['A', 'M1', 'abc1', 'S', 1], ['A', 'M1', 'ABC 1', 'S', 3],
+                 ['A', 'M1', 'XYZ', 'S', 1]])
+    result = compare_fuzzy(df1, df2, ['型号'])
+    df = result.comparison_df.set_index(MATCH_COLUMN)
+    assert sorted(df.index) == ['ABC 1', 'XYZ', 'abc1']
+    assert df.loc['abc1', STATUS_COLUMN] == STATUS_SAME
+    assert df.loc['ABC 1', STATUS_COLUMN] == '仅文件2有'
+    assert df.loc['ABC 1', '文件2_用量'] == 2
+    assert result.status_counts[STATUS_FUZZY] == 0
+
+
+def test_variants_pair_with_the_same_raw_key():
+    # 两个文件中都有两种写法时，各自按原始键配对
+    df1 = frame([['A', 'M1', 'ABC 1', 'S', 1], ['A', 'M1', 'abc1', 'S', 1]])
+    df2 = frame([['A', 'M1', 'abc1', 'S', 1], ['A', 'M1', 'ABC 1', 'S', 5]])
+    result = compare_fuzzy(df1, df2, ['型号'])
+    df = result.comparison_df.set_index(MATCH_COLUMN)
+    assert sorted(df.index) == ['ABC 1', 'abc1']
+    assert df.loc['abc1', STATUS_COLUMN] == STATUS_SAME
+    assert df.loc['ABC 1', '差异字段'] == '用量'
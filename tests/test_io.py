@@ -0,0 +1,92 @@
+import numpy as np
+import openpyxl
+import pandas as pd
+import pytest
+
+import compare_io
+from compare_engine import DUPLICATE_FIRST, DUPLICATE_OCCURRENCE, FIXED_COLUMNS, KEY_MODES, compare
+from compare_io import InputFormatError, frame_memory_mb, load_normalized, optimize_memory
+
+
+def write_sheet(path, rows, start_row=1):
+    workbook = openpyxl.Workbook()
+    worksheet = workbook.active
+    for offset, row in enumerate(rows):
+        for column, value in enumerate(row, start=1):
+            if value is not None:
+                worksheet.cell(start_row + offset, column, value)
+    workbook.save(path)
+    return path
+
+
+ROWS = [FIXED_COLUMNS, ['A1', 'M1', 'X', 'S', 2], [None] * 5, ['A2', 'M2', 'Y', 'S', 2.5], ['A3', None, 7, 'S', 1]]
+
+
+@pytest.fixture(params=['fast', 'public', 'pandas'])
+def reader(request, monkeypatch):
+    # public：openpyxl 内部接口不可用时的公开接口读取；pandas：xls 使用的 read_excel 读取
+    if request.param == 'public':
+        monkeypatch.setattr(compare_io, 'WorkSheetParser', None)
+    if request.param == 'pandas':
+        monkeypatch.setattr(compare_io, 'is_xlsx', lambda head: False)
+    return request.param
+
+
+def test_matches_read_excel(tmp_path, reader):
+    path = write_sheet(tmp_path / 'a.xlsx', ROWS)
+    expected = pd.read_excel(path, usecols=range(5))
+    pd.testing.assert_frame_equal(load_normalized(path), expected, check_dtype=False)
+
+
+@pytest.mark.parametrize('start_row', [2, 4])
+def test_skips_leading_blank_rows(tmp_path, reader, start_row):
+    path = write_sheet(tmp_path / 'a.xlsx', ROWS, start_row=start_row)
+    expected = pd.read_excel(write_sheet(tmp_path / 'b.xlsx', ROWS), usecols=range(5))
+    pd.testing.assert_frame_equal(load_normalized(path), expected, check_dtype=False)
+
+
+def test_too_few_columns_still_fails(tmp_path, reader):
+    path = write_sheet(tmp_path / 'a.xlsx', [['替代料', '机型'], ['A1', 'M1']])
+    with pytest.raises(InputFormatError):
+        load_normalized(path)
+
+
+def test_falls_back_when_openpyxl_internals_change(tmp_path, monkeypatch):
+    def broken_parser(*args, **kwargs):
+        raise TypeError('unexpected keyword argument')
+
+    monkeypatch.setattr(compare_io, 'WorkSheetParser', broken_parser)
+    path = write_sheet(tmp_path / 'a.xlsx', ROWS)
+    expected = pd.read_excel(path, usecols=range(5))
+    # 改用 openpyxl 公开接口读取一遍，不再用 read_excel 反复读取
+    monkeypatch.setattr(compare_io.pd, 'read_excel', None)
+    with open(path, 'rb') as f:
+        pd.testing.assert_frame_equal(load_normalized(f), expected, check_dtype=False)
+        pd.testing.assert_frame_equal(load_normalized(f, nrows=1), expected.head(1), check_dtype=False)
+
+
+@pytest.mark.parametrize('key_mode', KEY_MODES)
+@pytest.mark.parametrize('duplicate_mode', [DUPLICATE_FIRST, DUPLICATE_OCCURRENCE])
+def test_optimize_memory_keeps_comparison(key_mode, duplicate_mode):
+    # 转为分类类型、紧凑字符串后对比结果不变（含空值、重复键、只在一个文件中出现的分类值、数值列）
+    rng = np.random.default_rng(0)
+
+    def random_frame(size, models):
+        return pd.DataFrame({
+            '替代料': [f'P{i}' for i in rng.integers(0, size // 4, size)],
+            '机型': rng.choice(np.array(models + [None], dtype=object), size),
+            '型号': [f'型号{i}' for i in rng.integers(0, 10 ** 6, size)],
+            '规格型号': rng.choice(['S1', 'S2'], size),
+            '用量': rng.integers(1, 4, size)
+        })
+
+    df1, df2 = random_frame(400, ['M1', 'M2']), random_frame(400, ['M2', 'M3'])
+    compact1, compact2 = optimize_memory(df1, df2)
+    assert isinstance(compact1['替代料'].dtype, pd.CategoricalDtype)
+    assert not isinstance(compact1['型号'].dtype, pd.CategoricalDtype)
+    assert frame_memory_mb(compact1, compact2) < frame_memory_mb(df1, df2)
+    for key_columns in (['替代料'], ['替代料', '机型']):
+        expected = compare(df1, df2, key_columns, key_mode, duplicate_mode)
+        result = compare(compact1, compact2, key_columns, key_mode, duplicate_mode)
+        pd.testing.assert_frame_equal(result.comparison_df, expected.comparison_df, check_dtype=False)
+        pd.testing.assert_frame_equal(result.diff_mask, expected.diff_mask)
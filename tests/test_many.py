@@ -0,0 +1,41 @@
+import pandas as pd
+import pytest
+
+from compare_engine import FIXED_COLUMNS, KEY_MODE_HASH, KEY_MODE_TEXT, MATCH_COLUMN
+from compare_many import compare_many
+from compare_report import MATRIX_SHEET
+
+
+def write(path, rows, columns=FIXED_COLUMNS):
+    pd.DataFrame(rows, columns=columns).to_excel(path, index=False)
+    return str(path)
+
+
+@pytest.mark.parametrize('key_mode', [KEY_MODE_TEXT, KEY_MODE_HASH])
+def test_key_matrix(tmp_path, key_mode):
+    # 每个键在每个候选文件中是一致、差异、缺失还是新增；出错的候选文件不进入矩阵
+    baseline = write(tmp_path / '主BOM.xlsx', [
+        ['A1', 'M1', 'X', 'S', 1], ['A2', 'M1', 'Y', 'S', 2], ['A3', 'M1', 'Z', 'S', 3]
+    ])
+    candidates = [
+        write(tmp_path / '供应商A.xlsx', [['A1', 'M1', 'X', 'S', 1], ['A2', 'M1', 'Y', 'S', 5],
+                                        ['A4', 'M1', 'W', 'S', 4]]),
+        write(tmp_path / '供应商B.xlsx', [['A3', 'M1', 'Z', 'S', 3], ['A1', 'M2', 'X', 'S', 1],
+                                        ['A2', 'M1', 'Y', 'S', 2], ['A5', 'M1', 'V', 'S', 5]]),
+        write(tmp_path / '损坏.xlsx', [['A1', 'M1']], columns=['替代料', '机型'])
+    ]
+    result = compare_many(baseline, candidates, str(tmp_path / 'out'), ['替代料'], key_mode, max_workers=2)
+
+    assert list(result.errors) == ['损坏']
+    matrix = result.matrix_df.set_index(MATCH_COLUMN)
+    assert list(matrix.index) == ['A1', 'A2', 'A3', 'A4', 'A5']
+    assert matrix['供应商A'].fillna('').tolist() == ['一致', '差异', '缺失', '新增', '']
+    assert matrix['供应商B'].fillna('').tolist() == ['差异', '一致', '一致', '', '新增']
+    assert '损坏' not in matrix.columns
+    assert matrix['差异文件数'].tolist() == [1, 1, 0, 0, 0]
+    assert matrix['缺失文件数'].tolist() == [0, 0, 1, 0, 0]
+    assert matrix['新增文件数'].tolist() == [0, 0, 0, 1, 1]
+
+    written = pd.read_excel(result.matrix_path, sheet_name=MATRIX_SHEET).set_index(MATCH_COLUMN)
+    assert written['供应商A'].fillna('').tolist() == ['一致', '差异', '缺失', '新增', '']
+    assert [candidate.status_counts['字段差异'] for candidate in result.candidates[:2]] == [1, 1]
@@ -0,0 +1,85 @@
+import gzip
+
+import pandas as pd
+import pytest
+
+import compare_memory
+import compare_service
+import excel_compare
+from compare_engine import DUPLICATE_FIRST, FIXED_COLUMNS, KEY_MODE_TEXT
+from compare_memory import (
+    MEMORY_PLAN_IN_MEMORY, MEMORY_PLAN_LOW_MEMORY, MEMORY_PLAN_OUT_OF_CORE, FootprintEstimate, FrameEstimate,
+    MemoryBudgetError, estimate_frame, plan_memory
+)
+
+XLS_DATA = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1' + b'\x00' * 1024
+
+
+@pytest.fixture
+def sample():
+    return pd.DataFrame([['A1', 'M1', 'X', 'S', '2'], ['A2', 'M1', 'Y', 'S', '3']], columns=FIXED_COLUMNS)
+
+
+@pytest.fixture
+def xls_estimate(monkeypatch, sample):
+    """按 xls 文件内容预估（抽样读取替换为固定数据，不需要 xlrd）"""
+    monkeypatch.setattr(compare_memory, 'load_normalized', lambda *args, **kwargs: sample)
+    estimate = estimate_frame(XLS_DATA)
+    return FootprintEstimate(estimate, estimate)
+
+
+def test_estimate_marks_formats_for_out_of_core(tmp_path, sample, xls_estimate):
+    sample.to_excel(tmp_path / 'bom.xlsx', index=False)
+    sample.to_csv(tmp_path / 'bom.csv', index=False)
+    assert estimate_frame(str(tmp_path / 'bom.xlsx')).out_of_core
+    assert estimate_frame(str(tmp_path / 'bom.csv')).out_of_core
+    assert not xls_estimate.out_of_core
+
+
+def test_xls_over_budget_is_not_sent_to_disk_comparison(xls_estimate):
+    with pytest.raises(MemoryBudgetError, match='xls'):
+        plan_memory(xls_estimate, budget_mb=1e-9, out_of_core=True)
+    xlsx_estimate = FootprintEstimate(FrameEstimate(10, 100, 1), FrameEstimate(10, 100, 1))
+    assert plan_memory(xlsx_estimate, budget_mb=1e-9, out_of_core=True) == MEMORY_PLAN_OUT_OF_CORE
+
+
+def test_cli_and_service_refuse_xls_over_budget(tmp_path, monkeypatch, xls_estimate):
+    # 命令行和服务都按预估结果中的格式判断，不把 xls 交给磁盘对比
+    monkeypatch.setattr(excel_compare, 'estimate_footprint', lambda *args: xls_estimate)
+    monkeypatch.setattr(compare_service, 'estimate_footprint', lambda *args: xls_estimate)
+    monkeypatch.setattr(compare_service, 'plan_memory',
+                        lambda estimate, out_of_core: plan_memory(estimate, 1e-9, out_of_core=out_of_core))
+    with pytest.raises(MemoryBudgetError, match='xls'):
+        excel_compare.run_compare(XLS_DATA, XLS_DATA, ['替代料'], str(tmp_path / 'report.xlsx'),
+                                  memory_budget_mb=1e-9)
+    with pytest.raises(MemoryBudgetError, match='xls'):
+        compare_service.run_job(str(tmp_path), XLS_DATA, XLS_DATA, ['替代料'], KEY_MODE_TEXT, DUPLICATE_FIRST, False)
+
+
+def test_plan_memory_chooses_each_mode():
+    # 两个文件各 1024 行 × 1024 字节：数据表共 2 MB，全部在内存中约 46 MB，低内存方式约 24 MB
+    estimate = FootprintEstimate(FrameEstimate(1024, 1024, 1), FrameEstimate(1024, 1024, 1))
+    assert (estimate.in_memory_mb, estimate.low_memory_mb) == (46, 24)
+    assert plan_memory(estimate, 50) == MEMORY_PLAN_IN_MEMORY
+    assert plan_memory(estimate, 30) == MEMORY_PLAN_LOW_MEMORY
+    assert plan_memory(estimate, 50, low_memory=True) == MEMORY_PLAN_LOW_MEMORY
+    assert plan_memory(estimate, 10, out_of_core=True) == MEMORY_PLAN_OUT_OF_CORE
+    with pytest.raises(MemoryBudgetError, match='2048 行'):
+        plan_memory(estimate, 10)
+    assert plan_memory(estimate, 0) == MEMORY_PLAN_IN_MEMORY
+
+
+@pytest.mark.parametrize('file_format', ['xlsx', 'csv', 'csv.gz'])
+def test_estimate_counts_rows_without_parsing(tmp_path, monkeypatch, file_format):
+    # 只解析前 SAMPLE_ROWS 行，行数按 dimension 标记或换行符得到
+    monkeypatch.setattr(compare_memory, 'SAMPLE_ROWS', 10)
+    df = pd.DataFrame([[f'A{i}', 'M1', 'X', 'S', i] for i in range(250)], columns=FIXED_COLUMNS)
+    path = tmp_path / f'bom.{file_format}'
+    if file_format == 'xlsx':
+        df.to_excel(path, index=False)
+    else:
+        with (gzip.open if file_format.endswith('.gz') else open)(path, 'wt', encoding='utf-8') as f:
+            df.to_csv(f, index=False)
+    estimate = estimate_frame(str(path))
+    assert estimate.rows == 250
+    assert estimate.bytes_per_row > 0 and estimate.out_of_core
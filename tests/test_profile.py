@@ -0,0 +1,49 @@
+import json
+
+import pandas as pd
+
+from compare_engine import FIXED_COLUMNS, compare
+from compare_profile import StageProfiler, profile_stage, write_perf_log
+
+
+def test_compare_records_each_stage():
+    df = pd.DataFrame([['A1', 'M1', 'X', 'S', 2], ['A2', 'M1', 'Y', 'S', 3]], columns=FIXED_COLUMNS)
+    profiler = StageProfiler()
+    compare(df, df.iloc[:1], ['替代料'], profiler=profiler)
+    stages = profiler.to_dict()['stages']
+    assert [record['stage'] for record in stages] == ['key_build', 'merge', 'classify']
+    assert [record['rows'] for record in stages] == [3, 2, 2]
+    for record in stages:
+        assert record['wall_seconds'] >= 0 and record['cpu_seconds'] >= 0
+        assert record['peak_rss_mb'] is None or record['peak_rss_mb'] > 0
+    assert [row['阶段'] for row in profiler.table()] == ['构建键', '合并', '分类']
+
+
+def test_stage_rows_and_copies_are_independent():
+    profiler = StageProfiler()
+    with profiler.stage('read') as stage:
+        stage['rows'] = 10
+    copy = profiler.copy()
+    with copy.stage('report_write', 5):
+        pass
+    assert [record['stage'] for record in profiler.stages] == ['read']
+    assert [(record['stage'], record['rows']) for record in copy.stages] == [('read', 10), ('report_write', 5)]
+    with profile_stage(None, 'read') as stage:
+        stage['rows'] = 1
+
+
+def test_write_perf_log_appends_json_lines(tmp_path):
+    profiler = StageProfiler()
+    with profiler.stage('read', 4):
+        pass
+    path = tmp_path / 'logs' / 'perf.log'
+    write_perf_log(profiler, str(path), mode='cli', key_columns=['替代料'])
+    record = write_perf_log(profiler, str(path), mode='service')
+    lines = [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+    assert [line['mode'] for line in lines] == ['cli', 'service']
+    assert lines[0]['key_columns'] == ['替代料']
+    assert lines[1] == record
+    assert lines[1]['stages'][0]['rows'] == 4
+    assert lines[1]['wall_seconds'] == profiler.to_dict()['wall_seconds']
+    # 路径为空时只返回记录，不写文件
+    assert write_perf_log(profiler, '', mode='cli')['mode'] == 'cli'
@@ -0,0 +1,102 @@
+import os
+
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+
+from compare_engine import FIXED_COLUMNS, MATCH_COLUMN, REPORT_COLUMNS, STATUS_COLUMN, compare
+from compare_report import (
+    COMPARE_SHEET, REPORT_FORMAT_CSV, REPORT_FORMAT_HTML, REPORT_FORMAT_PARQUET, REPORT_FORMAT_XLSX,
+    SUMMARY_SHEET, ReportTooLargeError, available_report_formats, check_row_count, write_html_rows,
+    write_result_report, write_result_report_tempfile
+)
+
+
+@pytest.fixture
+def result():
+    # 一侧独有的行 + 整数列 + 1 与 1.0
+    df1 = pd.DataFrame([['A1', 'M1', 'X', 'S', 2], ['A2', 'M1', 'Y', 'S', 1], ['A3', 'M1', 'Z', 'S', 3]],
+                       columns=FIXED_COLUMNS)
+    df2 = pd.DataFrame([['A1', 'M2', 'X', 'S', 2], ['A2', 'M1', 'Y', 'S', 1.0], ['A4', 'M1', 'W', 'S', 4]],
+                       columns=FIXED_COLUMNS, dtype=object)
+    return compare(df1, df2, ['替代料'])
+
+
+def read_back(path, report_format):
+    if report_format == REPORT_FORMAT_CSV:
+        return pd.read_csv(path, encoding='utf-8-sig', dtype=str, keep_default_na=False)
+    if report_format == REPORT_FORMAT_PARQUET:
+        return pd.read_parquet(path).astype(str)
+    return pd.read_excel(path, sheet_name=COMPARE_SHEET, dtype=str, keep_default_na=False)
+
+
+@pytest.mark.parametrize('report_format, low_memory', [
+    (REPORT_FORMAT_XLSX, False), (REPORT_FORMAT_XLSX, True), (REPORT_FORMAT_CSV, False),
+    (REPORT_FORMAT_PARQUET, False)
+])
+def test_report_rows_match_comparison(tmp_path, result, report_format, low_memory):
+    if report_format not in available_report_formats():
+        pytest.skip('未安装 pyarrow')
+    path = str(tmp_path / f'report.{report_format}')
+    write_result_report(result, path, report_format, low_memory)
+    report = read_back(path, report_format).set_index(MATCH_COLUMN)
+    assert list(report.columns) == REPORT_COLUMNS[1:]
+    assert report.loc['A1', STATUS_COLUMN] == '字段差异'
+    assert report.loc['A1', '差异字段'] == '机型'
+    # 整数列不会因为一侧独有的行被写成 2.0；1 与 1.0 仍按文本比较为差异
+    assert report.loc['A1', '文件1_用量'] == '2' and report.loc['A1', '文件2_用量'] == '2'
+    assert report.loc['A2', '差异字段'] == '用量'
+    assert report.loc['A3', STATUS_COLUMN] == '仅文件1有'
+    assert report.loc['A4', STATUS_COLUMN] == '仅文件2有'
+
+
+
+def conditional_rules(path):
+    worksheet = load_workbook(path)[COMPARE_SHEET]
+    return sorted((str(cf.sqref), rule.formula[0]) for cf in worksheet.conditional_formatting for rule in cf.rules)
+
+
+def test_xlsx_writers_use_the_same_conditional_formats(tmp_path, result):
+    # 两种写法的颜色都由条件格式决定：行颜色按对比状态，值不同的单元格按差异字段
+    paths = [str(tmp_path / 'report.xlsx'), str(tmp_path / 'streaming.xlsx')]
+    write_result_report(result, paths[0], REPORT_FORMAT_XLSX, False)
+    write_result_report(result, paths[1], REPORT_FORMAT_XLSX, True)
+    rules = conditional_rules(paths[0])
+    assert rules == conditional_rules(paths[1])
+    assert ('C2:C5 H2:H5', 'ISNUMBER(SEARCH("、机型、","、"&$M2&"、"))') in rules
+    assert ('A2:M5', '$L2="仅文件1有"') in rules
+
+
+def test_xlsx_summary_sheet(tmp_path, result):
+    path = str(tmp_path / 'report.xlsx')
+    write_result_report(result, path)
+    summary = pd.read_excel(path, sheet_name=SUMMARY_SHEET).set_index('对比状态')['数量']
+    assert summary['数据一致'] == 0
+    assert summary['字段差异'] == 2
+    assert summary['仅文件1有'] == 1 and summary['仅文件2有'] == 1
+    assert summary['字段差异：用量'] == 1 and summary['字段差异：机型'] == 1
+
+
+def test_html_report_marks_diff_cells(tmp_path, result):
+    path = str(tmp_path / 'report.html')
+    write_result_report(result, path, REPORT_FORMAT_HTML)
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    assert '<td class="diff">M1</td>' in text and '<td class="diff">M2</td>' in text
+    with pytest.raises(ReportTooLargeError):
+        write_html_rows(str(tmp_path / 'big.html'), REPORT_COLUMNS, iter(()), 10 ** 6, [], pd.DataFrame())
+
+
+def test_xlsx_row_limit():
+    check_row_count(1048575)
+    with pytest.raises(ReportTooLargeError):
+        check_row_count(1048576)
+
+
+def test_tempfile_removed(result):
+    report = write_result_report_tempfile(result, REPORT_FORMAT_CSV)
+    assert report.path.endswith('.csv') and report.size > 0
+    with report.open() as f:
+        assert '字段差异' in f.read().decode('utf-8-sig')
+    report.remove()
+    assert not os.path.exists(report.path)
@@ -0,0 +1,116 @@
+import os
+import time
+
+import pandas as pd
+import pytest
+
+from compare_engine import FIXED_COLUMNS
+from compare_service import JobManager, create_app
+
+
+@pytest.fixture
+def workbooks(tmp_path):
+    df1 = pd.DataFrame([['A1', 'M1', 'X', 'S', 2], ['A2', 'M1', 'Y', 'S', 3]], columns=FIXED_COLUMNS)
+    df2 = pd.DataFrame([['A1', 'M1', 'X', 'S', 5], ['A3', 'M1', 'Z', 'S', 3]], columns=FIXED_COLUMNS)
+    path1, path2 = tmp_path / 'a.xlsx', tmp_path / 'b.xlsx'
+    df1.to_excel(path1, index=False)
+    df2.to_excel(path2, index=False)
+    return path1, path2
+
+
+def make_client(tmp_path, monkeypatch, ttl=3600):
+    monkeypatch.setenv('EXCEL_COMPARE_PERF_LOG', str(tmp_path / 'perf.log'))
+    manager = JobManager(job_dir=str(tmp_path / 'jobs'), max_workers=1, max_queued=2, ttl=ttl)
+    app = create_app(manager)
+    app.config['TESTING'] = True
+    return app.test_client(), manager
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    client, manager = make_client(tmp_path, monkeypatch)
+    yield client
+    manager.shutdown()
+
+
+def submit(client, path1, path2, **form):
+    with open(path1, 'rb') as f1, open(path2, 'rb') as f2:
+        data = dict(form, file1=(f1, path1.name), file2=(f2, path2.name))
+        return client.post('/api/jobs', data=data, content_type='multipart/form-data')
+
+
+def wait(client, job_id, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        info = client.get(f'/api/jobs/{job_id}').get_json()
+        if info['status'] in ('finished', 'failed'):
+            return info
+        time.sleep(0.1)
+    raise AssertionError('任务超时')
+
+
+def test_submit_poll_and_download(service, workbooks):
+    response = submit(service, *workbooks, key_columns='替代料', report_format='csv')
+    assert response.status_code == 202
+    job_id = response.get_json()['job_id']
+
+    info = wait(service, job_id)
+    assert info['status'] == 'finished'
+    assert info['result']['status_counts'] == {'数据一致': 0, '仅文件1有': 1, '仅文件2有': 1, '字段差异': 1}
+
+    report = service.get(f'/api/jobs/{job_id}/report')
+    assert report.status_code == 200
+    assert 'attachment' in report.headers['Content-Disposition']
+    assert '字段差异' in report.data.decode('utf-8-sig')
+
+    assert service.delete(f'/api/jobs/{job_id}').status_code == 200
+    assert service.get(f'/api/jobs/{job_id}').status_code == 404
+
+
+def test_rejects_invalid_requests(service, workbooks):
+    with open(workbooks[0], 'rb') as f:
+        response = service.post('/api/jobs', data={'file1': (f, 'a.xlsx')}, content_type='multipart/form-data')
+    assert response.status_code == 400
+    assert submit(service, *workbooks, key_columns='不存在').status_code == 400
+    assert submit(service, *workbooks, report_format='doc').status_code == 400
+    assert service.get('/api/jobs/missing').status_code == 404
+    assert service.get('/api/jobs/missing/report').status_code == 404
+
+
+def test_failed_job_reports_error(service, workbooks, tmp_path):
+    broken = tmp_path / 'broken.xlsx'
+    broken.write_bytes(b'not a workbook')
+    job_id = submit(service, workbooks[0], broken).get_json()['job_id']
+    info = wait(service, job_id)
+    assert info['status'] == 'failed'
+    assert info['error']
+    assert service.get(f'/api/jobs/{job_id}/report').status_code == 409
+
+
+def test_finished_jobs_expire(tmp_path, monkeypatch, workbooks):
+    client, manager = make_client(tmp_path, monkeypatch, ttl=0)
+    try:
+        job_id = submit(client, *workbooks).get_json()['job_id']
+        future = manager.get(job_id).future
+        future.result(timeout=60)
+        # 完成回调在结果返回后才执行
+        deadline = time.time() + 5
+        while manager.get(job_id).finished is None and time.time() < deadline:
+            time.sleep(0.01)
+        job_dir = manager.get(job_id).job_dir
+        assert client.get(f'/api/jobs/{job_id}').status_code == 404
+        assert not os.path.exists(job_dir)
+    finally:
+        manager.shutdown()
+
+
+def test_apps_do_not_share_managers(tmp_path, monkeypatch):
+    client1, manager1 = make_client(tmp_path / 'one', monkeypatch)
+    client2, manager2 = make_client(tmp_path / 'two', monkeypatch)
+    try:
+        assert client1.application.config['JOB_MANAGER'] is manager1
+        assert client2.application.config['JOB_MANAGER'] is manager2
+        assert manager1._executor._mp_context.get_start_method() == 'spawn'
+    finally:
+        manager1.shutdown()
+        manager2.shutdown()
@@ -0,0 +1,43 @@
+import pandas as pd
+import pytest
+
+from benchmarks.bom_generator import generate_bom_pair, write_bom_pair
+from compare_engine import DUPLICATE_FIRST, DUPLICATE_OCCURRENCE, FIXED_COLUMNS, compare
+from compare_io import load_normalized
+from compare_sqlite import compare_sqlite
+
+
+@pytest.mark.parametrize('duplicate_mode', [DUPLICATE_FIRST, DUPLICATE_OCCURRENCE])
+def test_matches_memory_engine(tmp_path, duplicate_mode):
+    path1, path2 = write_bom_pair(str(tmp_path), 3000, seed=2)
+    key_columns = ['替代料', '机型']
+    memory = compare(load_normalized(path1), load_normalized(path2), key_columns, duplicate_mode=duplicate_mode)
+    with compare_sqlite(path1, path2, key_columns, duplicate_mode) as sqlite:
+        assert sqlite.status_counts == memory.status_counts
+        assert sqlite.diff_counts == memory.diff_counts
+
+
+def test_csv_and_xlsx_numbers_compare_equal(tmp_path):
+    df1, _ = generate_bom_pair(500, seed=4)
+    # pandas 导出的 CSV 中用量为 '19.0'，xlsx 中保存为整数 19
+    df1['用量'] = df1['用量'].astype(float)
+    df1.loc[0, '用量'] = 2.5
+    csv_path, xlsx_path = tmp_path / 'a.csv', tmp_path / 'b.xlsx'
+    df1.to_csv(csv_path, index=False)
+    df1.to_excel(xlsx_path, index=False)
+    assert '.0\n' in csv_path.read_text(encoding='utf-8')
+    with compare_sqlite(str(csv_path), str(xlsx_path), ['替代料']) as comparison:
+        assert comparison.diff_counts['用量'] == 0
+        assert comparison.status_counts['字段差异'] == 0
+
+
+def test_long_codes_and_leading_zeros_unchanged(tmp_path):
+    rows = [['A1', '0123', '12345678901234567890', 'S', 1], ['A2', '007', 'X', 'S', 2]]
+    csv_path = tmp_path / 'a.csv'
+    pd.DataFrame(rows, columns=FIXED_COLUMNS).to_csv(csv_path, index=False)
+    other = [['A1', '123', '12345678901234567891', 'S', 1], ['A2', '7', 'X', 'S', 2]]
+    other_path = tmp_path / 'b.csv'
+    pd.DataFrame(other, columns=FIXED_COLUMNS).to_csv(other_path, index=False)
+    with compare_sqlite(str(csv_path), str(other_path), ['替代料']) as comparison:
+        assert comparison.diff_counts['机型'] == 2
+        assert comparison.diff_counts['型号'] == 1
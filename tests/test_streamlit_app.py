@@ -0,0 +1,114 @@
+import os
+import time
+
+import pandas as pd
+import pytest
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+import compare_memory
+import compare_profile
+from compare_engine import FIXED_COLUMNS
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'streamlit_app.py')
+
+
+class Upload:
+    """代替 st.file_uploader 返回的上传文件"""
+
+    def __init__(self, path):
+        self.name = os.path.basename(path)
+        with open(path, 'rb') as f:
+            self._data = f.read()
+        self.size = len(self._data)
+
+    def getvalue(self):
+        return self._data
+
+
+@pytest.fixture
+def uploads(tmp_path):
+    df1 = pd.DataFrame([['A1', 'M1', 'X', 'S', 2], ['A2', 'M1', 'Y', 'S', 3]], columns=FIXED_COLUMNS)
+    df2 = pd.DataFrame([['A1', 'M2', 'X', 'S', 2], ['A3', 'M1', 'Z', 'S', 3]], columns=FIXED_COLUMNS)
+    uploads = {}
+    for key, df in (('file1', df1), ('file2', df2)):
+        path = tmp_path / f'{key}.xlsx'
+        df.to_excel(path, index=False)
+        uploads[key] = Upload(str(path))
+    return uploads
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch, uploads):
+    monkeypatch.setenv('HOME', str(tmp_path))
+    # 页面每次运行都重新导入 write_perf_log，替换后只记录、不写日志文件
+    perf_records = []
+    monkeypatch.setattr(compare_profile, 'write_perf_log',
+                        lambda profiler, path=None, **context: perf_records.append(
+                            dict(context, **profiler.to_dict())))
+    monkeypatch.setattr(st, 'file_uploader', lambda *args, key=None, **kwargs: uploads.get(key))
+    st.cache_resource.clear()
+    at = AppTest.from_file(APP, default_timeout=60).run()
+    at.perf_records = perf_records
+    yield at
+    st.cache_resource.clear()
+
+
+def wait_for_download(at, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        at.run()
+        if at.get('download_button'):
+            return at
+        time.sleep(0.2)
+    raise AssertionError('报告没有生成')
+
+
+def start(at):
+    [button for button in at.button if '开始' in button.label][0].click().run()
+    return at
+
+
+def test_each_report_job_logs_one_report_stage(app):
+    wait_for_download(start(app))
+    app.selectbox(key='report_format').set_value('csv').run()
+    wait_for_download(app)
+    assert not app.exception
+    records = app.perf_records
+    assert [record['report_format'] for record in records] == ['xlsx', 'csv']
+    for record in records:
+        assert [stage['stage'] for stage in record['stages']].count('report_write') == 1
+
+
+def test_low_memory_report_download(app):
+    [box for box in app.checkbox if box.label.startswith('低内存模式')][0].check().run()
+    wait_for_download(start(app))
+    assert not app.exception
+    assert not app.error
+    assert [metric.value for metric in app.metric][:4] == ['2', '2', '0', '1']
+
+
+def test_out_of_core_mode(app, uploads, monkeypatch):
+    # 预算很小时改用磁盘对比；按文件内容判断格式，扩展名为 .xls 的 xlsx 文件也可以磁盘对比
+    monkeypatch.setattr(compare_memory, 'DEFAULT_MEMORY_BUDGET_MB', 0.001)
+    uploads['file1'].name = 'file1.xls'
+    app.run()
+    assert not app.error
+    assert '键值存储方式' not in [box.label for box in app.selectbox]
+    assert '重复键处理方式' in [box.label for box in app.selectbox]
+    start(app)
+    assert not app.exception
+    assert [metric.value for metric in app.metric][:4] == ['2', '2', '0', '1']
+    assert app.get('download_button')
+
+
+def test_multi_sheet_mode_rejects_csv(app, uploads, tmp_path):
+    # CSV 没有工作表：多工作表模式给出提示，而不是抛出异常
+    path = tmp_path / 'file2.csv'
+    pd.DataFrame([['A1', 'M1', 'X', 'S', 2]], columns=FIXED_COLUMNS).to_csv(path, index=False)
+    uploads['file2'] = Upload(str(path))
+    [box for box in app.checkbox if box.label.startswith('📑 多工作表模式')][0].check().run()
+    assert not app.exception
+    assert 'CSV/TSV' in app.error[0].value
+    assert not [button for button in app.button if '开始' in button.label]
+
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.bom_generator import generate_bom_pair
+from compare_engine import DIFF_FIELDS_COLUMN, DUPLICATE_OCCURRENCE, MATCH_COLUMN, STATUS_COLUMN, compare
+from compare_viewer import ResultViewer
+
+
+@pytest.fixture(scope='module')
+def result():
+    df1, df2 = generate_bom_pair(3000, seed=5)
+    return compare(df1, df2, ['替代料', '机型'], duplicate_mode=DUPLICATE_OCCURRENCE)
+
+
+def expected_rows(df, statuses=(), key_contains='', changed_field=None):
+    """逐行筛选的参考结果"""
+    mask = np.ones(len(df), dtype=bool)
+    if statuses:
+        mask &= df[STATUS_COLUMN].isin(statuses).to_numpy()
+    if key_contains:
+        mask &= df[MATCH_COLUMN].astype(str).str.lower().str.contains(key_contains.lower(), regex=False).to_numpy()
+    if changed_field is not None:
+        mask &= df[DIFF_FIELDS_COLUMN].str.split('、').apply(lambda fields: changed_field in fields).to_numpy()
+    return np.flatnonzero(mask)
+
+
+@pytest.mark.parametrize('statuses, key_contains, changed_field', [
+    ((), '', None),
+    (('字段差异',), '', None),
+    (('仅文件1有', '仅文件2有'), '', None),
+    (('字段差异',), '', '用量'),
+    ((), '', '规格型号'),
+    ((), 'alt-00001', None),
+    (('数据一致', '字段差异'), 'MX-0001', '用量'),
+    (('不存在的状态',), '', None),
+    ((), '', '不存在的字段'),
+])
+def test_filter_matches_row_scan(result, statuses, key_contains, changed_field):
+    viewer = ResultViewer(result)
+    rows = viewer.filter(statuses, key_contains, changed_field)
+    np.testing.assert_array_equal(rows, expected_rows(result.comparison_df, statuses, key_contains, changed_field))
+
+
+def test_pages(result):
+    viewer = ResultViewer(result, page_rows=700)
+    rows = viewer.filter(['数据一致'])
+    assert viewer.page_count(rows) == (len(rows) + 699) // 700
+    pages = [viewer.page(rows, number) for number in range(1, viewer.page_count(rows) + 1)]
+    assert all(len(page) == 700 for page in pages[:-1])
+    pd.testing.assert_frame_equal(pd.concat(pages), result.comparison_df.iloc[rows])
+    assert viewer.page_count(viewer.filter(['不存在的状态'])) == 1
+
+
+def test_filters_are_cached(result):
+    viewer = ResultViewer(result)
+    assert viewer.filter(['字段差异'], 'alt') is viewer.filter(['字段差异'], 'alt')